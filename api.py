@@ -0,0 +1,404 @@
+# api.py — JSON API สำหรับเครื่องสแกนบาร์โค้ด / kiosk (ทำงานคู่กับหน้า Streamlit)
+#   uvicorn api:app --port 8000
+#   python api.py --port 8000          (ต้องติดตั้ง uvicorn)
+# เป็น ASGI application ธรรมดา ไม่ต้องใช้ framework — ใช้ business logic ชุดเดียวกับ controller.py
+#
+# ยืนยันตัวตน: POST /api/login → token แล้วส่ง header  Authorization: Bearer <token>
+# ทุก response เป็น JSON: {"ok": true, ...} หรือ {"ok": false, "errors": [...]}
+import argparse
+import json
+import math
+import sys
+from collections import namedtuple
+from datetime import date
+from urllib.parse import parse_qs
+
+import controller
+import model
+import model_async
+
+MAX_BODY_BYTES = 1024 * 1024
+REPORT_MAX_ROWS = 5000
+
+Request = namedtuple("Request", ["method", "path", "query", "body", "token", "user"])
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, *errors: str):
+        super().__init__(errors[0] if errors else "")
+        self.status = status
+        self.errors = list(errors)
+
+
+def _json_default(value):
+    # ค่า numpy (int64, float64) / Timestamp จาก DataFrame
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def records(df) -> list:
+    """DataFrame → list ของ dict (NaN → null)"""
+    return [
+        {k: _clean(v) for k, v in row.items()}
+        for row in df.to_dict(orient="records")
+    ]
+
+
+def page_json(page: model.Page) -> dict:
+    return {
+        "ok": True,
+        "items": records(page.df),
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+    }
+
+
+# ============================================================
+# Routing
+# ============================================================
+# (method, path) → (handler, สิทธิ์ที่ต้องการ: None = ไม่ต้อง login, "staff" = ผู้ใช้ทุกคน, "admin")
+ROUTES = {}
+
+
+def route(method: str, path: str, role: str = "staff"):
+    def decorator(handler):
+        ROUTES[(method, path)] = (handler, role)
+        return handler
+    return decorator
+
+
+def _int_param(value, name: str, default=None):
+    if value is None or value == "":
+        if default is not None:
+            return default
+        raise ApiError(400, f"กรุณาระบุ {name}")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{name} ต้องเป็นตัวเลข")
+
+
+def _int_list(value, name: str) -> list:
+    if not isinstance(value, list) or not value:
+        raise ApiError(400, f"{name} ต้องเป็น list ของรหัสอย่างน้อย 1 รายการ")
+    return [_int_param(v, name) for v in value]
+
+
+def _date_param(value, name: str) -> str:
+    """'YYYY-MM-DD' ที่ตรวจรูปแบบแล้ว"""
+    if not value:
+        raise ApiError(400, f"กรุณาระบุ {name} (YYYY-MM-DD)")
+    try:
+        return date.fromisoformat(str(value)).isoformat()
+    except ValueError:
+        raise ApiError(400, f"{name} ต้องอยู่ในรูปแบบ YYYY-MM-DD")
+
+
+def _page_params(query: dict, key_cursor: bool = True) -> tuple:
+    """(cursor, direction) ของ endpoint แบบแบ่งหน้า
+    key_cursor=True: cursor เป็นรหัสตัวเลข / False: cursor ของรายการเกินกำหนด "YYYY-MM-DD|item_id"
+    """
+    direction = query.get("direction", "next")
+    if direction not in ("next", "prev"):
+        raise ApiError(400, "direction ต้องเป็น next หรือ prev")
+
+    cursor = query.get("cursor") or None
+    if cursor is None:
+        return None, direction
+    if key_cursor:
+        return _int_param(cursor, "cursor"), direction
+
+    due, _, item_id = cursor.partition("|")
+    try:
+        return f"{date.fromisoformat(due).isoformat()}|{int(item_id)}", direction
+    except ValueError:
+        raise ApiError(400, "cursor ไม่ถูกต้อง")
+
+
+def _result(ok: bool, msgs: list, **extra):
+    if not ok:
+        raise ApiError(400, *msgs)
+    return 200, {"ok": True, "messages": msgs, **extra}
+
+
+# ---------- session ----------
+@route("GET", "/api/health", role=None)
+async def health(req: Request):
+    return 200, {"ok": True}
+
+
+@route("POST", "/api/login", role=None)
+async def login(req: Request):
+    ok, msgs, user = await model_async.run_read(
+        controller.login, str(req.body.get("username", "")), str(req.body.get("password", ""))
+    )
+    if not ok:
+        raise ApiError(401, *msgs)
+    token = await model_async.create_api_session(user["id"])
+    return 200, {"ok": True, "token": token, "user": user, "messages": msgs}
+
+
+@route("POST", "/api/logout")
+async def logout(req: Request):
+    await model_async.delete_api_session(req.token)
+    return 200, {"ok": True}
+
+
+@route("GET", "/api/me")
+async def me(req: Request):
+    return 200, {"ok": True, "user": req.user}
+
+
+# ---------- books / members ----------
+@route("GET", "/api/books")
+async def books_page(req: Request):
+    page = await model_async.get_books_page(*_page_params(req.query))
+    return 200, page_json(page)
+
+
+@route("GET", "/api/books/search")
+async def books_search(req: Request):
+    df = await model_async.search_books(
+        req.query.get("q", ""),
+        only_available=req.query.get("available", "1") != "0",
+    )
+    return 200, {"ok": True, "items": records(df)}
+
+
+@route("GET", "/api/members/search")
+async def members_search(req: Request):
+    df = await model_async.search_members(req.query.get("q", ""))
+    return 200, {"ok": True, "items": records(df)}
+
+
+# ---------- borrow / return ----------
+@route("GET", "/api/borrows/active")
+async def active_borrows(req: Request):
+    if req.query.get("member_id"):
+        df = await model_async.get_active_borrow_items_by_member(
+            _int_param(req.query["member_id"], "member_id")
+        )
+    else:
+        df = await model_async.get_active_borrow_items()
+    return 200, {"ok": True, "items": records(df)}
+
+
+@route("GET", "/api/borrows/history")
+async def borrow_history(req: Request):
+    page = await model_async.get_borrow_history_page(*_page_params(req.query))
+    return 200, page_json(page)
+
+
+@route("GET", "/api/borrows/overdue")
+async def overdue_borrows(req: Request):
+    """รายการเกินกำหนดส่ง ณ วันที่ as_of (ค่าเริ่มต้น = วันนี้) ทีละหน้า"""
+    try:
+        as_of = date.fromisoformat(req.query.get("as_of") or date.today().isoformat())
+    except ValueError:
+        raise ApiError(400, "as_of ต้องอยู่ในรูปแบบ YYYY-MM-DD")
+    page = await model_async.get_overdue_items(as_of.isoformat(), *_page_params(req.query, key_cursor=False))
+    return 200, page_json(page)
+
+
+@route("POST", "/api/borrows")
+async def borrow(req: Request):
+    """ยืมหลายเล่มใน 1 request: {"member_id": 1, "book_ids": [1, 2], "due_date": "YYYY-MM-DD"}"""
+    member_id = _int_param(req.body.get("member_id"), "member_id")
+    due_date = _date_param(req.body.get("due_date"), "due_date")
+    book_ids = _int_list(req.body.get("book_ids"), "book_ids")
+    if not await model_async.is_member_active(member_id):
+        raise ApiError(400, f"ไม่พบสมาชิกรหัส {member_id} หรือสมาชิกถูกยกเลิกแล้ว")
+
+    ok, msgs, tx_id = await model_async.run_write(
+        controller.borrow_books, member_id, req.user["id"], due_date, book_ids
+    )
+    return _result(ok, msgs, tx_id=tx_id)
+
+
+@route("POST", "/api/returns")
+async def return_items(req: Request):
+    """คืนหลายรายการ: {"item_ids": [10, 11]}"""
+    ok, msgs = await model_async.run_write(
+        controller.return_book_items, _int_list(req.body.get("item_ids"), "item_ids"), req.user["id"]
+    )
+    return _result(ok, msgs)
+
+
+@route("POST", "/api/returns/scan")
+async def return_scanned_books(req: Request):
+    """คืนจากรหัสหนังสือที่สแกน ไม่ต้องระบุสมาชิก: {"book_ids": [101, 102]}"""
+    ok, msgs = await model_async.run_write(
+        controller.return_books_by_scan, _int_list(req.body.get("book_ids"), "book_ids"), req.user["id"]
+    )
+    return _result(ok, msgs)
+
+
+# ---------- reports ----------
+@route("GET", "/api/reports/borrows")
+async def borrow_report(req: Request):
+    """รายงานการยืม-คืน ไม่เกิน REPORT_MAX_ROWS แถว (total = จำนวนทั้งหมดตามเงื่อนไข)"""
+    start = _date_param(req.query.get("start"), "start")
+    end = _date_param(req.query.get("end"), "end")
+    if start > end:
+        raise ApiError(400, "start ต้องไม่มากกว่า end")
+    status = req.query.get("status", "all")
+    if status not in ("all", "borrowed", "returned"):
+        raise ApiError(400, "status ต้องเป็น all, borrowed หรือ returned")
+
+    # อ่านเฉพาะแถวที่จะส่งกลับ (LIMIT ใน SQL) แล้วนับทั้งหมดแยกอีก query
+    df = await model_async.get_borrow_report(start, end, status, limit=REPORT_MAX_ROWS)
+    total = await model_async.count_borrow_report(start, end, status)
+    return 200, {
+        "ok": True,
+        "total": total,
+        "truncated": total > len(df),
+        "items": records(df),
+    }
+
+
+@route("GET", "/api/reports/book-status")
+async def book_status(req: Request):
+    df = await model_async.get_book_status_summary()
+    return 200, {"ok": True, "items": records(df)}
+
+
+# ---------- admin ----------
+@route("POST", "/api/users", role="admin")
+async def create_user(req: Request):
+    ok, msgs = await model_async.run_write(
+        controller.create_user,
+        str(req.body.get("username", "")),
+        str(req.body.get("password", "")),
+        str(req.body.get("role", "staff")),
+        bool(req.body.get("is_active", True)),
+    )
+    return _result(ok, msgs)
+
+
+# ============================================================
+# ASGI
+# ============================================================
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise ApiError(400, "การเชื่อมต่อถูกตัด")
+        body += message.get("body", b"")
+        if len(body) > MAX_BODY_BYTES:
+            raise ApiError(413, "ข้อมูลที่ส่งมามีขนาดใหญ่เกินไป")
+        if not message.get("more_body"):
+            return body
+
+
+def _bearer_token(headers) -> str:
+    for name, value in headers:
+        if name.lower() == b"authorization":
+            value = value.decode("latin-1")
+            if value.lower().startswith("bearer "):
+                return value[7:].strip()
+    return ""
+
+
+async def _send_json(send, status: int, payload: dict):
+    data = json.dumps(payload, ensure_ascii=False, default=_json_default).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json; charset=utf-8"),
+            (b"content-length", str(len(data)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def _handle_http(scope, receive, send):
+    method = scope["method"]
+    path = scope["path"].rstrip("/") or "/"
+
+    try:
+        entry = ROUTES.get((method, path))
+        if entry is None:
+            if any(p == path for _, p in ROUTES):
+                raise ApiError(405, "ไม่รองรับ method นี้")
+            raise ApiError(404, "ไม่พบ endpoint")
+        handler, role = entry
+
+        raw = await _read_body(receive)
+        body = {}
+        if raw:
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                raise ApiError(400, "ข้อมูลต้องเป็น JSON")
+            if not isinstance(body, dict):
+                raise ApiError(400, "ข้อมูลต้องเป็น JSON object")
+
+        query = {k: v[-1] for k, v in parse_qs(scope.get("query_string", b"").decode("utf-8")).items()}
+        token = _bearer_token(scope.get("headers", []))
+        user = None
+        if role is not None:
+            user = await model_async.get_api_session_user(token)
+            if user is None:
+                raise ApiError(401, "กรุณาเข้าสู่ระบบ (token ไม่ถูกต้องหรือหมดอายุ)")
+            if role == "admin" and user["role"] != "admin":
+                raise ApiError(403, "อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
+
+        status, payload = await handler(Request(method, path, query, body, token, user))
+    except ApiError as e:
+        status, payload = e.status, {"ok": False, "errors": e.errors}
+    except Exception as e:
+        status, payload = 500, {"ok": False, "errors": [f"เกิดข้อผิดพลาดภายในระบบ: {e}"]}
+
+    await _send_json(send, status, payload)
+
+
+async def _handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await model_async.run_write(model.init_db)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await model_async.run_write(model.close_pools)
+            model_async.shutdown()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope["type"] == "http":
+        await _handle_http(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await _handle_lifespan(receive, send)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON API ของระบบยืม-คืนหนังสือ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--db", default=model.DB_PATH, help="ไฟล์ฐานข้อมูล")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("กรุณาติดตั้ง uvicorn (pip install uvicorn) หรือรันด้วย ASGI server อื่น")
+        return 1
+
+    model.DB_PATH = args.db
+    uvicorn.run(app, host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
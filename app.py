@@ -4,6 +4,7 @@ from pages import book_page, member_page, borrow_page
 from pages import login_page
 from pages import admin_page
 from pages import report_page
+import profiling
 
 st.set_page_config(
     page_title="ระบบยืม-คืนหนังสือ",
@@ -88,27 +89,29 @@ if role == "admin":
 # ป้องกัน staff เข้าหน้า admin ด้วยการบังคับ routing
 # เอาการบังคับ staff ไปหน้า borrows ออก (staff ทำได้ทุกอย่างแล้ว)
 
-if st.session_state.page == "books":
-    book_page.render_book()
+# วัดเวลา/คำสั่ง SQL/หน่วยความจำของการแสดงผลแต่ละหน้า (ดูได้ในหน้า จัดการผู้ใช้)
+with profiling.profile_render(st.session_state.page, user.get("username")):
+    if st.session_state.page == "books":
+        book_page.render_book()
 
-elif st.session_state.page == "members":
-    member_page.render_member()
+    elif st.session_state.page == "members":
+        member_page.render_member()
 
-elif st.session_state.page == "borrows":
-    borrow_page.render_borrow()
+    elif st.session_state.page == "borrows":
+        borrow_page.render_borrow()
 
-elif st.session_state.page == "reports":
-    report_page.render_report()
+    elif st.session_state.page == "reports":
+        report_page.render_report()
 
-elif st.session_state.page == "admin":
-    # guard กัน staff เข้าหน้า admin แม้พยายามเปลี่ยน state เอง
-    if role != "admin":
-        st.warning("⚠ หน้านี้อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
-    else:
-        admin_page.render_admin()
+    elif st.session_state.page == "admin":
+        # guard กัน staff เข้าหน้า admin แม้พยายามเปลี่ยน state เอง
+        if role != "admin":
+            st.warning("⚠ หน้านี้อนุญาตเฉพาะผู้ดูแลระบบ (admin) เท่านั้น")
+        else:
+            admin_page.render_admin()
 
-else:
-    # fallback
-    book_page.render_book()
+    else:
+        # fallback
+        book_page.render_book()
 
    
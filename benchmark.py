@@ -0,0 +1,348 @@
+# benchmark.py — วัดเวลาของฟังก์ชัน public ใน model.py / controller.py บนข้อมูลจำลอง
+#   python benchmark.py --scales 10k 100k
+#   python benchmark.py --scales 10k --baseline bench_results/<ไฟล์ก่อนหน้า>.json
+# ผลลัพธ์บันทึกเป็น JSON ใน bench_results/ และเทียบกับ baseline เพื่อหา regression
+import argparse
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import controller
+import model
+import synthetic_data
+
+DATA_DIR = "bench_data"
+RESULTS_DIR = "bench_results"
+DEFAULT_REPEAT = 5
+REGRESSION_THRESHOLD = 0.20     # ช้าลงเกิน 20% ถือว่า regression
+REGRESSION_MIN_MS = 1.0         # ไม่นับความต่างที่น้อยกว่านี้ (noise)
+
+# วันที่ในรายงานอ้างอิงจาก as-of ของข้อมูลจำลอง
+REPORT_START = "2025-10-01"
+REPORT_END = "2025-12-31"
+
+# ฟังก์ชันที่ไม่วัด และเหตุผล
+SKIPPED = {
+    "model.get_pool": "infrastructure",
+    "model.close_pools": "infrastructure",
+    "model.get_connection": "infrastructure",
+    "model.connection": "infrastructure",
+    "model.get_watcher": "infrastructure",
+    "model.sql_scope": "infrastructure",
+    "model.cached_query": "decorator",
+    "model.bump_tables": "ต้องเรียกภายใน transaction ของผู้เรียก",
+    "model.allocate_member_ids": "ต้องเรียกภายใน transaction ของผู้เรียก",
+    "model.get_write_coordinator": "infrastructure",
+    "model.submit_write": "infrastructure (วัดผ่าน insert_book/create_borrow_transaction)",
+    "model.execute_write": "infrastructure (วัดผ่าน insert_book/create_borrow_transaction)",
+    "model.write_queue_stats": "infrastructure",
+    "model.close_write_coordinators": "infrastructure",
+    "controller.update_book": "model.update_book ไม่มีใน model",
+    "controller.delete_book": "model.delete_book ไม่มีใน model",
+    "controller.update_member": "model.update_member ไม่มีใน model",
+    "controller.delete_member": "model.delete_member ไม่มีใน model",
+    "controller.borrow_book": "model.insert_borrow ไม่มีใน model (ใช้ borrow_books)",
+    "controller.return_borrow": "model.return_book ไม่มีใน model (ใช้ return_book_items)",
+}
+
+
+class BenchContext:
+    """ข้อมูลตัวอย่างจากฐานข้อมูลที่ใช้สร้าง argument ของแต่ละ case"""
+
+    def __init__(self, db_path: str):
+        conn = sqlite3.connect(db_path)
+        try:
+            self.available_books = [r[0] for r in conn.execute(
+                "SELECT id FROM books WHERE status='available' ORDER BY id DESC")]
+            self.open_items = [r[0] for r in conn.execute(
+                "SELECT id FROM borrow_items WHERE status='borrowed' ORDER BY id")]
+            # คืนด้วยรหัสหนังสือ: หยิบจากรายการล่าสุด ไม่ให้ซ้ำกับ open_items ที่หยิบจากรายการเก่าสุด
+            self.open_books = [r[0] for r in conn.execute(
+                "SELECT book_id FROM borrow_items WHERE status='borrowed' ORDER BY id DESC")]
+            self.member_id = conn.execute(
+                "SELECT member_id FROM borrow_tx tx JOIN members m ON m.id = tx.member_id "
+                "WHERE tx.status='open' AND m.is_active=1 LIMIT 1").fetchone()[0]
+            self.active_member_id = conn.execute(
+                "SELECT id FROM members WHERE is_active=1 ORDER BY id DESC LIMIT 1").fetchone()[0]
+            self.book_title_word = conn.execute(
+                "SELECT substr(title, 1, 4) FROM books WHERE id = 1").fetchone()[0]
+        finally:
+            conn.close()
+        self.staff_id = 1
+        self.seq = 0
+
+    def next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def take_books(self, n: int) -> list:
+        books, self.available_books = self.available_books[:n], self.available_books[n:]
+        return books
+
+    def take_items(self, n: int) -> list:
+        items, self.open_items = self.open_items[:n], self.open_items[n:]
+        return items
+
+    def take_open_books(self, n: int) -> list:
+        books, self.open_books = self.open_books[:n], self.open_books[n:]
+        return books
+
+
+def _consume(gen):
+    for _ in gen:
+        pass
+
+
+def build_cases(ctx: BenchContext) -> dict:
+    """
+    ชื่อฟังก์ชัน → ฟังก์ชันที่ไม่มี argument (เรียก 1 ครั้ง = 1 รอบการวัด)
+    case ที่เขียนข้อมูลสร้าง argument ใหม่ทุกครั้ง (หนังสือ/รายการที่ยังไม่ถูกใช้)
+    """
+    rng = (REPORT_START, REPORT_END)
+    return {
+        # ---------- model: schema / infrastructure ----------
+        "model.init_db": model.init_db,
+        "model.ensure_borrow_schema": model.ensure_borrow_schema,
+        "model.explain_query_plan": lambda: model.explain_query_plan(*model.borrow_report_query(*rng, "all")),
+        "model.table_versions": lambda: model.table_versions(("books", "members", "borrow_items")),
+        "model.has_changed": lambda: model.has_changed((), ("books",)),
+        "model.cache_stats": model.cache_stats,
+        "model.hash_password": lambda: model.hash_password(synthetic_data.STAFF_PASSWORD),
+        "model.member_code_for": lambda: model.member_code_for(ctx.active_member_id),
+        "model.configure_sql_stats": lambda: model.configure_sql_stats(),
+        "model.sql_stats": model.sql_stats,
+        "model.slow_queries": model.slow_queries,
+        "model.reset_sql_stats": model.reset_sql_stats,
+        # ---------- model: users ----------
+        "model.get_user_auth_row": lambda: model.get_user_auth_row("admin"),
+        "model.get_all_users": model.get_all_users,
+        "model.is_username_exists": lambda: model.is_username_exists("admin"),
+        "model.add_user": lambda: model.add_user(
+            f"bench_user_{ctx.next_seq()}", model.hash_password("x"), "staff", 1),
+        "model.create_api_session": lambda: model.create_api_session(ctx.staff_id),
+        "model.get_api_session_user": lambda: model.get_api_session_user("bench-token"),
+        "model.delete_api_session": lambda: model.delete_api_session("bench-token"),
+        # ---------- model: books ----------
+        "model.get_all_books": model.get_all_books,
+        "model.get_books_page": model.get_books_page,
+        "model.get_available_books": model.get_available_books,
+        "model.set_book_status": lambda: model.set_book_status(ctx.available_books[-1], "available"),
+        "model.insert_book": lambda: model.insert_book(f"Bench Book {ctx.next_seq()}", "Bench"),
+        "model.get_books_by_ids": lambda: model.get_books_by_ids(ctx.available_books[:20]),
+        "model.search_books": lambda: model.search_books(ctx.book_title_word),
+        # ---------- model: members ----------
+        "model.get_all_members": model.get_all_members,
+        "model.get_members_page": model.get_members_page,
+        "model.get_active_members": model.get_active_members,
+        "model.is_member_active": lambda: model.is_member_active(ctx.active_member_id),
+        "model.insert_member": lambda: model.insert_member(
+            "Bench Member", f"bench{ctx.next_seq()}@example.com", "0800000000"),
+        "model.search_members": lambda: model.search_members("สมชาย"),
+        # ---------- model: borrow / return ----------
+        "model.create_borrow_transaction": lambda: model.create_borrow_transaction(
+            ctx.active_member_id, ctx.take_books(3), ctx.staff_id, REPORT_END),
+        "model.return_borrow_items": lambda: model.return_borrow_items(ctx.take_items(3), ctx.staff_id),
+        "model.return_borrow_item": lambda: model.return_borrow_item(ctx.take_items(1)[0], ctx.staff_id),
+        "model.return_by_book_ids": lambda: model.return_by_book_ids(ctx.take_open_books(20), ctx.staff_id),
+        "model.get_active_borrow_items_by_member": lambda: model.get_active_borrow_items_by_member(ctx.member_id),
+        "model.get_active_borrow_items": model.get_active_borrow_items,
+        "model.get_borrow_history_page": model.get_borrow_history_page,
+        "model.get_borrow_history": model.get_borrow_history,
+        "model.get_overdue_items": lambda: model.get_overdue_items(REPORT_END),
+        "model.get_member_overdue_counts": lambda: model.get_member_overdue_counts(REPORT_END),
+        # ---------- model: reports ----------
+        "model.get_book_status_summary": model.get_book_status_summary,
+        "model.get_borrow_summary_by_month": lambda: model.get_borrow_summary_by_month("2023-01-01", REPORT_END),
+        "model.verify_summary_tables": model.verify_summary_tables,
+        "model.rebuild_summary_tables": model.rebuild_summary_tables,
+        "model.borrow_report_query": lambda: model.borrow_report_query(*rng, "all"),
+        "model.get_borrow_report": lambda: model.get_borrow_report(*rng, "all"),
+        "model.iter_borrow_report": lambda: _consume(model.iter_borrow_report(*rng, "all")),
+        "model.iter_borrow_report_rows": lambda: _consume(model.iter_borrow_report_rows(*rng, "all")),
+        "model.count_borrow_report": lambda: model.count_borrow_report(*rng, "all"),
+        # ---------- controller ----------
+        "controller.login": lambda: controller.login("admin", synthetic_data.STAFF_PASSWORD),
+        "controller.create_book": lambda: controller.create_book(f"Bench Book {ctx.next_seq()}", "Bench"),
+        "controller.create_member": lambda: controller.create_member(
+            "Bench Member", f"bench{ctx.next_seq()}@example.com", "0800000000"),
+        "controller.create_user": lambda: controller.create_user(f"bench_user_{ctx.next_seq()}", "pass1234", "staff", True),
+        "controller.borrow_books": lambda: controller.borrow_books(
+            ctx.active_member_id, ctx.staff_id, REPORT_END, ctx.take_books(3)),
+        "controller.return_book_item": lambda: controller.return_book_item(ctx.take_items(1)[0], ctx.staff_id),
+        "controller.return_book_items": lambda: controller.return_book_items(ctx.take_items(3), ctx.staff_id),
+        "controller.parse_scanned_book_ids": lambda: controller.parse_scanned_book_ids(
+            "\n".join(str(b) for b in ctx.open_books[:500])),
+        "controller.return_books_by_scan": lambda: controller.return_books_by_scan(
+            ctx.take_open_books(20), ctx.staff_id),
+    }
+
+
+def public_functions() -> list:
+    """ชื่อฟังก์ชัน public ทั้งหมดที่นิยามใน model.py และ controller.py"""
+    names = []
+    for module in (model, controller):
+        for name, obj in inspect.getmembers(module, inspect.isfunction):
+            if not name.startswith("_") and obj.__module__ == module.__name__:
+                names.append(f"{module.__name__}.{name}")
+    return sorted(names)
+
+
+def _time_case(fn, repeat: int, cold: bool) -> list:
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            model.query_cache.clear()
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _summary(timings: list) -> dict:
+    ordered = sorted(timings)
+    return {
+        "runs": len(ordered),
+        "median_ms": round(statistics.median(ordered), 3),
+        "min_ms": round(ordered[0], 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def run_scale(scale: str, repeat: int, regenerate: bool = False) -> dict:
+    """วัดทุก case ที่ scale หนึ่ง บนสำเนาของฐานข้อมูลจำลอง (ต้นฉบับไม่ถูกแก้ไข)"""
+    source = os.path.join(DATA_DIR, f"bench_{scale.lower()}.db")
+    if regenerate or not os.path.exists(source):
+        print(f"[{scale}] สร้างข้อมูลจำลอง...")
+        synthetic_data.generate(source, synthetic_data.parse_scale(scale), overwrite=True)
+
+    work = os.path.join(DATA_DIR, f"bench_{scale.lower()}.work.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(work + suffix):
+            os.remove(work + suffix)
+    shutil.copyfile(source, work)
+
+    model.close_pools()
+    model.query_cache.clear()
+    model.DB_PATH = work
+    try:
+        ctx = BenchContext(work)
+        cases = build_cases(ctx)
+        results = {}
+        for name in public_functions():
+            if name in SKIPPED:
+                results[name] = {"skipped": SKIPPED[name]}
+                continue
+            fn = cases.get(name)
+            if fn is None:
+                results[name] = {"skipped": "ไม่มี case"}
+                continue
+
+            try:
+                result = _summary(_time_case(fn, repeat, cold=True))
+                # ฟังก์ชันที่มี query cache วัดตอนอ่านจาก cache ด้วย
+                target = getattr(model, name.split(".", 1)[1], None) if name.startswith("model.") else None
+                if getattr(target, "tables", None):
+                    result["warm_median_ms"] = _summary(_time_case(fn, repeat, cold=False))["median_ms"]
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            results[name] = result
+            print(f"[{scale}] {name}: {result}")
+
+        with sqlite3.connect(work) as conn:
+            rows = {
+                t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+                for t in ("books", "members", "users", "borrow_tx", "borrow_items", "borrows")
+            }
+        return {"rows": rows, "results": results}
+    finally:
+        model.close_pools()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work + suffix):
+                os.remove(work + suffix)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD,
+            min_ms: float = REGRESSION_MIN_MS) -> list:
+    """
+    เทียบผลกับ baseline คืนค่า list ของ regression
+    (scale, ชื่อฟังก์ชัน, median เดิม, median ใหม่, อัตราส่วน)
+    """
+    regressions = []
+    for scale, data in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale, {}).get("results", {})
+        for name, result in data["results"].items():
+            old = base.get(name, {}).get("median_ms")
+            new = result.get("median_ms")
+            if old is None or new is None or old <= 0:
+                continue
+            if new > old * (1 + threshold) and new - old >= min_ms:
+                regressions.append((scale, name, old, new, round(new / old, 2)))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="วัดประสิทธิภาพ model.py / controller.py บนข้อมูลจำลอง")
+    parser.add_argument("--scales", nargs="+", default=["10k"], help="เช่น 10k 100k 1m")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="จำนวนรอบต่อฟังก์ชัน")
+    parser.add_argument("--regenerate", action="store_true", help="สร้างข้อมูลจำลองใหม่")
+    parser.add_argument("--baseline", help="ไฟล์ผลลัพธ์ก่อนหน้า สำหรับเทียบหา regression")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="สัดส่วนที่ช้าลงได้ก่อนถือว่า regression (0.2 = 20%%)")
+    parser.add_argument("--out", help="ไฟล์ผลลัพธ์ (ค่าเริ่มต้น bench_results/<เวลา>.json)")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        report["scales"][scale] = run_scale(scale, args.repeat, args.regenerate)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        report["baseline"] = args.baseline
+        report["regressions"] = [
+            {"scale": s, "name": n, "baseline_ms": o, "current_ms": c, "ratio": r}
+            for s, n, o, c, r in regressions
+        ]
+
+    out = args.out or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"บันทึกผลที่ {out}")
+
+    for scale, name, old, new, ratio in regressions:
+        print(f"REGRESSION [{scale}] {name}: {old} ms → {new} ms (x{ratio})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
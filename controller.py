@@ -169,6 +169,10 @@ def borrow_books(member_id: int, staff_user_id: int, due_date_iso: str | None, b
            
         )
         return True, [f"บันทึกการยืมเรียบร้อยแล้ว (TX: {tx_id})"], tx_id
+    except model.BooksUnavailableError as e:
+        return False, [
+            f"หนังสือรหัส {e.book_ids} ถูกยืมไปแล้ว (อาจถูกทำรายการจากจุดบริการอื่น) กรุณานำออกจากรายการแล้วลองใหม่"
+        ], None
     except Exception as e:
         return False, [f"ไม่สามารถบันทึกการยืมได้: {e}"], None
 
@@ -194,21 +198,57 @@ def return_book_items(item_ids: list[int], return_staff_user_id: int):
     if not return_staff_user_id:
         return False, ["ไม่พบข้อมูลผู้ทำรายการ (กรุณาเข้าสู่ระบบใหม่)"]
 
-    success = 0
-    failed = []
+    try:
+        returned_ids, failed = model.return_borrow_items(
+            [int(x) for x in item_ids],
+            int(return_staff_user_id)
+        )
+    except Exception as e:
+        return False, [f"ไม่สามารถบันทึกการคืนได้: {e}"]
 
-    for item_id in item_ids:
-        try:
-            ok = model.return_borrow_item(int(item_id), int(return_staff_user_id))
-            if ok:
-                success += 1
-            else:
-                failed.append(int(item_id))
-        except Exception:
-            failed.append(int(item_id))
+    success = len(returned_ids)
 
     msgs = [f"บันทึกการคืนสำเร็จ {success} รายการ"]
     if failed:
         msgs.append(f"รายการที่คืนไม่สำเร็จ/ถูกคืนแล้ว: {failed}")
 
     return True, msgs
+
+
+def parse_scanned_book_ids(text: str):
+    """
+    แยกรหัสหนังสือจากข้อความที่สแกน (1 รหัสต่อบรรทัด หรือคั่นด้วยช่องว่าง/จุลภาค)
+    return: (book_ids:list[int], invalid:list[str])
+    """
+    book_ids, invalid = [], []
+    for token in (text or "").replace(",", " ").split():
+        if token.isdigit():
+            book_ids.append(int(token))
+        else:
+            invalid.append(token)
+    return book_ids, invalid
+
+
+def return_books_by_scan(book_ids: list[int], return_staff_user_id: int):
+    """
+    คืนหนังสือจากรหัสหนังสือที่สแกน (เช่น หนังสือในกล่องรับคืน) โดยไม่ต้องเลือกสมาชิก
+    return: (ok:bool, messages:list[str])
+    """
+    if not book_ids:
+        return False, ["กรุณาสแกนรหัสหนังสืออย่างน้อย 1 เล่ม"]
+    if not return_staff_user_id:
+        return False, ["ไม่พบข้อมูลผู้ทำรายการ (กรุณาเข้าสู่ระบบใหม่)"]
+
+    try:
+        returned_ids, failed = model.return_by_book_ids(
+            [int(x) for x in book_ids],
+            int(return_staff_user_id)
+        )
+    except Exception as e:
+        return False, [f"ไม่สามารถบันทึกการคืนได้: {e}"]
+
+    msgs = [f"บันทึกการคืนสำเร็จ {len(returned_ids)} เล่ม"]
+    if failed:
+        msgs.append(f"หนังสือที่ไม่มีรายการค้างยืม: {failed}")
+
+    return True, msgs
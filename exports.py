@@ -0,0 +1,252 @@
+import functools
+import os
+import threading
+
+import model
+
+# ============================================================
+# Report exports
+# ============================================================
+# เขียนไฟล์ส่งออกทีละ chunk ลงไฟล์ที่ผู้เรียกเปิดไว้ (งานเบื้องหลังใน jobs.py เขียนลงดิสก์)
+# หน่วยความจำสูงสุดจึงคงที่ ไม่ขึ้นกับจำนวนแถวของรายงาน
+EXPORT_CHUNK_SIZE = 5000
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def report_columns(start_date: str, end_date: str, status: str) -> list:
+    """ชื่อคอลัมน์ของรายงาน (ใช้เขียนหัวตารางแม้ไม่มีข้อมูล)"""
+    query, params = model.borrow_report_query(start_date, end_date, status)
+    with model.connection() as conn:
+        cur = conn.execute(f"SELECT * FROM ({query}) LIMIT 0", params)
+        return [d[0] for d in cur.description]
+
+
+def _row_progress(start_date: str, end_date: str, status: str, progress):
+    """คืนฟังก์ชัน tick(จำนวนแถวที่เขียนแล้ว) ที่รายงานความคืบหน้าเป็นสัดส่วน 0..1"""
+    if progress is None:
+        return lambda done: None
+
+    total = model.count_borrow_report(start_date, end_date, status)
+
+    def tick(done: int):
+        progress(done / total if total else 1.0)
+
+    return tick
+
+
+def iter_report_csv(start_date: str, end_date: str, status: str, chunksize: int = EXPORT_CHUNK_SIZE):
+    """
+    สร้าง CSV (UTF-8 BOM เปิดใน Excel ภาษาไทยได้) ทีละ chunk
+    yield bytes ของแต่ละ chunk — แถวแรกเป็นหัวตาราง
+    """
+    yield UTF8_BOM
+    header = True
+    for chunk in model.iter_borrow_report(start_date, end_date, status, chunksize):
+        yield chunk.to_csv(index=False, header=header).encode("utf-8")
+        header = False
+
+    # ไม่มีข้อมูลเลย ก็ยังให้มีหัวตาราง
+    if header:
+        yield (",".join(report_columns(start_date, end_date, status)) + "\n").encode("utf-8")
+
+
+def write_report_csv(out, start_date: str, end_date: str, status: str,
+                     chunksize: int = EXPORT_CHUNK_SIZE, progress=None):
+    """เขียนรายงาน CSV ลงไฟล์ out (เปิดแบบ binary)"""
+    for data in iter_report_csv(start_date, end_date, status, chunksize):
+        out.write(data)
+    if progress:
+        progress(1.0)
+
+
+# ============================================================
+# Excel
+# ============================================================
+# ใช้ openpyxl แบบ write-only: แถวถูกเขียนต่อท้ายลงไฟล์ชั่วคราวทันที
+# ไม่สร้าง cell object ค้างไว้ทั้ง workbook หน่วยความจำจึงคงที่
+# เมื่อครบจำนวนแถวสูงสุดของ Excel จะขึ้น sheet ใหม่ (พร้อมหัวตาราง)
+MAX_SHEET_ROWS = 1048576
+SHEET_NAME = "BorrowReport"
+
+
+def write_report_xlsx(out, start_date: str, end_date: str, status: str,
+                      chunksize: int = EXPORT_CHUNK_SIZE, progress=None,
+                      max_sheet_rows: int = MAX_SHEET_ROWS):
+    """เขียนรายงาน Excel ลงไฟล์ out (เปิดแบบ binary) ทีละ chunk จาก cursor"""
+    from openpyxl import Workbook
+
+    columns = report_columns(start_date, end_date, status)
+    tick = _row_progress(start_date, end_date, status, progress)
+
+    wb = Workbook(write_only=True)
+    ws = None
+    sheet_no = 0
+    sheet_rows = 0
+    done = 0
+
+    def new_sheet():
+        nonlocal ws, sheet_no, sheet_rows
+        sheet_no += 1
+        ws = wb.create_sheet(SHEET_NAME if sheet_no == 1 else f"{SHEET_NAME}_{sheet_no}")
+        ws.append(columns)
+        sheet_rows = 1
+
+    new_sheet()
+    for rows in model.iter_borrow_report_rows(start_date, end_date, status, chunksize):
+        for row in rows:
+            if sheet_rows >= max_sheet_rows:
+                new_sheet()
+            ws.append(row)
+            sheet_rows += 1
+        done += len(rows)
+        tick(done)
+
+    wb.save(out)
+
+
+# ============================================================
+# PDF
+# ============================================================
+FONT_NAME = "THSarabun"
+FONT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts", "THSarabunNew.ttf")
+
+_font_lock = threading.Lock()
+
+
+def register_thai_font():
+    """ลงทะเบียนฟอนต์ไทยกับ reportlab ครั้งเดียวต่อ process"""
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    with _font_lock:
+        if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+# แบ่งรายงานเป็นตารางหน้าละ PDF_ROWS_PER_PAGE แถว (ความสูงแถวคงที่)
+# reportlab จึงจัดหน้าทีละตารางเล็ก ๆ เวลาที่ใช้เพิ่มตามจำนวนแถวแบบเชิงเส้น
+# แทนการจัดตารางเดียวขนาดใหญ่ที่ต้องแยกหน้าเองทั้งก้อน
+PDF_ROWS_PER_PAGE = 30
+PDF_FONT_SIZE = 12
+PDF_ROW_HEIGHT = 16
+PDF_TITLE = "รายงานการยืม-คืนหนังสือ"
+PDF_STATUS_LABELS = {"all": "ทั้งหมด", "borrowed": "ยังไม่คืน", "returned": "คืนแล้ว"}
+
+# ความกว้างคอลัมน์ (point) ตามลำดับคอลัมน์ของรายงาน
+PDF_COL_WIDTHS = [50, 100, 160, 95, 60, 95, 55, 70, 70]
+
+
+@functools.lru_cache(maxsize=4096)
+def _fit_text(value, width: float) -> str:
+    """ตัดข้อความให้พอดีช่อง (ต่อท้ายด้วย …) เพื่อให้ทุกแถวสูงเท่ากัน — ค่าซ้ำบ่อย (วันที่, สถานะ) จึง cache ไว้"""
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    text = "" if value is None else str(value)
+    width -= 6  # padding ซ้าย-ขวาของ cell
+    if stringWidth(text, FONT_NAME, PDF_FONT_SIZE) <= width:
+        return text
+    while text and stringWidth(text + "…", FONT_NAME, PDF_FONT_SIZE) > width:
+        text = text[:-1]
+    return text + "…"
+
+
+def write_report_pdf(out, start_date: str, end_date: str, status: str,
+                     chunksize: int = EXPORT_CHUNK_SIZE, progress=None,
+                     rows_per_page: int = PDF_ROWS_PER_PAGE):
+    """เขียนรายงาน PDF (A4 แนวนอน) ลงไฟล์ out — หัวรายงานและเลขหน้าทุกหน้า"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.platypus import PageBreak, SimpleDocTemplate, Table, TableStyle
+
+    register_thai_font()
+
+    columns = report_columns(start_date, end_date, status)
+    tick = _row_progress(start_date, end_date, status, progress)
+    style = TableStyle([
+        ("FONT", (0, 0), (-1, -1), FONT_NAME),
+        ("FONTSIZE", (0, 0), (-1, -1), PDF_FONT_SIZE),
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
+        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ])
+    subtitle = f"ช่วงวันที่ {start_date} ถึง {end_date}  สถานะ: {PDF_STATUS_LABELS.get(status, status)}"
+
+    def draw_page(canvas, doc):
+        width, height = doc.pagesize
+        canvas.saveState()
+        canvas.setFont(FONT_NAME, 16)
+        canvas.drawString(doc.leftMargin, height - 28, PDF_TITLE)
+        canvas.setFont(FONT_NAME, 12)
+        canvas.drawRightString(width - doc.rightMargin, height - 28, subtitle)
+        canvas.drawCentredString(width / 2, 16, f"หน้า {doc.page}")
+        canvas.restoreState()
+
+    def page_table(rows):
+        data = [columns] + [
+            [_fit_text(v, w) for v, w in zip(row, PDF_COL_WIDTHS)]
+            for row in rows
+        ]
+        return Table(data, colWidths=PDF_COL_WIDTHS, rowHeights=PDF_ROW_HEIGHT, style=style)
+
+    # อ่านทีละ chunk แล้วตัดเป็นตารางหน้าละ rows_per_page แถว
+    story = []
+    pending = []
+    done = 0
+    for rows in model.iter_borrow_report_rows(start_date, end_date, status, chunksize):
+        pending.extend(rows)
+        while len(pending) >= rows_per_page:
+            story.extend([page_table(pending[:rows_per_page]), PageBreak()])
+            del pending[:rows_per_page]
+        done += len(rows)
+        tick(done / 2)  # ครึ่งแรก: อ่านข้อมูล ครึ่งหลัง: จัดหน้า
+    if pending or not story:
+        story.append(page_table(pending))
+    elif isinstance(story[-1], PageBreak):
+        story.pop()
+
+    doc = SimpleDocTemplate(
+        out,
+        pagesize=landscape(A4),
+        rightMargin=30,
+        leftMargin=30,
+        topMargin=40,
+        bottomMargin=30,
+        title=PDF_TITLE,
+    )
+
+    if progress:
+        total_pages = sum(1 for f in story if isinstance(f, Table))
+
+        def after_flowable(flowable):
+            if isinstance(flowable, Table):
+                progress(0.5 + 0.5 * doc.page / total_pages)
+
+        doc.afterFlowable = after_flowable
+
+    doc.build(story, onFirstPage=draw_page, onLaterPages=draw_page)
+
+
+# ============================================================
+# Formats
+# ============================================================
+# ตารางที่รายงานอ่าน — version ของตารางเหล่านี้บอกว่าไฟล์ที่สร้างไว้ยังตรงกับข้อมูลหรือไม่ (ดู jobs.report_data_version)
+REPORT_TABLES = ("borrow_items", "borrow_tx", "members", "books", "users")
+
+# รูปแบบ → (ชื่อไฟล์, mime)
+FORMATS = {
+    "csv": ("borrow_report.csv", "text/csv; charset=utf-8"),
+    "xlsx": (
+        "borrow_return_report.xlsx",
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+    "pdf": ("borrow_return_report.pdf", "application/pdf"),
+}
+
+# รูปแบบ → ฟังก์ชันเขียนลงไฟล์ (รับ progress(fraction) สำหรับรายงานความคืบหน้าของงานเบื้องหลัง)
+WRITERS = {
+    "csv": write_report_csv,
+    "xlsx": write_report_xlsx,
+    "pdf": write_report_pdf,
+}
@@ -0,0 +1,271 @@
+import csv
+import io
+import re
+import sqlite3
+from collections import namedtuple
+from itertools import islice
+
+import model
+
+# ============================================================
+# Bulk import (CSV / Excel)
+# ============================================================
+# อ่านไฟล์ทีละ chunk แล้วบันทึกด้วย executemany ภายใน transaction ต่อ chunk
+# (ส่ง 1 งานเขียนต่อ chunk ผ่าน model.execute_write เหมือนงานเขียนอื่น)
+# หน่วยความจำจึงคงที่ ไม่ขึ้นกับจำนวนแถวในไฟล์
+IMPORT_CHUNK_SIZE = 1000
+
+# row_no = เลขบรรทัดในไฟล์ (หัวตารางคือบรรทัด 1)
+RejectedRow = namedtuple("RejectedRow", ["row_no", "error", "data"])
+ImportResult = namedtuple("ImportResult", ["inserted", "rejected"])
+
+# ชื่อคอลัมน์ที่รองรับ (ภาษาไทย/อังกฤษ) → ชื่อฟิลด์ในตาราง
+BOOK_COLUMNS = {
+    "title": "title", "ชื่อหนังสือ": "title",
+    "author": "author", "ผู้แต่ง": "author",
+}
+
+MEMBER_COLUMNS = {
+    "name": "name", "ชื่อ": "name", "ชื่อสมาชิก": "name",
+    "email": "email", "อีเมล": "email",
+    "phone": "phone", "โทรศัพท์": "phone", "เบอร์โทร": "phone",
+    "gender": "gender", "เพศ": "gender",
+}
+
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _normalize_header(header, columns: dict) -> list:
+    return [columns.get(str(h or "").strip().lower()) for h in header]
+
+
+def iter_rows(file, filename: str, columns: dict):
+    """
+    อ่านแถวจากไฟล์ .csv หรือ .xlsx ทีละแถว
+    yield (row_no, dict ของฟิลด์ที่รู้จัก) — คอลัมน์ที่ไม่รู้จักจะถูกข้าม
+    """
+    if filename.lower().endswith(".xlsx"):
+        from openpyxl import load_workbook
+
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            rows = wb.worksheets[0].iter_rows(values_only=True)
+            yield from _map_rows(rows, columns)
+        finally:
+            wb.close()
+    else:
+        if isinstance(file, (bytes, bytearray)):
+            file = io.BytesIO(file)
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        try:
+            yield from _map_rows(csv.reader(text), columns)
+        finally:
+            text.detach()
+
+
+def _map_rows(rows, columns: dict):
+    header = next(rows, None)
+    if header is None:
+        return
+    fields = _normalize_header(header, columns)
+
+    for row_no, values in enumerate(rows, start=2):
+        if not values or all(v is None or str(v).strip() == "" for v in values):
+            continue
+        record = {}
+        for field, value in zip(fields, values):
+            if field:
+                record[field] = "" if value is None else str(value).strip()
+        yield row_no, record
+
+
+def _chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ============================================================
+# BOOK
+# ============================================================
+def _validate_book(record: dict):
+    if not record.get("title"):
+        return "ไม่มีชื่อหนังสือ"
+    return None
+
+
+def _insert_books(conn, good: list):
+    conn.executemany("""
+        INSERT INTO books (title, author, status)
+        VALUES (?, ?, 'available')
+    """, good)
+    model.bump_tables(conn, "books")
+
+
+def import_books(file, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportResult:
+    """
+    นำเข้าหนังสือจากไฟล์ (คอลัมน์ title/ชื่อหนังสือ, author/ผู้แต่ง)
+    หนังสือที่นำเข้ามีสถานะ available
+    """
+    inserted = 0
+    rejected = []
+
+    for chunk in _chunks(iter_rows(file, filename, BOOK_COLUMNS), chunk_size):
+        good = []
+        for row_no, record in chunk:
+            error = _validate_book(record)
+            if error:
+                rejected.append(RejectedRow(row_no, error, record))
+            else:
+                good.append((record["title"], record.get("author") or None))
+
+        if not good:
+            continue
+
+        model.execute_write(_insert_books, good)
+        inserted += len(good)
+
+    return ImportResult(inserted, rejected)
+
+
+# ============================================================
+# MEMBER
+# ============================================================
+def _validate_member(record: dict, seen_emails: set):
+    if not record.get("name"):
+        return "ไม่มีชื่อสมาชิก"
+    email = record.get("email", "")
+    if email:
+        if not EMAIL_PATTERN.match(email):
+            return "รูปแบบอีเมลไม่ถูกต้อง"
+        if email.lower() in seen_emails:
+            return "อีเมลซ้ำในไฟล์"
+    return None
+
+
+def _free_member_ids(c, count: int) -> list:
+    """
+    id ใหม่ count รายการ ต่อจาก model.allocate_member_ids
+    ข้าม id ที่รหัสสมาชิกอัตโนมัติ (M0001, ...) ถูกสมาชิกเก่าที่ตั้งรหัสเองใช้ไปแล้ว
+    """
+    ids = []
+    next_id = model.allocate_member_ids(c, count)
+    while len(ids) < count:
+        batch = range(next_id, next_id + count - len(ids))
+        codes = [model.member_code_for(member_id) for member_id in batch]
+        c.execute(f"SELECT member_code FROM members WHERE member_code IN ({','.join('?' * len(codes))})", codes)
+        taken = {row[0] for row in c.fetchall()}
+        ids += [member_id for member_id, code in zip(batch, codes) if code not in taken]
+        next_id = batch.stop
+    return ids
+
+
+def _insert_members(conn, valid: list) -> tuple:
+    """
+    บันทึกสมาชิก 1 chunk (ทำงานใน transaction ของ model.execute_write)
+    return: (จำนวนที่บันทึก, list ของ RejectedRow ที่อีเมลซ้ำกับในระบบ)
+    """
+    c = conn.cursor()
+
+    # อีเมลที่มีอยู่แล้วในระบบ ไม่สนตัวพิมพ์ใหญ่/เล็ก เหมือนการตรวจซ้ำในไฟล์ (idx_members_email_lower)
+    emails = [r["email"].lower() for _, r in valid if r.get("email")]
+    existing = set()
+    if emails:
+        c.execute(
+            f"SELECT lower(email) FROM members WHERE lower(email) IN ({','.join('?' * len(emails))})",
+            emails
+        )
+        existing = {row[0] for row in c.fetchall()}
+
+    good = []
+    duplicates = []
+    for row_no, record in valid:
+        if record.get("email") and record["email"].lower() in existing:
+            duplicates.append(RejectedRow(row_no, "อีเมลนี้มีในระบบแล้ว", record))
+        else:
+            good.append(record)
+
+    if not good:
+        return 0, duplicates
+
+    ids = _free_member_ids(c, len(good))
+    c.executemany("""
+        INSERT INTO members (id, member_code, name, gender, email, phone, is_active)
+        VALUES (?, ?, ?, ?, ?, ?, 1)
+    """, [
+        (
+            member_id,
+            model.member_code_for(member_id),
+            r["name"],
+            r.get("gender") or None,
+            r.get("email") or None,
+            r.get("phone") or None,
+        )
+        for member_id, r in zip(ids, good)
+    ])
+
+    model.bump_tables(conn, "members")
+    return len(good), duplicates
+
+
+def import_members(file, filename: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportResult:
+    """
+    นำเข้าสมาชิกจากไฟล์ (คอลัมน์ name/ชื่อ, email/อีเมล, phone/โทรศัพท์, gender/เพศ)
+    รหัสสมาชิกถูกจองเป็นช่วงต่อเนื่องครั้งเดียวต่อ chunk
+    chunk ที่ชนข้อจำกัดของฐานข้อมูล (เช่น รหัสสมาชิกเดิมซ้ำ) จะถูกบันทึกใหม่ทีละแถว
+    แถวที่บันทึกไม่ได้ไปอยู่ใน rejected แทนการหยุดนำเข้ากลางไฟล์
+    """
+    inserted = 0
+    rejected = []
+    seen_emails = set()
+
+    for chunk in _chunks(iter_rows(file, filename, MEMBER_COLUMNS), chunk_size):
+        valid = []
+        for row_no, record in chunk:
+            error = _validate_member(record, seen_emails)
+            if error:
+                rejected.append(RejectedRow(row_no, error, record))
+                continue
+            if record.get("email"):
+                seen_emails.add(record["email"].lower())
+            valid.append((row_no, record))
+
+        if not valid:
+            continue
+
+        try:
+            good, duplicates = model.execute_write(_insert_members, valid)
+        except sqlite3.IntegrityError:
+            good, duplicates = _insert_members_one_by_one(valid)
+        rejected.extend(duplicates)
+        inserted += good
+
+    return ImportResult(inserted, rejected)
+
+
+def _insert_members_one_by_one(valid: list) -> tuple:
+    """บันทึกทีละแถว (ใช้เมื่อทั้ง chunk ถูก rollback) return: เหมือน _insert_members"""
+    inserted = 0
+    rejected = []
+    for row_no, record in valid:
+        try:
+            good, duplicates = model.execute_write(_insert_members, [(row_no, record)])
+        except sqlite3.IntegrityError as e:
+            rejected.append(RejectedRow(row_no, f"บันทึกไม่ได้: {e}", record))
+            continue
+        inserted += good
+        rejected.extend(duplicates)
+    return inserted, rejected
+
+
+def rejected_to_csv(rejected: list) -> bytes:
+    """รายงานแถวที่นำเข้าไม่สำเร็จ เป็น CSV (UTF-8 BOM เปิดใน Excel ได้)"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["แถวที่", "สาเหตุ", "ข้อมูล"])
+    for r in rejected:
+        writer.writerow([r.row_no, r.error, r.data])
+    return out.getvalue().encode("utf-8-sig")
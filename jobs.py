@@ -0,0 +1,259 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import model
+import exports
+
+# ============================================================
+# Background export jobs
+# ============================================================
+# งานสร้างไฟล์รายงาน (CSV/Excel/PDF) ใช้เวลาและ CPU มาก จึงส่งไปทำใน process แยก (ProcessPoolExecutor)
+# ไฟล์ถูกเขียนลงดิสก์ทีละ chunk ไม่ต้องถือทั้งไฟล์ไว้ในหน่วยความจำของ server
+# สถานะและความคืบหน้าของงานเก็บในตาราง export_jobs ทุก session จึงเห็นตรงกัน
+# ไฟล์ผลลัพธ์อยู่ใน EXPORT_DIR และถูกลบเมื่อเก่ากว่า JOB_MAX_AGE_HOURS
+# งานเขียน export_jobs ใน process หลักผ่าน model.execute_write เหมือนงานเขียนอื่น
+# ยกเว้น _update_job ที่ process ลูกเรียก (ความคืบหน้า/ผลลัพธ์): process ลูกไม่มีคิวของ process หลัก
+# จึงเขียนตรงทีละคำสั่ง (busy_timeout รอ lock ให้)
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_files")
+EXPORT_WORKERS = 2          # จำนวน process ที่สร้างไฟล์พร้อมกันได้
+MAX_PENDING_JOBS = 8        # งานที่รอ/กำลังทำได้ทั้งระบบ
+MAX_PENDING_PER_USER = 2    # งานที่รอ/กำลังทำได้ต่อผู้ใช้
+JOB_MAX_AGE_HOURS = 24
+JOB_HEARTBEAT_SECONDS = 30  # process ที่สั่งงานยืนยันว่ายังทำงานอยู่ทุก ๆ เท่านี้
+JOB_STALE_SECONDS = 120     # งานที่ไม่มี heartbeat นานกว่านี้ ถือว่า process เจ้าของหยุดไปแล้ว
+
+# รหัสของ process นี้ในคอลัมน์ export_jobs.owner (pid ซ้ำกันได้หลัง restart เช่น server เป็น PID 1 ใน container)
+PROCESS_TOKEN = uuid.uuid4().hex
+
+EXTENSIONS = {"csv": "csv", "xlsx": "xlsx", "pdf": "pdf"}
+
+
+class JobLimitError(Exception):
+    """มีงานค้างเกินจำนวนที่อนุญาต"""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn: process ลูกไม่รับ connection SQLite ที่เปิดค้างไว้จาก process หลัก
+                _executor = ProcessPoolExecutor(
+                    max_workers=EXPORT_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                # งานที่ค้างจาก process ก่อนหน้า (และของ process นี้ที่ไม่มี executor ทำแล้ว) ไม่มีใครทำต่อ
+                model.execute_write(_fail_orphaned_jobs, True)
+                threading.Thread(target=_heartbeat_loop, name="export-job-heartbeat", daemon=True).start()
+    return _executor
+
+
+def _heartbeat_loop():
+    # ยืนยันว่างานที่ process นี้สั่งไว้ยังมีคนทำอยู่ (process อื่นจะไม่ยกเลิกงานเหล่านี้)
+    while True:
+        time.sleep(JOB_HEARTBEAT_SECONDS)
+        try:
+            model.execute_write(_touch_jobs, PROCESS_TOKEN)
+        except sqlite3.Error:
+            pass  # ฐานข้อมูลไม่ว่าง ลองใหม่รอบถัดไป
+
+
+def _touch_jobs(conn, owner: str):
+    conn.execute("""
+        UPDATE export_jobs SET heartbeat_at=CURRENT_TIMESTAMP
+        WHERE owner=? AND state IN ('queued','running')
+    """, (owner,))
+
+
+def _fail_orphaned_jobs(conn, include_own: bool = False):
+    """
+    งานที่ค้างจาก process ที่หยุดไปแล้ว (เช่น server ถูก restart) จะไม่มีใครทำต่อ
+    ดูจาก heartbeat ที่ขาดไปนานกว่า JOB_STALE_SECONDS — งานของ process อื่นที่ยังทำงานอยู่ไม่ถูกแตะ
+    include_own: รวมงานของ process นี้ที่ยังค้างอยู่ด้วย (ใช้ตอนสร้าง executor ใหม่ ซึ่งยังไม่มีงานใดทำอยู่)
+    """
+    conn.execute("""
+        UPDATE export_jobs
+        SET state='failed', error='ถูกยกเลิกเนื่องจาก process ที่สร้างงานหยุดทำงาน', finished_at=CURRENT_TIMESTAMP
+        WHERE state IN ('queued','running')
+          AND (
+              (owner IS NOT ? AND IFNULL(heartbeat_at, created_at) < datetime('now', ?))
+              OR (? AND owner = ?)
+          )
+    """, (PROCESS_TOKEN, f"-{int(JOB_STALE_SECONDS)} seconds", int(include_own), PROCESS_TOKEN))
+
+
+def _update_job(job_id: int, **fields):
+    sets = ", ".join(f"{k}=?" for k in fields)
+    with model.connection() as conn:
+        conn.execute(f"UPDATE export_jobs SET {sets} WHERE id=?", list(fields.values()) + [job_id])
+        conn.commit()
+
+
+def _run_export_job(db_path: str, job_id: int, fmt: str, start_date: str, end_date: str, status: str):
+    """ทำงานใน process ลูก: สร้างไฟล์แล้วบันทึกผลลง export_jobs"""
+    model.DB_PATH = db_path
+    _update_job(job_id, state="running", progress=0.0)
+
+    def progress(fraction: float):
+        _update_job(job_id, progress=round(min(max(fraction, 0.0), 1.0), 3))
+
+    path = os.path.join(EXPORT_DIR, f"report_{job_id}.{EXTENSIONS[fmt]}")
+    tmp_path = path + ".part"
+    try:
+        with open(tmp_path, "wb") as f:
+            exports.WRITERS[fmt](f, start_date, end_date, status, progress=progress)
+        os.replace(tmp_path, path)
+        _update_job(job_id, state="done", progress=1.0, file_path=path, finished_at=_now())
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        _update_job(job_id, state="failed", error=str(e), finished_at=_now())
+        raise
+
+
+def _now() -> str:
+    with model.connection() as conn:
+        return conn.execute("SELECT CURRENT_TIMESTAMP").fetchone()[0]
+
+
+def _insert_job(conn, fmt: str, start_date: str, end_date: str, status: str,
+                data_version: str, user_id) -> tuple:
+    """
+    บันทึกงานใหม่ (ทำงานใน transaction ของ model.execute_write)
+    return: (job id, เป็นงานใหม่หรือไม่) — งานเดียวกันที่มีอยู่แล้วคืน (id เดิม, False)
+    """
+    _fail_orphaned_jobs(conn)
+
+    row = conn.execute("""
+        SELECT id, state, file_path FROM export_jobs
+        WHERE fmt=? AND start_date=? AND end_date=? AND status_filter=? AND data_version=?
+          AND state IN ('queued','running','done')
+        ORDER BY id DESC
+        LIMIT 1
+    """, (fmt, start_date, end_date, status, data_version)).fetchone()
+    if row and (row[1] != "done" or (row[2] and os.path.exists(row[2]))):
+        return row[0], False
+
+    (pending,) = conn.execute(
+        "SELECT COUNT(*) FROM export_jobs WHERE state IN ('queued','running')"
+    ).fetchone()
+    if pending >= MAX_PENDING_JOBS:
+        raise JobLimitError("มีงานส่งออกค้างอยู่มาก กรุณารอสักครู่แล้วลองใหม่")
+
+    if user_id is not None:
+        (mine,) = conn.execute("""
+            SELECT COUNT(*) FROM export_jobs
+            WHERE state IN ('queued','running') AND requested_by=?
+        """, (user_id,)).fetchone()
+        if mine >= MAX_PENDING_PER_USER:
+            raise JobLimitError(f"ส่งงานพร้อมกันได้ไม่เกิน {MAX_PENDING_PER_USER} งานต่อผู้ใช้")
+
+    cur = conn.execute("""
+        INSERT INTO export_jobs (
+            fmt, start_date, end_date, status_filter, data_version, requested_by,
+            owner, heartbeat_at
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    """, (fmt, start_date, end_date, status, data_version, user_id, PROCESS_TOKEN))
+    return cur.lastrowid, True
+
+
+def report_data_version() -> str:
+    """version ของข้อมูลรายงานปัจจุบัน (รูปแบบเดียวกับคอลัมน์ export_jobs.data_version)"""
+    return repr(model.table_versions(exports.REPORT_TABLES))
+
+
+def submit_export(fmt: str, start_date: str, end_date: str, status: str, user_id: int = None) -> int:
+    """
+    ส่งงานสร้างไฟล์รายงาน คืนค่า job id
+    - ถ้ามีงานเดียวกัน (เงื่อนไขและ version ข้อมูลเดียวกัน) ที่เสร็จหรือกำลังทำอยู่ จะใช้งานนั้นแทน
+    - raise JobLimitError เมื่อมีงานค้างเกินกำหนด
+    """
+    if fmt not in exports.FORMATS:
+        raise ValueError(f"ไม่รองรับรูปแบบ {fmt}")
+
+    executor = _get_executor()
+    cleanup_old_jobs()
+    data_version = report_data_version()
+
+    job_id, is_new = model.execute_write(
+        _insert_job, fmt, start_date, end_date, status, data_version, user_id
+    )
+    if not is_new:
+        return job_id
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    future = executor.submit(
+        _run_export_job, model.DB_PATH, job_id, fmt, start_date, end_date, status
+    )
+    future.add_done_callback(lambda f, job_id=job_id: _on_job_done(job_id, f))
+    return job_id
+
+
+def _on_job_done(job_id: int, future):
+    # process ลูกตายกลางคัน (เช่น หน่วยความจำไม่พอ) จะไม่ได้บันทึกสถานะเอง
+    if future.exception() is not None:
+        model.execute_write(_fail_job, job_id, str(future.exception()))
+
+
+def _fail_job(conn, job_id: int, error: str):
+    conn.execute("""
+        UPDATE export_jobs
+        SET state='failed', error=?, finished_at=CURRENT_TIMESTAMP
+        WHERE id=? AND state IN ('queued','running')
+    """, (error, job_id))
+
+
+def get_job(job_id: int):
+    """ข้อมูลงาน 1 งาน เป็น dict (None ถ้าไม่พบ)"""
+    with model.connection() as conn:
+        cur = conn.execute("SELECT * FROM export_jobs WHERE id=?", (job_id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        return dict(zip([d[0] for d in cur.description], row))
+
+
+def open_job_file(job_id: int):
+    """
+    เปิดไฟล์ผลลัพธ์ (binary) ถ้างานเสร็จแล้ว — None ถ้ายังไม่เสร็จหรือไฟล์ถูกลบแล้ว
+    ผู้เรียกต้องปิดไฟล์เอง
+    """
+    job = get_job(job_id)
+    if not job or job["state"] != "done" or not job["file_path"]:
+        return None
+    try:
+        return open(job["file_path"], "rb")
+    except FileNotFoundError:
+        return None
+
+
+def cleanup_old_jobs(max_age_hours: float = JOB_MAX_AGE_HOURS) -> int:
+    """ลบไฟล์และรายการงานที่เสร็จ/ล้มเหลวนานเกิน max_age_hours คืนค่าจำนวนงานที่ลบ"""
+    with model.connection() as conn:
+        rows = conn.execute("""
+            SELECT id, file_path FROM export_jobs
+            WHERE state IN ('done','failed')
+              AND created_at < datetime('now', ?)
+        """, (f"-{float(max_age_hours)} hours",)).fetchall()
+
+    for _, path in rows:
+        if path and os.path.exists(path):
+            os.remove(path)
+
+    if rows:
+        model.execute_write(_delete_jobs, [r[0] for r in rows])
+    return len(rows)
+
+
+def _delete_jobs(conn, job_ids: list):
+    conn.executemany("DELETE FROM export_jobs WHERE id=?", [(job_id,) for job_id in job_ids])
@@ -0,0 +1,404 @@
+# loadtest.py — จำลองจุดบริการยืม-คืนหลายจุดพร้อมกัน บนสำเนาของฐานข้อมูล
+#   python loadtest.py --workers 8 --duration 30
+#   python loadtest.py --workers 4 8 16 --mode process --source bench_data/bench_100k.db
+# รายงาน throughput, latency p50/p95/p99, อัตรา "database is locked" และตรวจความถูกต้องของสถานะหนังสือ
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import controller
+import model
+
+DEFAULT_DURATION = 20.0
+DEFAULT_SEED = 7
+
+# สัดส่วนการทำงานของ 1 จุดบริการ (น้ำหนัก)
+OPERATION_MIX = {
+    "login": 5,
+    "borrow": 30,
+    "return": 30,
+    "active_items": 15,     # หน้าคืนหนังสือ: รายการที่ยังไม่คืน
+    "book_search": 10,      # ค้นหนังสือตอนยืม
+    "report": 10,           # รายงานการยืม-คืน 30 วันล่าสุด
+}
+
+# ผลลัพธ์ของ 1 operation
+# outcome: ok / rejected (ผิดเงื่อนไขทางธุรกิจ เช่น หนังสือถูกยืมไปแล้ว) / locked / error
+OpResult = namedtuple("OpResult", ["op", "outcome", "latency_ms", "finished_at"])
+
+LOCK_MARKERS = ("database is locked", "database table is locked", "ไม่มี connection ว่าง", "คิวงานเขียนเต็ม")
+
+
+def scratch_copy(source: str, directory: str) -> str:
+    """สำเนาฐานข้อมูลด้วย backup API (ได้ข้อมูลที่สอดคล้องกันแม้ต้นฉบับเปิด WAL อยู่)"""
+    target = os.path.join(directory, "loadtest.db")
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    return target
+
+
+def _classify(ok: bool, messages) -> str:
+    if ok:
+        return "ok"
+    text = " ".join(messages or [])
+    if any(m in text for m in LOCK_MARKERS):
+        return "locked"
+    if "ไม่สามารถ" in text:
+        return "error"
+    return "rejected"
+
+
+class Desk:
+    """จุดบริการ 1 จุด: สุ่ม operation ตาม OPERATION_MIX แล้วเรียก controller/model"""
+
+    def __init__(self, desk_no: int, seed: int, username: str, password: str,
+                 staff_id: int, book_ids: list, member_ids: list, open_items: list):
+        self.rng = random.Random(seed * 1000 + desk_no)
+        self.username = username
+        self.password = password
+        self.staff_id = staff_id
+        self.book_ids = book_ids
+        self.member_ids = member_ids
+        # รายการที่ยังไม่คืน (ร่วมกันทุก desk ใน process เดียวกัน แต่ละ desk หยิบไม่ซ้ำกัน)
+        self.open_items = open_items
+        self.ops = list(OPERATION_MIX)
+        self.weights = [OPERATION_MIX[o] for o in self.ops]
+
+    def run_one(self) -> OpResult:
+        op = self.rng.choices(self.ops, self.weights)[0]
+        if op == "return" and not self.open_items:
+            op = "borrow"   # ไม่มีอะไรให้คืน ผู้ใช้ที่มาถึงจุดบริการจึงเป็นผู้มายืม
+        started = time.perf_counter()
+        try:
+            outcome = getattr(self, "op_" + op)()
+        except sqlite3.OperationalError as e:
+            outcome = "locked" if any(m in str(e) for m in LOCK_MARKERS) else "error"
+        except Exception:
+            outcome = "error"
+        return OpResult(op, outcome, (time.perf_counter() - started) * 1000, time.time())
+
+    def op_login(self) -> str:
+        ok, msgs, _ = controller.login(self.username, self.password)
+        return _classify(ok, msgs)
+
+    def op_borrow(self) -> str:
+        books = self.rng.sample(self.book_ids, self.rng.randint(1, 3))
+        due = (date.today() + timedelta(days=7)).isoformat()
+        ok, msgs, tx_id = controller.borrow_books(self.rng.choice(self.member_ids), self.staff_id, due, books)
+        if ok:
+            with model.connection() as conn:
+                items = [r[0] for r in conn.execute("SELECT id FROM borrow_items WHERE tx_id=?", (tx_id,))]
+            self.open_items.extend(items)
+        return _classify(ok, msgs)
+
+    def op_return(self) -> str:
+        items = []
+        for _ in range(self.rng.randint(1, 3)):
+            try:
+                items.append(self.open_items.pop(self.rng.randrange(len(self.open_items))))
+            except (IndexError, ValueError):
+                break
+        if not items:
+            return "rejected"   # desk อื่นหยิบรายการสุดท้ายไปก่อน
+        ok, msgs = controller.return_book_items(items, self.staff_id)
+        return _classify(ok, msgs)
+
+    def op_active_items(self) -> str:
+        model.get_active_borrow_items()
+        return "ok"
+
+    def op_book_search(self) -> str:
+        model.search_books(self.rng.choice(("42", "การ", "ไทย", "the", "data", "ทะเล")))
+        return "ok"
+
+    def op_report(self) -> str:
+        end = date.today()
+        model.get_borrow_report((end - timedelta(days=30)).isoformat(), end.isoformat(), "all")
+        return "ok"
+
+
+def _load_fixtures(db_path: str):
+    conn = sqlite3.connect(db_path)
+    try:
+        book_ids = [r[0] for r in conn.execute("SELECT id FROM books")]
+        member_ids = [r[0] for r in conn.execute("SELECT id FROM members WHERE is_active=1")]
+        open_items = [r[0] for r in conn.execute("SELECT id FROM borrow_items WHERE status='borrowed'")]
+    finally:
+        conn.close()
+    return book_ids, member_ids, open_items
+
+
+def _staff_id(db_path: str, username: str) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        row = conn.execute("SELECT id FROM users WHERE username=?", (username,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        raise SystemExit(f"ไม่พบผู้ใช้ {username} ในฐานข้อมูล")
+    return row[0]
+
+
+def run_desks(db_path: str, desks: list, duration: float, seed: int, username: str, password: str,
+              staff_id: int, shard: tuple = (0, 1)) -> tuple:
+    """
+    รัน desk หมายเลขใน desks เป็น thread ละ 1 desk จนครบ duration วินาที
+    shard = (ลำดับ, จำนวน) ใช้แบ่งรายการที่ยังไม่คืนระหว่าง process ไม่ให้คืนซ้ำกัน
+    return: (list ของ OpResult, สถิติ group commit ของ process นี้)
+    """
+    model.DB_PATH = db_path
+    model.POOL_SIZE = max(model.POOL_SIZE, len(desks))
+    book_ids, member_ids, open_items = _load_fixtures(db_path)
+    open_items = open_items[shard[0]::shard[1]]
+    lock = threading.Lock()
+
+    class SharedItems(list):
+        # list ที่หลาย desk ใน process เดียวกันหยิบ/เติมพร้อมกันได้
+        def pop(self, index=-1):
+            with lock:
+                return super().pop(index % len(self)) if self else super().pop()
+
+        def extend(self, items):
+            with lock:
+                super().extend(items)
+
+    shared = SharedItems(open_items)
+    deadline = time.monotonic() + duration
+
+    def work(desk_no: int) -> list:
+        desk = Desk(desk_no, seed, username, password, staff_id, book_ids, member_ids, shared)
+        results = []
+        while time.monotonic() < deadline:
+            results.append(desk.run_one())
+        return results
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(desks)) as pool:
+            results = [r for part in pool.map(work, desks) for r in part]
+        return results, model.write_queue_stats()
+    finally:
+        model.close_pools()
+
+
+def _run_process(args) -> tuple:
+    return run_desks(*args)
+
+
+def merge_write_stats(parts: list) -> dict:
+    """รวมสถิติ group commit จากหลาย process"""
+    parts = [p for p in parts if p]
+    batches = sum(p["batches"] for p in parts)
+    ops = sum(p["ops"] for p in parts)
+    return {
+        "batches": batches,
+        "ops": ops,
+        "avg_batch": round(ops / batches, 2) if batches else 0.0,
+        "max_batch": max((p["max_batch"] for p in parts), default=0),
+        "failed_batches": sum(p["failed_batches"] for p in parts),
+    }
+
+
+def check_consistency(db_path: str) -> dict:
+    """ตรวจความสอดคล้องของข้อมูลหลังทดสอบ (ค่า 0 ทุกช่องคือถูกต้อง)"""
+    conn = sqlite3.connect(db_path)
+    try:
+        result = {
+            # หนังสือ borrowed แต่ไม่มีรายการค้าง หรือมีรายการค้างแต่สถานะไม่ใช่ borrowed
+            "book_status_mismatch": conn.execute("""
+                SELECT COUNT(*) FROM books b
+                WHERE (b.status = 'borrowed') != EXISTS (
+                    SELECT 1 FROM borrow_items bi WHERE bi.book_id = b.id AND bi.status = 'borrowed'
+                )
+            """).fetchone()[0],
+            # หนังสือเล่มเดียวถูกยืมค้างอยู่มากกว่า 1 รายการ
+            "double_borrowed_books": conn.execute("""
+                SELECT COUNT(*) FROM (
+                    SELECT book_id FROM borrow_items WHERE status = 'borrowed'
+                    GROUP BY book_id HAVING COUNT(*) > 1
+                )
+            """).fetchone()[0],
+            # transaction ที่สถานะไม่ตรงกับรายการข้างใน
+            "tx_status_mismatch": conn.execute("""
+                SELECT COUNT(*) FROM borrow_tx tx
+                WHERE (tx.status = 'open') != EXISTS (
+                    SELECT 1 FROM borrow_items bi WHERE bi.tx_id = tx.id AND bi.status = 'borrowed'
+                )
+            """).fetchone()[0],
+        }
+    finally:
+        conn.close()
+
+    model.DB_PATH = db_path
+    try:
+        for table, count in model.verify_summary_tables().items():
+            result[f"summary_{table}"] = count
+    finally:
+        model.close_pools()
+    return result
+
+
+def _percentile(ordered: list, q: float) -> float:
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(results: list, elapsed: float) -> dict:
+    by_op = defaultdict(list)
+    for r in results:
+        by_op[r.op].append(r)
+
+    def stats(rows: list) -> dict:
+        latencies = sorted(r.latency_ms for r in rows)
+        outcomes = defaultdict(int)
+        for r in rows:
+            outcomes[r.outcome] += 1
+        return {
+            "count": len(rows),
+            "per_sec": round(len(rows) / elapsed, 1) if elapsed else 0.0,
+            "ok": outcomes["ok"],
+            "rejected": outcomes["rejected"],
+            "locked": outcomes["locked"],
+            "error": outcomes["error"],
+            "locked_rate": round(outcomes["locked"] / len(rows), 4) if rows else 0.0,
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p95_ms": round(_percentile(latencies, 0.95), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        }
+
+    return {
+        "total": stats(results),
+        "operations": {op: stats(rows) for op, rows in sorted(by_op.items())},
+    }
+
+
+def run(source: str, workers: int, duration: float, mode: str, seed: int,
+        username: str, password: str, keep: bool = False) -> dict:
+    """ทดสอบ 1 รอบด้วยจำนวนจุดบริการ workers บนสำเนาใหม่ของ source"""
+    directory = tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        db_path = scratch_copy(source, directory)
+        model.DB_PATH = db_path
+        model.init_db()
+        model.close_pools()
+        staff_id = _staff_id(db_path, username)
+        before = check_consistency(db_path)
+
+        started = time.perf_counter()
+        if mode == "process":
+            ctx = multiprocessing.get_context("spawn")
+            jobs = [
+                (db_path, [n], duration, seed, username, password, staff_id, (n, workers))
+                for n in range(workers)
+            ]
+            with ctx.Pool(workers) as pool:
+                parts = pool.map(_run_process, jobs)
+            results = [r for part, _ in parts for r in part]
+            write_stats = merge_write_stats([stats for _, stats in parts])
+        else:
+            results, write_stats = run_desks(
+                db_path, list(range(workers)), duration, seed, username, password, staff_id
+            )
+            write_stats = merge_write_stats([write_stats])
+        elapsed = time.perf_counter() - started
+        if results:
+            # ไม่นับเวลาเริ่ม process/thread: ใช้ช่วงเวลาตั้งแต่ operation แรกเริ่มถึงตัวสุดท้ายเสร็จ
+            elapsed = max(r.finished_at for r in results) - min(r.finished_at - r.latency_ms / 1000 for r in results)
+
+        report = {
+            "workers": workers,
+            "mode": mode,
+            "duration_s": round(elapsed, 2),
+            **summarize(results, elapsed),
+            "write_queue": write_stats,
+            "consistency_before": before,
+            "consistency": check_consistency(db_path),
+        }
+        if keep:
+            report["db_path"] = db_path
+        return report
+    finally:
+        if not keep:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def print_report(report: dict):
+    total = report["total"]
+    print(f"\n=== {report['workers']} จุดบริการ ({report['mode']}), {report['duration_s']} วินาที ===")
+    print(f"throughput {total['per_sec']} ops/s  locked {total['locked_rate']:.2%}  "
+          f"p50 {total['p50_ms']} ms  p95 {total['p95_ms']} ms  p99 {total['p99_ms']} ms")
+    print(f"{'operation':<14}{'count':>8}{'ops/s':>8}{'ok':>8}{'reject':>8}{'locked':>8}{'error':>7}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}")
+    for op, s in report["operations"].items():
+        print(f"{op:<14}{s['count']:>8}{s['per_sec']:>8}{s['ok']:>8}{s['rejected']:>8}{s['locked']:>8}"
+              f"{s['error']:>7}{s['p50_ms']:>9}{s['p95_ms']:>9}{s['p99_ms']:>9}")
+    wq = report.get("write_queue")
+    if wq and wq["batches"]:
+        print(f"group commit: งานเขียน {wq['ops']} งาน ใน {wq['batches']} commit "
+              f"(เฉลี่ย {wq['avg_batch']} งาน/commit, สูงสุด {wq['max_batch']})")
+    problems = new_inconsistencies(report)
+    print("ความถูกต้องของข้อมูล: " + ("ถูกต้อง" if not problems else f"ผิดพลาด {problems}"))
+    existing = {k: v for k, v in report["consistency_before"].items() if v}
+    if existing:
+        print(f"(ข้อมูลต้นฉบับไม่สอดคล้องอยู่ก่อนแล้ว: {existing})")
+
+
+def new_inconsistencies(report: dict) -> dict:
+    """ความไม่สอดคล้องที่เพิ่มขึ้นระหว่างทดสอบ (ไม่นับที่มีอยู่ในข้อมูลต้นฉบับ)"""
+    before = report["consistency_before"]
+    return {
+        k: v - before.get(k, 0)
+        for k, v in report["consistency"].items()
+        if v > before.get(k, 0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ทดสอบโหลดจุดบริการยืม-คืนพร้อมกันหลายจุด")
+    parser.add_argument("--source", default=model.DB_PATH, help="ฐานข้อมูลต้นฉบับ (ไม่ถูกแก้ไข)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4], help="จำนวนจุดบริการ (ระบุได้หลายค่า)")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="วินาทีต่อรอบ")
+    parser.add_argument("--mode", choices=("thread", "process"), default="thread")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="1234")
+    parser.add_argument("--json", help="บันทึกผลเป็นไฟล์ JSON")
+    parser.add_argument("--keep", action="store_true", help="เก็บสำเนาฐานข้อมูลไว้หลังทดสอบ")
+    args = parser.parse_args()
+
+    reports = []
+    for workers in args.workers:
+        report = run(args.source, workers, args.duration, args.mode, args.seed,
+                     args.username, args.password, args.keep)
+        print_report(report)
+        reports.append(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+
+    broken = any(new_inconsistencies(r) for r in reports)
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,655 @@
+import sqlite3
+import hashlib
+
+# ============================================================
+# Schema migrations
+# ============================================================
+# แต่ละขั้นมีหมายเลข version เรียงกัน และรันเพียงครั้งเดียวต่อฐานข้อมูล
+# version ที่รันแล้วถูกบันทึกในตาราง schema_version
+# (เพิ่มขั้นใหม่ต่อท้าย MIGRATIONS เท่านั้น ห้ามแก้ขั้นที่ถูกใช้งานแล้ว)
+
+
+def _hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode("utf-8")).hexdigest()
+
+
+def _base_schema(c: sqlite3.Cursor):
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS books (
+            id      INTEGER PRIMARY KEY AUTOINCREMENT,
+            title   TEXT NOT NULL,
+            author  TEXT,
+            status  TEXT DEFAULT 'available'    -- available / borrowed
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS members (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_code  TEXT NOT NULL UNIQUE,   -- รหัสสมาชิก เช่น M001
+            name         TEXT NOT NULL,          -- ชื่อ - สกุล
+            gender       TEXT,                   -- เพศ
+            email        TEXT UNIQUE,            -- อีเมล
+            phone        TEXT,                   -- เบอร์โทร
+            is_active    INTEGER DEFAULT 1,      -- 1 = ใช้งาน, 0 = ยกเลิก
+            created_at   TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL UNIQUE,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL CHECK(role IN ('admin','staff')),
+            is_active INTEGER NOT NULL DEFAULT 1
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS borrow_tx (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id INTEGER NOT NULL,
+            staff_user_id INTEGER NOT NULL,
+            borrow_date TEXT DEFAULT CURRENT_TIMESTAMP,
+            default_due_date TEXT NOT NULL,
+            status TEXT DEFAULT 'open'
+        )
+    """)
+
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS borrow_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            due_date TEXT NOT NULL,
+            return_date TEXT,
+            status TEXT DEFAULT 'borrowed',
+            return_staff_user_id INTEGER
+        )
+    """)
+
+    # ตารางยืมแบบเดิม (1 เล่มต่อรายการ) เก็บไว้เพื่อข้อมูลเก่า
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS borrows (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id     INTEGER NOT NULL,
+            member_id   INTEGER NOT NULL,
+            borrow_date TEXT    NOT NULL,
+            due_date    TEXT,
+            return_date TEXT,
+            status      TEXT DEFAULT 'borrowed',
+            returned    INTEGER DEFAULT 0,
+            FOREIGN KEY(book_id)   REFERENCES books(id),
+            FOREIGN KEY(member_id) REFERENCES members(id)
+        )
+    """)
+
+
+def _seed_admin(c: sqlite3.Cursor):
+    # seed admin (ถ้ายังไม่มี user เลย)
+    (count,) = c.execute("SELECT COUNT(*) FROM users").fetchone()
+    if count == 0:
+        c.execute(
+            "INSERT INTO users (username, password_hash, role, is_active) VALUES (?, ?, ?, ?)",
+            ("admin", _hash_password("1234"), "admin", 1)
+        )
+
+
+def _borrow_constraints(c: sqlite3.Cursor):
+    # ฐานข้อมูลเก่าบางไฟล์สร้าง borrow_tx / borrow_items โดยไม่มี NOT NULL
+    # สร้างตารางใหม่พร้อม constraint แล้วย้ายข้อมูล (SQLite เพิ่ม constraint ภายหลังไม่ได้)
+    # สถานะเดิมที่ไม่ตรงกับ CHECK (NULL, ตัวพิมพ์ใหญ่/ช่องว่าง, ค่าอื่น) ถูกปรับตามข้อมูลการคืน
+    # - รายการยืม: มี return_date = returned, ไม่มี = borrowed
+    # - รายการหลัก: ยังมีรายการยืมที่ไม่ได้คืน = open, ไม่มี = closed
+    c.execute("""
+        CREATE TABLE borrow_tx_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            member_id INTEGER NOT NULL REFERENCES members(id),
+            staff_user_id INTEGER NOT NULL REFERENCES users(id),
+            borrow_date TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            default_due_date TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'open' CHECK(status IN ('open','closed'))
+        )
+    """)
+    c.execute("""
+        INSERT INTO borrow_tx_new (id, member_id, staff_user_id, borrow_date, default_due_date, status)
+        SELECT id, member_id, staff_user_id,
+               IFNULL(borrow_date, CURRENT_TIMESTAMP), default_due_date,
+               CASE
+                   WHEN lower(trim(status)) IN ('open', 'closed') THEN lower(trim(status))
+                   WHEN EXISTS (
+                       SELECT 1 FROM borrow_items bi
+                       WHERE bi.tx_id = borrow_tx.id
+                         AND bi.return_date IS NULL
+                         AND IFNULL(lower(trim(bi.status)), 'borrowed') <> 'returned'
+                   ) THEN 'open'
+                   ELSE 'closed'
+               END
+        FROM borrow_tx
+    """)
+    c.execute("DROP TABLE borrow_tx")
+    c.execute("ALTER TABLE borrow_tx_new RENAME TO borrow_tx")
+
+    c.execute("""
+        CREATE TABLE borrow_items_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_id INTEGER NOT NULL REFERENCES borrow_tx(id),
+            book_id INTEGER NOT NULL REFERENCES books(id),
+            due_date TEXT NOT NULL,
+            return_date TEXT,
+            status TEXT NOT NULL DEFAULT 'borrowed' CHECK(status IN ('borrowed','returned')),
+            return_staff_user_id INTEGER REFERENCES users(id)
+        )
+    """)
+    c.execute("""
+        INSERT INTO borrow_items_new (id, tx_id, book_id, due_date, return_date, status, return_staff_user_id)
+        SELECT id, tx_id, book_id, due_date, return_date,
+               CASE
+                   WHEN lower(trim(status)) IN ('borrowed', 'returned') THEN lower(trim(status))
+                   WHEN return_date IS NOT NULL THEN 'returned'
+                   ELSE 'borrowed'
+               END,
+               return_staff_user_id
+        FROM borrow_items
+    """)
+    c.execute("DROP TABLE borrow_items")
+    c.execute("ALTER TABLE borrow_items_new RENAME TO borrow_items")
+
+    # index สำหรับ JOIN ที่ใช้บ่อยในหน้า ยืม-คืน
+    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_items_tx ON borrow_items(tx_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_items_book ON borrow_items(book_id)")
+
+
+def _circulation_indexes(c: sqlite3.Cursor):
+    # รายการที่ยังไม่คืน (partial index เก็บเฉพาะแถวที่ยังยืมอยู่ จึงเล็กแม้ประวัติจะยาวหลายปี)
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_borrow_items_open
+        ON borrow_items(status) WHERE status = 'borrowed'
+    """)
+    # รายการยืมของสมาชิก 1 คน (หน้า คืนหนังสือ)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_tx_member ON borrow_tx(member_id)")
+    # รายงาน/กราฟที่กรองตามช่วงวันที่ยืม
+    c.execute("CREATE INDEX IF NOT EXISTS idx_borrow_tx_borrow_date ON borrow_tx(borrow_date)")
+    c.execute("ANALYZE")
+
+
+def _search_index(c: sqlite3.Cursor):
+    # ดัชนีค้นหาแบบ full-text (trigram: ค้นบางส่วนของคำได้ รวมถึงภาษาไทยที่ไม่มีช่องว่าง)
+    # rowid ของตาราง fts = id ของตารางต้นทาง
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts
+        USING fts5(code, title, author, tokenize='trigram')
+    """)
+    c.execute("""
+        INSERT INTO books_fts (rowid, code, title, author)
+        SELECT id, id, title, IFNULL(author, '') FROM books
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, code, title, author)
+            VALUES (new.id, new.id, new.title, IFNULL(new.author, ''));
+        END
+    """)
+    # เปลี่ยนแค่ status (ยืม/คืน) ไม่ต้องแก้ดัชนี
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_au AFTER UPDATE OF title, author ON books BEGIN
+            UPDATE books_fts
+            SET title = new.title, author = IFNULL(new.author, '')
+            WHERE rowid = old.id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_ad AFTER DELETE ON books BEGIN
+            DELETE FROM books_fts WHERE rowid = old.id;
+        END
+    """)
+
+    c.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS members_fts
+        USING fts5(member_code, name, tokenize='trigram')
+    """)
+    c.execute("""
+        INSERT INTO members_fts (rowid, member_code, name)
+        SELECT id, member_code, name FROM members
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS members_fts_ai AFTER INSERT ON members BEGIN
+            INSERT INTO members_fts (rowid, member_code, name)
+            VALUES (new.id, new.member_code, new.name);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS members_fts_au AFTER UPDATE OF member_code, name ON members BEGIN
+            UPDATE members_fts
+            SET member_code = new.member_code, name = new.name
+            WHERE rowid = old.id;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS members_fts_ad AFTER DELETE ON members BEGIN
+            DELETE FROM members_fts WHERE rowid = old.id;
+        END
+    """)
+
+
+def _change_counters(c: sqlite3.Cursor):
+    # เลข version ต่อตาราง ใช้ตรวจว่าข้อมูลเปลี่ยนหรือไม่ (ดู model.bump_tables)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name    TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    c.executemany(
+        "INSERT OR IGNORE INTO change_counters (name) VALUES (?)",
+        [("books",), ("members",), ("users",), ("borrow_tx",), ("borrow_items",)]
+    )
+
+
+# ตารางสรุปที่ trigger คำนวณเพิ่ม/ลดทีละแถว และ query ที่ใช้คำนวณใหม่ทั้งหมด
+# (ใช้ทั้งตอนสร้างครั้งแรก และตอน rebuild/verify ใน model)
+# ชื่อตาราง → (คอลัมน์ key, query ต้นทาง)
+SUMMARY_SOURCES = {
+    "book_status_counts": ("status", """
+        SELECT IFNULL(status, '') AS status, COUNT(*) AS count
+        FROM books
+        GROUP BY IFNULL(status, '')
+    """),
+    "borrow_daily_counts": ("day", """
+        SELECT substr(borrow_date, 1, 10) AS day, COUNT(*) AS count
+        FROM borrow_tx
+        GROUP BY substr(borrow_date, 1, 10)
+    """),
+    "borrow_monthly_counts": ("month", """
+        SELECT substr(borrow_date, 1, 7) AS month, COUNT(*) AS count
+        FROM borrow_tx
+        GROUP BY substr(borrow_date, 1, 7)
+    """),
+}
+
+
+def rebuild_summaries(c: sqlite3.Cursor, sources: dict = SUMMARY_SOURCES):
+    """คำนวณตารางสรุปใหม่ทั้งหมดจากตารางต้นทาง"""
+    for table, (_, source) in sources.items():
+        c.execute(f"DELETE FROM {table}")
+        c.execute(f"INSERT INTO {table} {source}")
+
+
+def _summary_tables(c: sqlite3.Cursor):
+    # จำนวนหนังสือตามสถานะ และจำนวนการยืมรายวัน/รายเดือน
+    # ให้หน้ารายงานอ่านไม่กี่แถว แทนการ GROUP BY ข้อมูลทั้งหมดทุกครั้ง
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS book_status_counts (
+            status TEXT PRIMARY KEY,
+            count  INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS borrow_daily_counts (
+            day   TEXT PRIMARY KEY,     -- YYYY-MM-DD
+            count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS borrow_monthly_counts (
+            month TEXT PRIMARY KEY,     -- YYYY-MM
+            count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+    # ---------- books → book_status_counts ----------
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS book_status_counts_ai AFTER INSERT ON books BEGIN
+            INSERT INTO book_status_counts (status, count) VALUES (IFNULL(new.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS book_status_counts_ad AFTER DELETE ON books BEGIN
+            UPDATE book_status_counts SET count = count - 1 WHERE status = IFNULL(old.status, '');
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS book_status_counts_au AFTER UPDATE OF status ON books
+        WHEN old.status IS NOT new.status BEGIN
+            UPDATE book_status_counts SET count = count - 1 WHERE status = IFNULL(old.status, '');
+            INSERT INTO book_status_counts (status, count) VALUES (IFNULL(new.status, ''), 1)
+            ON CONFLICT(status) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+    # ---------- borrow_tx → borrow_daily_counts / borrow_monthly_counts ----------
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS borrow_counts_ai AFTER INSERT ON borrow_tx BEGIN
+            INSERT INTO borrow_daily_counts (day, count) VALUES (substr(new.borrow_date, 1, 10), 1)
+            ON CONFLICT(day) DO UPDATE SET count = count + 1;
+            INSERT INTO borrow_monthly_counts (month, count) VALUES (substr(new.borrow_date, 1, 7), 1)
+            ON CONFLICT(month) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS borrow_counts_ad AFTER DELETE ON borrow_tx BEGIN
+            UPDATE borrow_daily_counts SET count = count - 1 WHERE day = substr(old.borrow_date, 1, 10);
+            UPDATE borrow_monthly_counts SET count = count - 1 WHERE month = substr(old.borrow_date, 1, 7);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS borrow_counts_au AFTER UPDATE OF borrow_date ON borrow_tx
+        WHEN old.borrow_date IS NOT new.borrow_date BEGIN
+            UPDATE borrow_daily_counts SET count = count - 1 WHERE day = substr(old.borrow_date, 1, 10);
+            UPDATE borrow_monthly_counts SET count = count - 1 WHERE month = substr(old.borrow_date, 1, 7);
+            INSERT INTO borrow_daily_counts (day, count) VALUES (substr(new.borrow_date, 1, 10), 1)
+            ON CONFLICT(day) DO UPDATE SET count = count + 1;
+            INSERT INTO borrow_monthly_counts (month, count) VALUES (substr(new.borrow_date, 1, 7), 1)
+            ON CONFLICT(month) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+    rebuild_summaries(c)
+
+
+def _export_jobs(c: sqlite3.Cursor):
+    # งานส่งออกรายงานที่รันเบื้องหลัง (ดู jobs.py)
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS export_jobs (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            fmt           TEXT NOT NULL,                  -- csv / xlsx / pdf
+            start_date    TEXT NOT NULL,
+            end_date      TEXT NOT NULL,
+            status_filter TEXT NOT NULL,                  -- all / borrowed / returned
+            data_version  TEXT NOT NULL,                  -- version ของข้อมูลตอนสั่งงาน
+            state         TEXT NOT NULL DEFAULT 'queued'
+                          CHECK(state IN ('queued','running','done','failed')),
+            progress      REAL NOT NULL DEFAULT 0,        -- 0.0 - 1.0
+            file_path     TEXT,
+            error         TEXT,
+            requested_by  INTEGER REFERENCES users(id),
+            created_at    TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            finished_at   TEXT
+        )
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_export_jobs_state ON export_jobs(state)")
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_export_jobs_lookup
+        ON export_jobs(fmt, start_date, end_date, status_filter, data_version)
+    """)
+
+
+def _api_sessions(c: sqlite3.Cursor):
+    # token ของ JSON API (ดู api.py) — เก็บเฉพาะ hash ของ token
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS api_sessions (
+            token_hash  TEXT PRIMARY KEY,
+            user_id     INTEGER NOT NULL REFERENCES users(id),
+            created_at  TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expires_at  TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_api_sessions_expires ON api_sessions(expires_at)")
+
+
+def _one_open_loan_per_book(c: sqlite3.Cursor):
+    # หนังสือ 1 เล่มมีรายการที่ยังไม่คืนได้ไม่เกิน 1 รายการ
+    # และใช้หารายการยืมจากรหัสหนังสือที่สแกนตอนคืน (ค้นดัชนีครั้งเดียวต่อเล่ม)
+    # ข้อมูลเก่าที่มีรายการค้างซ้ำ: ถือรายการล่าสุดเป็นรายการจริง
+    # รายการก่อนหน้าถือว่าคืนแล้ว ณ วันที่ยืมรายการถัดไป (return_staff_user_id ว่าง)
+    c.execute("""
+        UPDATE borrow_items
+        SET status = 'returned',
+            return_date = (
+                SELECT tx.borrow_date
+                FROM borrow_items newer
+                JOIN borrow_tx tx ON tx.id = newer.tx_id
+                WHERE newer.book_id = borrow_items.book_id
+                  AND newer.status = 'borrowed'
+                  AND newer.id > borrow_items.id
+                ORDER BY newer.id
+                LIMIT 1
+            )
+        WHERE status = 'borrowed'
+          AND EXISTS (
+              SELECT 1 FROM borrow_items newer
+              WHERE newer.book_id = borrow_items.book_id
+                AND newer.status = 'borrowed'
+                AND newer.id > borrow_items.id
+          )
+    """)
+    c.execute("""
+        UPDATE borrow_tx
+        SET status = 'closed'
+        WHERE status = 'open'
+          AND NOT EXISTS (
+              SELECT 1 FROM borrow_items bi
+              WHERE bi.tx_id = borrow_tx.id
+                AND bi.status = 'borrowed'
+          )
+    """)
+    c.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_borrow_items_open_book
+        ON borrow_items(book_id) WHERE status = 'borrowed'
+    """)
+
+
+# จำนวนรายการเกินกำหนดส่งต่อสมาชิก ณ วันที่ overdue_state.as_of (รายการที่ due_date < as_of)
+# ชื่อตาราง → (คอลัมน์ key, query ต้นทาง) รูปแบบเดียวกับ SUMMARY_SOURCES
+OVERDUE_SOURCES = {
+    "member_overdue_counts": ("member_id", """
+        SELECT tx.member_id AS member_id, COUNT(*) AS count
+        FROM borrow_items bi
+        JOIN borrow_tx tx ON tx.id = bi.tx_id
+        WHERE bi.status = 'borrowed'
+          AND bi.due_date < (SELECT as_of FROM overdue_state)
+        GROUP BY tx.member_id
+    """),
+}
+
+
+def _overdue_counts(c: sqlite3.Cursor):
+    # รายการที่ยังไม่คืนเรียงตามกำหนดส่ง (partial index: เฉพาะรายการที่ยังยืมอยู่)
+    # หารายการเกินกำหนดด้วย range scan ไม่ต้องอ่านประวัติทั้งหมด
+    c.execute("""
+        CREATE INDEX IF NOT EXISTS idx_borrow_items_open_due
+        ON borrow_items(due_date) WHERE status = 'borrowed'
+    """)
+
+    # วันที่ที่ member_overdue_counts นับไว้ (แถวเดียว) — งานยืม/คืนเลื่อนวันที่ด้วย model._advance_overdue_counts
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS overdue_state (
+            id    INTEGER PRIMARY KEY CHECK(id = 1),
+            as_of TEXT NOT NULL            -- YYYY-MM-DD
+        )
+    """)
+    c.execute("INSERT OR IGNORE INTO overdue_state (id, as_of) VALUES (1, date('now', 'localtime'))")
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS member_overdue_counts (
+            member_id INTEGER PRIMARY KEY,
+            count     INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+    # ---------- borrow_items → member_overdue_counts (ยืม/คืน/แก้กำหนดส่ง) ----------
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS member_overdue_ai AFTER INSERT ON borrow_items
+        WHEN new.status = 'borrowed' AND new.due_date < (SELECT as_of FROM overdue_state) BEGIN
+            INSERT INTO member_overdue_counts (member_id, count)
+            VALUES ((SELECT member_id FROM borrow_tx WHERE id = new.tx_id), 1)
+            ON CONFLICT(member_id) DO UPDATE SET count = count + 1;
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS member_overdue_ad AFTER DELETE ON borrow_items
+        WHEN old.status = 'borrowed' AND old.due_date < (SELECT as_of FROM overdue_state) BEGIN
+            UPDATE member_overdue_counts SET count = count - 1
+            WHERE member_id = (SELECT member_id FROM borrow_tx WHERE id = old.tx_id);
+        END
+    """)
+    c.execute("""
+        CREATE TRIGGER IF NOT EXISTS member_overdue_au AFTER UPDATE OF status, due_date, tx_id ON borrow_items
+        WHEN old.status IS NOT new.status OR old.due_date IS NOT new.due_date OR old.tx_id IS NOT new.tx_id BEGIN
+            UPDATE member_overdue_counts SET count = count - 1
+            WHERE old.status = 'borrowed'
+              AND old.due_date < (SELECT as_of FROM overdue_state)
+              AND member_id = (SELECT member_id FROM borrow_tx WHERE id = old.tx_id);
+            INSERT INTO member_overdue_counts (member_id, count)
+            SELECT member_id, 1 FROM borrow_tx
+            WHERE id = new.tx_id
+              AND new.status = 'borrowed'
+              AND new.due_date < (SELECT as_of FROM overdue_state)
+            ON CONFLICT(member_id) DO UPDATE SET count = count + 1;
+        END
+    """)
+
+    rebuild_summaries(c, OVERDUE_SOURCES)
+
+
+def _quarantine_orphan_rows(c: sqlite3.Cursor):
+    # ข้อมูลเก่าที่สร้างก่อนเปิด PRAGMA foreign_keys อาจอ้างถึงแถวที่ไม่มีอยู่แล้ว
+    # ย้ายแถวที่ PRAGMA foreign_key_check รายงาน ไปเก็บทั้งแถวใน fk_quarantine (ไม่ลบทิ้ง ไม่สร้างข้อมูลแทน)
+    # ก่อนที่ model จะเปิดตรวจ foreign key ทุก connection — db_init.py แสดงจำนวนแถวที่ถูกย้าย
+    c.execute("""
+        CREATE TABLE IF NOT EXISTS fk_quarantine (
+            id             INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_table   TEXT NOT NULL,
+            source_rowid   INTEGER NOT NULL,
+            parent_table   TEXT NOT NULL,      -- ตารางที่ไม่มีแถวที่ถูกอ้างถึง
+            row_json       TEXT NOT NULL,      -- ข้อมูลเดิมทั้งแถว
+            quarantined_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    freed_books, touched_tx = set(), set()
+    # ย้ายรายการหลัก (borrow_tx) แล้ว รายการยืมของมันจะถูกรายงานในรอบถัดไป
+    while True:
+        violations = {}
+        for table, rowid, parent, _ in c.execute("PRAGMA foreign_key_check").fetchall():
+            violations.setdefault((table, rowid), parent)
+        if not violations:
+            break
+
+        for (table, rowid), parent in violations.items():
+            if table == "borrow_items":
+                tx_id, book_id, status = c.execute(
+                    "SELECT tx_id, book_id, status FROM borrow_items WHERE id = ?", (rowid,)
+                ).fetchone()
+                touched_tx.add(tx_id)
+                if status == "borrowed":
+                    freed_books.add(book_id)
+
+            columns = [row[1] for row in c.execute(f'PRAGMA table_info("{table}")').fetchall()]
+            row_json = ", ".join(f"'{col}', \"{col}\"" for col in columns)
+            c.execute(f"""
+                INSERT INTO fk_quarantine (source_table, source_rowid, parent_table, row_json)
+                SELECT ?, rowid, ?, json_object({row_json}) FROM "{table}" WHERE rowid = ?
+            """, (table, parent, rowid))
+            c.execute(f'DELETE FROM "{table}" WHERE rowid = ?', (rowid,))
+
+    # รายการหลักที่ไม่เหลือรายการค้างยืม ปิดรายการ / หนังสือที่ถูกยืมอยู่ด้วยรายการที่ย้ายไป กลับเป็นว่าง
+    c.executemany("""
+        UPDATE borrow_tx SET status = 'closed'
+        WHERE id = ? AND status = 'open'
+          AND NOT EXISTS (
+              SELECT 1 FROM borrow_items bi
+              WHERE bi.tx_id = borrow_tx.id AND bi.status = 'borrowed'
+          )
+    """, [(tx_id,) for tx_id in touched_tx])
+    c.executemany("""
+        UPDATE books SET status = 'available'
+        WHERE id = ? AND status = 'borrowed'
+          AND NOT EXISTS (
+              SELECT 1 FROM borrow_items bi
+              WHERE bi.book_id = books.id AND bi.status = 'borrowed'
+          )
+    """, [(book_id,) for book_id in freed_books])
+
+
+def _export_job_owner(c: sqlite3.Cursor):
+    # process ที่สั่งงานส่งออก (jobs.PROCESS_TOKEN ไม่ใช้ pid เพราะ pid ซ้ำได้หลัง restart)
+    # และเวลาล่าสุดที่ process นั้นยืนยันว่ายังทำงานอยู่ (ดู jobs._heartbeat_loop)
+    # ใช้แยกงานที่ค้างจาก process ที่หยุดไปแล้ว ออกจากงานของ process อื่นที่ยังทำอยู่
+    c.execute("ALTER TABLE export_jobs ADD COLUMN owner TEXT")
+    c.execute("ALTER TABLE export_jobs ADD COLUMN heartbeat_at TEXT")
+
+
+def _member_email_lower_index(c: sqlite3.Cursor):
+    # นำเข้าสมาชิก (importer.py) ตรวจอีเมลซ้ำกับในระบบแบบไม่สนตัวพิมพ์ใหญ่/เล็ก ด้วย lower(email)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_members_email_lower ON members(lower(email))")
+
+
+# (version, ชื่อ, ฟังก์ชัน)
+MIGRATIONS = [
+    (1, "base schema", _base_schema),
+    (2, "seed admin user", _seed_admin),
+    (3, "borrow constraints and join indexes", _borrow_constraints),
+    (4, "circulation and report indexes", _circulation_indexes),
+    (5, "full-text search for books and members", _search_index),
+    (6, "change counters", _change_counters),
+    (7, "book status and borrow count summary tables", _summary_tables),
+    (8, "export jobs", _export_jobs),
+    (9, "api sessions", _api_sessions),
+    (10, "one open loan per book", _one_open_loan_per_book),
+    (11, "overdue index and per-member overdue counts", _overdue_counts),
+    (12, "quarantine rows that break foreign keys", _quarantine_orphan_rows),
+    (13, "export job owner and heartbeat", _export_job_owner),
+    (14, "case-insensitive member email index", _member_email_lower_index),
+]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("""
+        SELECT name FROM sqlite_master
+        WHERE type='table' AND name='schema_version'
+    """).fetchone()
+    if not row:
+        return 0
+    (version,) = conn.execute("SELECT IFNULL(MAX(version), 0) FROM schema_version").fetchone()
+    return version
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    รัน migration ที่ยังไม่ถูกรันตามลำดับ (1 ขั้น = 1 transaction)
+    คืนค่า version ล่าสุดของฐานข้อมูล
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version    INTEGER PRIMARY KEY,
+            name       TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+    # migration บางขั้นสร้างตารางใหม่แล้วย้ายข้อมูล (DROP/RENAME) ซึ่งใช้ไม่ได้ขณะตรวจ foreign key
+    # ปิดไว้ระหว่าง migrate แล้วคืนค่าเดิม (ตั้งได้เฉพาะนอก transaction)
+    (foreign_keys,) = conn.execute("PRAGMA foreign_keys").fetchone()
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        _run_migrations(conn)
+    finally:
+        conn.execute("PRAGMA foreign_keys = %d" % foreign_keys)
+
+    return current_version(conn)
+
+
+def _run_migrations(conn: sqlite3.Connection):
+    for version, name, step in MIGRATIONS:
+        if version <= current_version(conn):
+            continue
+
+        # BEGIN IMMEDIATE: หลาย process เปิดพร้อมกัน จะมีเพียงตัวเดียวที่ได้รัน
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # ตรวจซ้ำหลังได้ lock เผื่อ process อื่นรันไปแล้ว
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            step(conn.cursor())
+            conn.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (version, name)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
@@ -1,14 +1,933 @@
+import os
 import sqlite3
+import sys
+import threading
+import time
+import queue
+import functools
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date, timedelta
+
 import pandas as pd
 import hashlib
+import secrets
+
+import migrations
 
 DB_PATH = "library.db"
 
 # ============================================================
-# DB
+# DB (connection pool)
+# ============================================================
+# เปิด connection ครั้งเดียวแล้วนำกลับมาใช้ซ้ำ แทนการ connect/close ทุกครั้ง
+POOL_SIZE = 8                 # จำนวน connection สูงสุดต่อไฟล์ฐานข้อมูล
+POOL_TIMEOUT = 10.0           # วินาทีที่รอ connection ว่างก่อนแจ้ง error
+HEALTH_CHECK_INTERVAL = 30.0  # connection ที่ว่างนานกว่านี้จะถูกตรวจด้วย SELECT 1 ก่อนใช้
+BUSY_TIMEOUT_MS = 5000
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout = %d" % BUSY_TIMEOUT_MS,
+    "PRAGMA synchronous = NORMAL",     # ปลอดภัยเมื่อใช้ WAL และลด fsync
+    "PRAGMA cache_size = -16000",      # page cache ~16MB ต่อ connection
+    "PRAGMA mmap_size = 67108864",     # 64MB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",        # ตรวจ REFERENCES ของทุกตาราง (SQLite ปิดไว้เป็นค่าเริ่มต้น)
+)
+
+
+# ============================================================
+# SQL INSTRUMENTATION
 # ============================================================
+# ทุกคำสั่ง SQL ที่ผ่าน connection ของ pool ถูกจับเวลา นับแถว และบันทึกฟังก์ชันที่เรียก
+# เก็บล่าสุด SQL_STATS_MAX_RECORDS คำสั่ง (rolling) สำหรับสรุป p50/p95/p99 ในหน้า admin
+# คำสั่งที่ช้ากว่า SLOW_QUERY_MS ถูกเก็บใน slow-query log (พร้อม EXPLAIN QUERY PLAN ถ้าเปิดไว้)
+# เวลาของ SELECT รวมเวลาที่ fetch แถวด้วย (SQLite ประมวลผลระหว่าง fetch)
+SQL_STATS_ENABLED = os.environ.get("LIBRARY_SQL_STATS", "1") != "0"
+SLOW_QUERY_MS = float(os.environ.get("LIBRARY_SLOW_QUERY_MS", "200"))
+EXPLAIN_SLOW_QUERIES = os.environ.get("LIBRARY_EXPLAIN_SLOW", "0") == "1"
+SQL_STATS_MAX_RECORDS = 10000
+SLOW_LOG_MAX = 200
+
+_MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_sql_records = deque(maxlen=SQL_STATS_MAX_RECORDS)
+_slow_log = deque(maxlen=SLOW_LOG_MAX)
+
+
+# รายการ SqlRecord ของ thread ปัจจุบัน ระหว่างอยู่ใน sql_scope() (ใช้วัดต่อการแสดงผล 1 หน้า)
+# และ caller: ชื่อผู้เรียกที่กำหนดไว้แทนการไล่ stack (งานเขียนที่ทำใน writer thread)
+_sql_scope = threading.local()
+
+
+class SqlRecord:
+    """ข้อมูลการทำงานของคำสั่ง SQL 1 ครั้ง (elapsed/rows ถูกเพิ่มระหว่าง fetch)"""
+    __slots__ = ("sql", "caller", "started_at", "elapsed_ms", "rows", "slow")
+
+    def __init__(self, sql: str, caller: str):
+        self.sql = sql
+        self.caller = caller
+        self.started_at = time.time()
+        self.elapsed_ms = 0.0
+        self.rows = 0
+        self.slow = False
+
+
+def configure_sql_stats(enabled: bool = None, slow_query_ms: float = None, explain_slow: bool = None):
+    """เปิด/ปิดการเก็บสถิติ SQL และตั้งค่า slow-query log ขณะทำงาน"""
+    global SQL_STATS_ENABLED, SLOW_QUERY_MS, EXPLAIN_SLOW_QUERIES
+    if enabled is not None:
+        SQL_STATS_ENABLED = bool(enabled)
+    if slow_query_ms is not None:
+        SLOW_QUERY_MS = float(slow_query_ms)
+    if explain_slow is not None:
+        EXPLAIN_SLOW_QUERIES = bool(explain_slow)
+
+
+# ชื่อฟังก์ชันที่เป็นตัวกลาง ไม่ใช่ผู้เรียกจริง
+_SQL_CALLER_SKIP = {"execute", "executemany", "wrapper", "connection"}
+
+
+@contextmanager
+def sql_scope():
+    """
+    เก็บคำสั่ง SQL ที่ thread นี้เรียกระหว่างอยู่ใน block
+    yield list ของ SqlRecord (จำนวนแถวครบเมื่อ fetch เสร็จ) — ว่างถ้าปิดการเก็บสถิติ
+    """
+    previous = getattr(_sql_scope, "records", None)
+    records = []
+    _sql_scope.records = records
+    try:
+        yield records
+    finally:
+        _sql_scope.records = previous
+        if previous is not None:
+            previous.extend(records)
+
+
+def _new_record(sql: str) -> "SqlRecord":
+    record = SqlRecord(_normalize_sql(sql), getattr(_sql_scope, "caller", None) or _sql_caller())
+    _sql_records.append(record)
+    scope = getattr(_sql_scope, "records", None)
+    if scope is not None:
+        scope.append(record)
+    return record
+
+
+def _sql_caller() -> str:
+    """ฟังก์ชัน public ตัวแรกในโปรเจกต์ที่เรียกคำสั่ง SQL นี้ (ข้าม helper, pandas, stdlib)"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if (
+            code.co_filename.startswith(_MODULE_DIR)
+            and not code.co_name.startswith(("_", "<"))
+            and code.co_name not in _SQL_CALLER_SKIP
+        ):
+            return f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+        frame = frame.f_back
+    return "?"
+
+
+def _normalize_sql(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """cursor ที่จับเวลา execute/fetch และนับจำนวนแถวของคำสั่งล่าสุด"""
+    _record = None
+    _params = None
+
+    def _track(self, started: float, rows: int = 0):
+        record = self._record
+        if record is None:
+            return
+        record.elapsed_ms += (time.perf_counter() - started) * 1000
+        record.rows += rows
+        if not record.slow and record.elapsed_ms >= SLOW_QUERY_MS:
+            record.slow = True
+            _log_slow_query(self.connection, record, self._params)
+
+    def execute(self, sql, parameters=()):
+        self._record = _new_record(sql)
+        self._params = parameters
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._track(started, max(self.rowcount, 0))
+
+    def executemany(self, sql, seq_of_parameters):
+        self._record = _new_record(sql)
+        self._params = None
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._track(started, max(self.rowcount, 0))
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._track(started, 0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._track(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._track(started)
+            raise
+        self._track(started, 1)
+        return row
+
+
+def _log_slow_query(conn, record: SqlRecord, params):
+    plan = None
+    if EXPLAIN_SLOW_QUERIES and record.sql.upper().startswith(("SELECT", "WITH")):
+        try:
+            # ใช้ cursor ธรรมดา เพื่อไม่ให้คำสั่ง EXPLAIN ถูกนับเป็นสถิติด้วย
+            cur = sqlite3.Cursor(conn)
+            cur.execute("EXPLAIN QUERY PLAN " + record.sql, params or ())
+            plan = [row[3] for row in cur.fetchall()]
+        except sqlite3.Error:
+            plan = None
+    _slow_log.append((record, repr(params)[:200] if params else "", plan))
+
+
+def sql_stats() -> pd.DataFrame:
+    """สรุปสถิติคำสั่ง SQL ต่อ (ฟังก์ชัน, คำสั่ง): จำนวนครั้ง, เวลา p50/p95/p99, แถวเฉลี่ย"""
+    records = list(_sql_records)
+    columns = ["caller", "sql", "count", "total_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms", "avg_rows"]
+    if not records:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.DataFrame(
+        [(r.caller, r.sql, r.elapsed_ms, r.rows) for r in records],
+        columns=["caller", "sql", "elapsed_ms", "rows"],
+    )
+    grouped = df.groupby(["caller", "sql"])["elapsed_ms"]
+    stats = pd.DataFrame({
+        "count": grouped.size(),
+        "total_ms": grouped.sum(),
+        "p50_ms": grouped.quantile(0.50),
+        "p95_ms": grouped.quantile(0.95),
+        "p99_ms": grouped.quantile(0.99),
+        "max_ms": grouped.max(),
+        "avg_rows": df.groupby(["caller", "sql"])["rows"].mean(),
+    }).reset_index()
+    return stats.sort_values("total_ms", ascending=False).round(3)[columns].reset_index(drop=True)
+
+
+def slow_queries() -> pd.DataFrame:
+    """slow-query log ล่าสุดก่อน"""
+    rows = [
+        (
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(r.started_at)),
+            r.caller,
+            round(r.elapsed_ms, 3),
+            r.rows,
+            r.sql,
+            params,
+            "\n".join(plan) if plan else "",
+        )
+        for r, params, plan in reversed(_slow_log)
+    ]
+    return pd.DataFrame(rows, columns=["time", "caller", "elapsed_ms", "rows", "sql", "params", "plan"])
+
+
+def reset_sql_stats():
+    _sql_records.clear()
+    _slow_log.clear()
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3.Connection ที่ close() แล้วจะคืนกลับเข้า pool แทนการปิดจริง
+    (ยังเป็น sqlite3.Connection จึงใช้กับ pd.read_sql ได้ตามเดิม)
+    """
+    pool = None
+    last_used = 0.0
+
+    def cursor(self, factory=None):
+        if factory is None:
+            factory = InstrumentedCursor if SQL_STATS_ENABLED else sqlite3.Cursor
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def close_for_real(self):
+        self.pool = None
+        super().close()
+
+
+class ConnectionPool:
+    """pool ของ connection แบบจำกัดจำนวน สำหรับไฟล์ฐานข้อมูล 1 ไฟล์"""
+
+    def __init__(self, db_path: str, max_size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._closed = False
+
+    def _open(self) -> PooledConnection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            factory=PooledConnection,
+        )
+        # WAL ถูกบันทึกไว้ในไฟล์ฐานข้อมูล ตั้งครั้งเดียวก็พอ แต่สั่งซ้ำได้ไม่เสียหาย
+        # (cursor ธรรมดา: คำสั่งตั้งค่า connection ไม่นับในสถิติ SQL)
+        cur = conn.cursor(sqlite3.Cursor)
+        cur.execute("PRAGMA journal_mode = WAL")
+        for pragma in CONNECTION_PRAGMAS:
+            cur.execute(pragma)
+        conn.pool = self
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn: PooledConnection) -> bool:
+        if time.monotonic() - conn.last_used < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            conn.cursor(sqlite3.Cursor).execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self) -> PooledConnection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("connection pool ถูกปิดแล้ว")
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError(
+                f"ไม่มี connection ว่างภายใน {self.timeout} วินาที (pool size={self.max_size})"
+            )
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if self._is_healthy(conn):
+                    return conn
+                conn.close_for_real()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: PooledConnection):
+        try:
+            if self._closed:
+                conn.close_for_real()
+                return
+            try:
+                # งานที่ยังไม่ commit จะไม่ติดไปกับผู้ใช้คนถัดไป
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                conn.close_for_real()
+                return
+            conn.last_used = time.monotonic()
+            self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close_for_real()
+            except queue.Empty:
+                break
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    pool ของ DB_PATH ปัจจุบัน
+    ครั้งแรกที่สร้าง pool จะรัน schema migration ให้ (ครั้งเดียวต่อ process)
+    ทำให้ฟังก์ชันอ่านข้อมูลไม่ต้องสั่ง CREATE TABLE ทุกครั้ง
+    """
+    pool = _pools.get(DB_PATH)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(DB_PATH)
+            if pool is None:
+                pool = ConnectionPool(DB_PATH, POOL_SIZE)
+                conn = pool.acquire()
+                try:
+                    migrations.migrate(conn)
+                finally:
+                    conn.close()
+                _pools[DB_PATH] = pool
+    return pool
+
+
+def init_db() -> int:
+    """เตรียมฐานข้อมูล (รัน migration ถ้ายังไม่ได้รัน) แล้วคืนค่า schema version"""
+    with connection() as conn:
+        return migrations.current_version(conn)
+
+
+def close_pools():
+    """ปิด connection ทั้งหมดในทุก pool (ใช้ตอนปิดโปรแกรม/สลับไฟล์ฐานข้อมูล)"""
+    # ให้ writer ทำงานที่ค้างในคิวให้เสร็จก่อนปิด connection
+    close_write_coordinators()
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+        for watcher in _watchers.values():
+            watcher.close()
+        _watchers.clear()
+
+
 def get_connection():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    """ยืม connection จาก pool — conn.close() จะคืน connection กลับเข้า pool"""
+    return get_pool().acquire()
+
+
+@contextmanager
+def connection():
+    """
+    ยืม connection จาก pool แบบ context manager
+        with connection() as conn:
+            ...
+    คืน connection เข้า pool เสมอเมื่อออกจาก block
+    งานที่ยังไม่ commit (รวมถึงเมื่อเกิด error) ถูก rollback ตอนคืน connection (ConnectionPool.release)
+    ไม่ใช่ที่ context manager นี้ — ต้องการให้บันทึก ต้อง conn.commit() เองก่อนออกจาก block
+    """
+    conn = get_pool().acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def explain_query_plan(query: str, params=()) -> list:
+    """คืนค่าแผนการค้นหา (EXPLAIN QUERY PLAN) ของ query เป็น list ของข้อความ"""
+    with connection() as conn:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + query, params).fetchall()
+    return [r[3] for r in rows]
+
+
+def _date_range(start_date: str, end_date: str) -> tuple:
+    """
+    แปลงช่วงวันที่ (รวมวันสุดท้าย) เป็นช่วงครึ่งเปิด [start, end+1 วัน)
+    เพื่อเทียบกับคอลัมน์วันที่โดยตรง ให้ใช้ index ได้ แทน DATE(col) BETWEEN ? AND ?
+    """
+    end_next = date.fromisoformat(end_date) + timedelta(days=1)
+    return start_date, end_next.isoformat()
+
+
+# ============================================================
+# CHANGE TRACKING
+# ============================================================
+# ตาราง change_counters เก็บเลข version ของแต่ละตาราง
+# ฟังก์ชันเขียนข้อมูลเรียก bump_tables() ภายใน transaction เดียวกับการแก้ไข
+# จึงเห็นการเปลี่ยนแปลงจากทุก process/ทุก connection ที่ใช้ไฟล์เดียวกัน
+#
+# ChangeWatcher ใช้ connection แยกหนึ่งตัวต่อไฟล์ อ่าน PRAGMA data_version
+# (ค่าเปลี่ยนเมื่อ connection อื่น commit) ถ้าไม่เปลี่ยนก็ไม่ต้องอ่านตาราง counter เลย
+
+
+def bump_tables(conn, *tables: str):
+    """
+    เพิ่ม version ของตารางที่ถูกแก้ไข — เรียกก่อน conn.commit() ของการเขียนนั้น
+    ผลลัพธ์ใน cache ที่อ่านตารางเหล่านี้จะหมดอายุทันทีที่ commit
+    """
+    conn.execute(f"""
+        UPDATE change_counters
+        SET version = version + 1
+        WHERE name IN ({",".join("?" * len(tables))})
+    """, tables)
+
+
+class ChangeWatcher:
+    """ติดตามการเปลี่ยนแปลงของไฟล์ฐานข้อมูล 1 ไฟล์ด้วย PRAGMA data_version"""
+
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(
+            db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        self._lock = threading.Lock()
+        self._data_version = None
+        self._counters = {}
+        self.polls = 0
+        self.reloads = 0
+
+    def poll(self) -> dict:
+        """version ล่าสุดของทุกตาราง (อ่านตาราง counter ใหม่เฉพาะเมื่อไฟล์เปลี่ยน)"""
+        with self._lock:
+            self.polls += 1
+            (data_version,) = self._conn.execute("PRAGMA data_version").fetchone()
+            if data_version != self._data_version:
+                self._counters = dict(
+                    self._conn.execute("SELECT name, version FROM change_counters").fetchall()
+                )
+                self._data_version = data_version
+                self.reloads += 1
+            return self._counters
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_watchers = {}
+
+
+def get_watcher() -> ChangeWatcher:
+    watcher = _watchers.get(DB_PATH)
+    if watcher is None:
+        get_pool()  # ให้แน่ใจว่า migration (ตาราง change_counters) รันแล้ว
+        with _pools_lock:
+            watcher = _watchers.get(DB_PATH)
+            if watcher is None:
+                watcher = ChangeWatcher(DB_PATH)
+                _watchers[DB_PATH] = watcher
+    return watcher
+
+
+def table_versions(tables) -> tuple:
+    """
+    version ปัจจุบันของตารางที่ระบุ — ใช้เทียบว่าข้อมูลเปลี่ยนตั้งแต่ครั้งก่อนหรือไม่
+    (ต้นทุนปกติคือ PRAGMA data_version 1 ครั้ง)
+    """
+    counters = get_watcher().poll()
+    return tuple(counters.get(t, 0) for t in tables)
+
+
+def has_changed(versions: tuple, tables) -> bool:
+    """ตารางใน tables ถูกแก้ไขหลังจากได้ versions (จาก table_versions) หรือไม่"""
+    return versions != table_versions(tables)
+
+
+# ============================================================
+# QUERY CACHE
+# ============================================================
+# ผลลัพธ์ของฟังก์ชันอ่านข้อมูลถูกเก็บไว้ใช้ร่วมกันทุก session ใน process
+# key = ชื่อฟังก์ชัน + arguments + version ของตารางที่ query นั้นอ่าน
+# เมื่อมีการเขียน version เปลี่ยน ทำให้ key เดิมใช้ไม่ได้อีก
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _size_of(value) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, Page):
+        return _size_of(value.df)
+    return sys.getsizeof(value)
+
+
+def _copy_result(value):
+    # ผู้เรียกอาจแก้ DataFrame ที่ได้ไป จึงคืนสำเนาเสมอ
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, Page):
+        return value._replace(df=value.df.copy())
+    return value
+
+
+class QueryCache:
+    """LRU cache จำกัดทั้งจำนวนรายการและขนาดหน่วยความจำ พร้อมสถิติ hit/miss"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()   # key -> (value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value):
+        size = _size_of(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[key] = (value, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._data.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / total) if total else 0.0,
+            }
+
+
+query_cache = QueryCache()
+
+
+def cached_query(*tables: str):
+    """
+    decorator สำหรับฟังก์ชันอ่านข้อมูล ระบุตารางที่ query อ่าน เช่น
+        @cached_query("books")
+        def get_available_books(): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (
+                func.__qualname__,
+                DB_PATH,
+                repr(args),
+                repr(sorted(kwargs.items())),
+                table_versions(tables),
+            )
+            value = query_cache.get(key)
+            if value is None:
+                value = func(*args, **kwargs)
+                query_cache.put(key, value)
+            return _copy_result(value)
+
+        wrapper.tables = tables
+        return wrapper
+    return decorator
+
+
+def cache_stats() -> dict:
+    return query_cache.stats()
+
+
+# ============================================================
+# WRITE COORDINATOR (group commit)
+# ============================================================
+# งานเขียนของ process นี้ถูกส่งเข้าคิวให้ writer thread เดียวต่อไฟล์ฐานข้อมูล
+# writer รวมงานที่รอในคิว (สูงสุด WRITE_BATCH_MAX งาน รอเพิ่มไม่เกิน WRITE_BATCH_WAIT_MS)
+# แล้ว commit ใน transaction เดียว — 1 lock / 1 commit ต่อหลายงาน แทนการแย่ง lock ทีละงาน
+# - แต่ละงานอยู่ใน SAVEPOINT ของตัวเอง งานที่ error ถูก rollback เฉพาะงานนั้น งานอื่นใน batch ยัง commit
+# - ผู้เรียกได้ผลลัพธ์ (หรือ exception) เมื่อ batch commit แล้วเท่านั้น
+# - คิวเต็ม: ผู้เรียกรอได้ไม่เกิน WRITE_SUBMIT_TIMEOUT วินาที แล้วได้ WriteQueueFullError
+# ปิดได้ด้วย LIBRARY_WRITE_QUEUE=0 (แต่ละงานเปิด transaction ของตัวเองแบบเดิม)
+WRITE_QUEUE_ENABLED = os.environ.get("LIBRARY_WRITE_QUEUE", "1") != "0"
+WRITE_QUEUE_SIZE = 256
+WRITE_SUBMIT_TIMEOUT = 10.0
+WRITE_BATCH_MAX = 64
+WRITE_BATCH_WAIT_MS = 2.0
+
+# records: sql_scope() ของ thread ที่ส่งงาน (None ถ้าไม่ได้อยู่ใน scope) — SQL ที่ writer thread
+# รันแทนจึงถูกนับรวมในหน้าที่ส่งงานมา (ดู profiling.profile_render)
+_WriteOp = namedtuple("_WriteOp", ["fn", "args", "future", "records"])
+
+
+class WriteQueueFullError(sqlite3.OperationalError):
+    """คิวงานเขียนเต็มเกินเวลาที่รอได้ (ระบบรับงานเขียนไม่ทัน)"""
+
+
+class WriteCoordinator:
+    """คิวงานเขียน + writer thread สำหรับไฟล์ฐานข้อมูล 1 ไฟล์"""
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        self._queue = queue.Queue(maxsize=WRITE_QUEUE_SIZE)
+        self._closed = False
+        self.batches = 0
+        self.ops = 0
+        self.failed_batches = 0
+        self.max_batch = 0
+        self._thread = threading.Thread(target=self._run, name="model-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn, *args) -> Future:
+        """ส่ง fn(conn, *args) เข้าคิว คืนค่า Future ของผลลัพธ์"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("write coordinator ถูกปิดแล้ว")
+        future = Future()
+        try:
+            op = _WriteOp(fn, args, future, getattr(_sql_scope, "records", None))
+            self._queue.put(op, timeout=WRITE_SUBMIT_TIMEOUT)
+        except queue.Full:
+            raise WriteQueueFullError(
+                f"คิวงานเขียนเต็ม ({WRITE_QUEUE_SIZE} งาน) กรุณาลองใหม่อีกครั้ง"
+            ) from None
+        return future
+
+    def _collect(self, first: _WriteOp) -> tuple:
+        """รวมงานที่รออยู่ต่อจาก first — return: (batch, พบคำสั่งปิดหรือไม่)"""
+        batch = [first]
+        deadline = time.monotonic() + WRITE_BATCH_WAIT_MS / 1000
+        while len(batch) < WRITE_BATCH_MAX:
+            try:
+                op = self._queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    op = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if op is None:
+                return batch, True
+            batch.append(op)
+        return batch, False
+
+    def _run(self):
+        while True:
+            op = self._queue.get()
+            if op is None:
+                return
+            batch, stop = self._collect(op)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: list):
+        batch = [op for op in batch if op.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        results = []
+        try:
+            conn = self._pool.acquire()
+            try:
+                # คำสั่งควบคุม transaction ใช้ cursor ธรรมดา (ไม่นับในสถิติ SQL)
+                tx = conn.cursor(sqlite3.Cursor)
+                tx.execute("BEGIN IMMEDIATE")
+                try:
+                    for op in batch:
+                        results.append(self._run_op(conn, tx, op))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+            finally:
+                conn.close()
+        except Exception as e:
+            # ทั้ง batch ไม่ถูก commit: งานที่สำเร็จแล้วได้ error ของ batch แทน
+            self.failed_batches += 1
+            for i, op in enumerate(batch):
+                if i < len(results) and results[i][0] is False:
+                    op.future.set_exception(results[i][1])
+                else:
+                    op.future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.ops += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        for op, (ok, value) in zip(batch, results):
+            if ok:
+                op.future.set_result(value)
+            else:
+                op.future.set_exception(value)
+
+    @staticmethod
+    def _run_op(conn, tx, op: _WriteOp) -> tuple:
+        # ให้สถิติ SQL แสดงชื่อฟังก์ชัน public ที่ส่งงานนี้มา แทน writer thread
+        # และเก็บ SqlRecord ลง sql_scope() ของ thread ที่ส่งงาน (ผู้ส่งรอผลอยู่ จึงไม่อ่าน list พร้อมกัน)
+        _sql_scope.caller = f"{__name__}.{op.fn.__name__.lstrip('_')}"
+        _sql_scope.records = op.records
+        tx.execute("SAVEPOINT write_op")
+        try:
+            result = op.fn(conn, *op.args)
+        except Exception as e:
+            tx.execute("ROLLBACK TO write_op")
+            tx.execute("RELEASE write_op")
+            return False, e
+        finally:
+            _sql_scope.caller = None
+            _sql_scope.records = None
+        tx.execute("RELEASE write_op")
+        return True, result
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "ops": self.ops,
+            "avg_batch": round(self.ops / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "failed_batches": self.failed_batches,
+            "queued": self._queue.qsize(),
+        }
+
+    def close(self):
+        """รองานที่อยู่ในคิวให้เสร็จ แล้วหยุด writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_write_coordinator() -> WriteCoordinator:
+    """write coordinator ของ DB_PATH ปัจจุบัน (สร้าง writer thread ครั้งแรกที่ใช้)"""
+    writer = _writers.get(DB_PATH)
+    if writer is None:
+        pool = get_pool()
+        with _writers_lock:
+            writer = _writers.get(DB_PATH)
+            if writer is None:
+                writer = _writers[DB_PATH] = WriteCoordinator(pool)
+    return writer
+
+
+def submit_write(fn, *args) -> Future:
+    """
+    ส่งงานเขียน fn(conn, *args) ให้ writer thread — fn ทำงานภายใน transaction ที่เปิดไว้แล้ว
+    ห้าม commit/rollback เอง และห้ามเรียกฟังก์ชันเขียนอื่นของ model ภายใน fn
+    """
+    return get_write_coordinator().submit(fn, *args)
+
+
+def execute_write(fn, *args):
+    """รันงานเขียน fn(conn, *args) แล้วรอผลลัพธ์ (ผ่านคิวถ้าเปิด WRITE_QUEUE_ENABLED)"""
+    if WRITE_QUEUE_ENABLED:
+        return submit_write(fn, *args).result()
+
+    with connection() as conn:
+        conn.cursor(sqlite3.Cursor).execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn, *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def write_queue_stats() -> dict:
+    """สถิติ group commit ของ DB_PATH ปัจจุบัน (ว่างถ้ายังไม่มีงานเขียนผ่านคิว)"""
+    writer = _writers.get(DB_PATH)
+    return writer.stats() if writer is not None else {}
+
+
+def close_write_coordinators():
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+# ============================================================
+# PAGINATION (keyset)
+# ============================================================
+PAGE_SIZE = 50
+
+# df = ข้อมูลหน้าปัจจุบัน, next_cursor/prev_cursor = ค่าที่ส่งกลับมาเพื่อไปหน้าถัดไป/ก่อนหน้า
+# (None = ไม่มีหน้านั้นแล้ว)
+Page = namedtuple("Page", ["df", "next_cursor", "prev_cursor"])
+
+
+def _fetch_page(
+    conn,
+    select_sql: str,
+    key_col: str,
+    key_field: str,
+    cursor=None,
+    direction: str = "next",
+    limit: int = PAGE_SIZE,
+    conditions=(),
+    params=()
+) -> Page:
+    """
+    ดึงข้อมูลทีละหน้าแบบ keyset (WHERE key < cursor ORDER BY key DESC LIMIT n)
+    ต้นทุนขึ้นกับขนาดหน้า ไม่ขึ้นกับขนาดตาราง (ต่างจาก OFFSET)
+    - direction="next" : ไปทางข้อมูลที่เก่ากว่า (key น้อยลง)
+    - direction="prev" : ย้อนไปทางข้อมูลที่ใหม่กว่า
+    """
+    conditions = list(conditions)
+    params = list(params)
+
+    if cursor is not None:
+        conditions.append(f"{key_col} {'<' if direction == 'next' else '>'} ?")
+        params.append(int(cursor))
+
+    where = ("WHERE " + " AND ".join(conditions)) if conditions else ""
+    order = "DESC" if direction == "next" else "ASC"
+
+    # ดึงเกินมา 1 แถว เพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+    df = pd.read_sql_query(
+        f"{select_sql} {where} ORDER BY {key_col} {order} LIMIT ?",
+        conn,
+        params=params + [int(limit) + 1]
+    )
+    has_more = len(df) > limit
+    df = df.iloc[:limit]
+    if direction == "prev":
+        df = df.iloc[::-1]
+    df = df.reset_index(drop=True)
+
+    if df.empty:
+        return Page(df, None, None)
+
+    first_key = int(df[key_field].iloc[0])
+    last_key = int(df[key_field].iloc[-1])
+
+    if direction == "next":
+        next_cursor = last_key if has_more else None
+        prev_cursor = first_key if cursor is not None else None
+    else:
+        next_cursor = last_key if cursor is not None else None
+        prev_cursor = first_key if has_more else None
+
+    return Page(df, next_cursor, prev_cursor)
 
 
 # ============================================================
@@ -22,15 +941,14 @@ def hash_password(password: str) -> str:
 # USER
 # ============================================================
 def get_user_auth_row(username: str):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("""
-        SELECT id, username, password_hash, role, is_active
-        FROM users
-        WHERE username=?
-    """, (username,))
-    row = c.fetchone()
-    conn.close()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT id, username, password_hash, role, is_active
+            FROM users
+            WHERE username=?
+        """, (username,))
+        row = c.fetchone()
 
     if not row:
         return None
@@ -44,171 +962,388 @@ def get_user_auth_row(username: str):
     }
 
 
+@cached_query("users")
 def get_all_users() -> pd.DataFrame:
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT
-            id,
-            username,
-            role,
-            is_active,
-            CASE WHEN is_active=1 THEN 'ใช้งาน' ELSE 'ปิดใช้งาน' END AS status
-        FROM users
-        ORDER BY id DESC
-    """, conn)
-    conn.close()
-    return df
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT
+                id,
+                username,
+                role,
+                is_active,
+                CASE WHEN is_active=1 THEN 'ใช้งาน' ELSE 'ปิดใช้งาน' END AS status
+            FROM users
+            ORDER BY id DESC
+        """, conn)
 
 def is_username_exists(username: str) -> bool:
-    conn = get_connection()
-    c = conn.cursor()
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM users WHERE username = ?", (username,))
+        result = c.fetchone()
 
-    c.execute("SELECT 1 FROM users WHERE username = ?", (username,))
-    result = c.fetchone()
-
-    conn.close()
     return result is not None
 
-def add_user(username: str, password_hash: str, role: str, is_active: int):
-    conn = get_connection()
-    c = conn.cursor()
-
-    c.execute("""
+def _add_user(conn, username: str, password_hash: str, role: str, is_active: int):
+    conn.execute("""
         INSERT INTO users (username, password_hash, role, is_active)
         VALUES (?, ?, ?, ?)
     """, (username, password_hash, role, is_active))
+    bump_tables(conn, "users")
+
+
+def add_user(username: str, password_hash: str, role: str, is_active: int):
+    execute_write(_add_user, username, password_hash, role, is_active)
+
+
+# ============================================================
+# API SESSION
+# ============================================================
+# token ของ JSON API: ฐานข้อมูลเก็บเฉพาะ sha256 ของ token
+# ผู้ใช้ที่ถูกปิดใช้งานจะใช้ token เดิมไม่ได้ทันที
+API_SESSION_TTL_HOURS = 12
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def create_api_session(user_id: int, ttl_hours: float = API_SESSION_TTL_HOURS) -> str:
+    """สร้าง token ใหม่ให้ผู้ใช้ คืนค่า token (แสดงครั้งเดียว)"""
+    token = secrets.token_urlsafe(32)
+    execute_write(_create_api_session, _token_hash(token), int(user_id), float(ttl_hours))
+    return token
+
+
+def _create_api_session(conn, token_hash: str, user_id: int, ttl_hours: float):
+    conn.execute("DELETE FROM api_sessions WHERE expires_at < CURRENT_TIMESTAMP")
+    conn.execute("""
+        INSERT INTO api_sessions (token_hash, user_id, expires_at)
+        VALUES (?, ?, datetime('now', ?))
+    """, (token_hash, user_id, f"+{ttl_hours} hours"))
+
+
+def get_api_session_user(token: str):
+    """ข้อมูลผู้ใช้ของ token ที่ยังไม่หมดอายุ (dict: id, username, role) หรือ None"""
+    if not token:
+        return None
+    with connection() as conn:
+        row = conn.execute("""
+            SELECT u.id, u.username, u.role
+            FROM api_sessions s
+            JOIN users u ON u.id = s.user_id
+            WHERE s.token_hash = ?
+              AND s.expires_at >= CURRENT_TIMESTAMP
+              AND u.is_active = 1
+        """, (_token_hash(token),)).fetchone()
+    if not row:
+        return None
+    return {"id": row[0], "username": row[1], "role": row[2]}
+
+
+def _delete_api_session(conn, token_hash: str):
+    conn.execute("DELETE FROM api_sessions WHERE token_hash = ?", (token_hash,))
+
+
+def delete_api_session(token: str):
+    execute_write(_delete_api_session, _token_hash(token))
+
 
-    conn.commit()
-    conn.close()
 # ============================================================
 # BOOK
 # ============================================================
+@cached_query("books")
 def get_all_books() -> pd.DataFrame:
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT id, title, author, status
-        FROM books
-        ORDER BY id DESC
-    """, conn)
-    conn.close()
-    return df
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT id, title, author, status
+            FROM books
+            ORDER BY id DESC
+        """, conn)
+
+
+@cached_query("books")
+def get_books_page(cursor=None, direction: str = "next", limit: int = PAGE_SIZE) -> Page:
+    """หนังสือทีละหน้า เรียงจากรายการล่าสุด"""
+    with connection() as conn:
+        return _fetch_page(
+            conn,
+            "SELECT id, title, author, status FROM books",
+            key_col="id",
+            key_field="id",
+            cursor=cursor,
+            direction=direction,
+            limit=limit
+        )
 
 
+@cached_query("books")
 def get_available_books() -> pd.DataFrame:
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT id, title, author
-        FROM books
-        WHERE status='available'
-    """, conn)
-    conn.close()
-    return df
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT id, title, author
+            FROM books
+            WHERE status='available'
+        """, conn)
 
 
-def set_book_status(book_id: int, status: str):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute("""
+def _set_book_status(conn, book_id: int, status: str):
+    conn.execute("""
         UPDATE books
         SET status=?
         WHERE id=?
     """, (status, book_id))
-    conn.commit()
-    conn.close()
+    bump_tables(conn, "books")
 
-def insert_book(title: str, author: str):
-    """
-    เพิ่มหนังสือใหม่
-    """
-    conn = get_connection()
-    c = conn.cursor()
 
-    c.execute("""
+def set_book_status(book_id: int, status: str):
+    execute_write(_set_book_status, book_id, status)
+
+
+def _insert_book(conn, title: str, author: str):
+    conn.execute("""
         INSERT INTO books (title, author, status)
         VALUES (?, ?, 'available')
     """, (title, author))
+    bump_tables(conn, "books")
 
-    conn.commit()
-    conn.close()
+
+def insert_book(title: str, author: str):
+    """
+    เพิ่มหนังสือใหม่
+    """
+    execute_write(_insert_book, title, author)
 
 
 # ============================================================
 # MEMBER
 # ============================================================
+@cached_query("members")
 def get_all_members() -> pd.DataFrame:
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT *
-        FROM members
-        ORDER BY id DESC
-    """, conn)
-    conn.close()
-    return df
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT *
+            FROM members
+            ORDER BY id DESC
+        """, conn)
+
+
+@cached_query("members")
+def get_members_page(cursor=None, direction: str = "next", limit: int = PAGE_SIZE) -> Page:
+    """สมาชิกทีละหน้า เรียงจากรายการล่าสุด"""
+    with connection() as conn:
+        return _fetch_page(
+            conn,
+            "SELECT * FROM members",
+            key_col="id",
+            key_field="id",
+            cursor=cursor,
+            direction=direction,
+            limit=limit
+        )
 
 
+@cached_query("members")
 def get_active_members() -> pd.DataFrame:
-    conn = get_connection()
-    df = pd.read_sql("""
-        SELECT id, member_code, name
-        FROM members
-        WHERE is_active=1
-    """, conn)
-    conn.close()
-    return df
-
-def insert_member(name: str, email: str, phone: str):
+    with connection() as conn:
+        return pd.read_sql("""
+            SELECT id, member_code, name
+            FROM members
+            WHERE is_active=1
+        """, conn)
+
+
+@cached_query("members")
+def is_member_active(member_id: int) -> bool:
+    """สมาชิกมีอยู่จริงและยังใช้งานอยู่หรือไม่ (ใช้ตรวจก่อนทำรายการยืม)"""
+    with connection() as conn:
+        row = conn.execute("SELECT is_active FROM members WHERE id = ?", (int(member_id),)).fetchone()
+    return bool(row and row[0] == 1)
+
+def allocate_member_ids(c, count: int) -> int:
     """
-    เพิ่มสมาชิกใหม่
+    จองช่วงรหัส id ของสมาชิก count รายการ (ต้องเรียกภายใน transaction ที่ล็อกการเขียนแล้ว)
+    คืนค่า id แรกของช่วง — id ถัดไปคือ first_id + 1, + 2, ...
     """
-    conn = get_connection()
+    c.execute("""
+        SELECT MAX(
+            IFNULL((SELECT MAX(id) FROM members), 0),
+            IFNULL((SELECT seq FROM sqlite_sequence WHERE name='members'), 0)
+        ) + 1
+    """)
+    return c.fetchone()[0]
+
+
+def member_code_for(member_id: int) -> str:
+    # รหัสสมาชิกอัตโนมัติ เช่น M0001
+    return f"M{member_id:04d}"
+
+
+def _insert_member(conn, name: str, email: str, phone: str):
     c = conn.cursor()
 
     # สร้างรหัสสมาชิกอัตโนมัติ เช่น M0001
-    c.execute("SELECT IFNULL(MAX(id), 0) + 1 FROM members")
-    next_id = c.fetchone()[0]
-    member_code = f"M{next_id:04d}"
+    next_id = allocate_member_ids(c, 1)
 
     c.execute("""
-        INSERT INTO members (member_code, name, email, phone, is_active)
-        VALUES (?, ?, ?, ?, 1)
-    """, (member_code, name, email, phone))
+        INSERT INTO members (id, member_code, name, email, phone, is_active)
+        VALUES (?, ?, ?, ?, ?, 1)
+    """, (next_id, member_code_for(next_id), name, email, phone))
 
-    conn.commit()
-    conn.close()
+    bump_tables(conn, "members")
+
+
+def insert_member(name: str, email: str, phone: str):
+    """
+    เพิ่มสมาชิกใหม่
+    """
+    execute_write(_insert_member, name, email, phone)
+
+
+# ============================================================
+# SEARCH (FTS5 trigram)
+# ============================================================
+SEARCH_LIMIT = 50
+SEARCH_MIN_CHARS = 3    # trigram ทำดัชนีได้ตั้งแต่ 3 ตัวอักษร
+
+
+def _fts_filter(fts_table: str, q: str) -> tuple:
+    """
+    แปลงคำค้น (ยาว SEARCH_MIN_CHARS ตัวอักษรขึ้นไป) เป็นเงื่อนไขบนตาราง fts (alias f)
+    MATCH แบบ phrase ใช้ดัชนี trigram เรียงตามความเกี่ยวข้อง
+    return: (เงื่อนไข SQL, พารามิเตอร์)
+    """
+    return f"{fts_table} MATCH ?", ['"' + q.replace('"', '""') + '"']
+
+
+def _prefix_range(prefix: str) -> tuple:
+    """ช่วง [lo, hi) ของข้อความที่ขึ้นต้นด้วย prefix (ค้นด้วย index แบบ range ได้)"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+@cached_query("books")
+def search_books(q: str, only_available: bool = True, limit: int = SEARCH_LIMIT) -> pd.DataFrame:
+    """
+    ค้นหาหนังสือจากบางส่วนของรหัสหรือชื่อหนังสือ/ผู้แต่ง
+    - คำค้นสั้นกว่า SEARCH_MIN_CHARS: รับเฉพาะตัวเลข ค้นรหัสหนังสือตรงตัว (trigram ใช้ไม่ได้)
+    - ยาวกว่านั้น: ค้นบางส่วนด้วยดัชนี full-text
+    คืนค่าไม่เกิน limit รายการ เรียงตามความเกี่ยวข้อง
+    """
+    q = (q or "").strip()
+    status_filter = "AND b.status = 'available'" if only_available else ""
+
+    with connection() as conn:
+        if not q:
+            return pd.read_sql_query(f"""
+                SELECT b.id, b.title, b.author, b.status
+                FROM books b
+                WHERE 1=1 {status_filter}
+                ORDER BY b.id DESC
+                LIMIT ?
+            """, conn, params=[int(limit)])
+
+        if len(q) < SEARCH_MIN_CHARS:
+            if not q.isdigit():
+                return pd.DataFrame(columns=["id", "title", "author", "status"])
+            return pd.read_sql_query(f"""
+                SELECT b.id, b.title, b.author, b.status
+                FROM books b
+                WHERE b.id = ? {status_filter}
+            """, conn, params=[int(q)])
+
+        cond, params = _fts_filter("books_fts", q)
+        return pd.read_sql_query(f"""
+            SELECT b.id, b.title, b.author, b.status
+            FROM books_fts f
+            JOIN books b ON b.id = f.rowid
+            WHERE {cond} {status_filter}
+            ORDER BY f.rank
+            LIMIT ?
+        """, conn, params=params + [int(limit)])
+
+
+@cached_query("members")
+def search_members(q: str, limit: int = SEARCH_LIMIT, only_active: bool = True) -> pd.DataFrame:
+    """
+    ค้นหาสมาชิกจากบางส่วนของรหัสสมาชิกหรือชื่อ
+    - คำค้นสั้นกว่า SEARCH_MIN_CHARS: ตัวเลขค้นรหัสสมาชิก (id) ตรงตัว
+      นอกนั้นค้นรหัสสมาชิกที่ขึ้นต้นด้วยคำค้น เช่น M0 (ใช้ index ของ member_code)
+    - ยาวกว่านั้น: ค้นบางส่วนด้วยดัชนี full-text
+    คืนค่าไม่เกิน limit รายการ เรียงตามความเกี่ยวข้อง
+    """
+    q = (q or "").strip()
+    active_filter = "AND m.is_active = 1" if only_active else ""
+
+    with connection() as conn:
+        if not q:
+            return pd.read_sql_query(f"""
+                SELECT m.id, m.member_code, m.name
+                FROM members m
+                WHERE 1=1 {active_filter}
+                ORDER BY m.id DESC
+                LIMIT ?
+            """, conn, params=[int(limit)])
+
+        if len(q) < SEARCH_MIN_CHARS:
+            if q.isdigit():
+                cond, params = "m.id = ?", [int(q)]
+            else:
+                cond, params = "m.member_code >= ? AND m.member_code < ?", list(_prefix_range(q.upper()))
+            return pd.read_sql_query(f"""
+                SELECT m.id, m.member_code, m.name
+                FROM members m
+                WHERE {cond} {active_filter}
+                ORDER BY m.member_code
+                LIMIT ?
+            """, conn, params=params + [int(limit)])
+
+        cond, params = _fts_filter("members_fts", q)
+        return pd.read_sql_query(f"""
+            SELECT m.id, m.member_code, m.name
+            FROM members_fts f
+            JOIN members m ON m.id = f.rowid
+            WHERE {cond} {active_filter}
+            ORDER BY f.rank
+            LIMIT ?
+        """, conn, params=params + [int(limit)])
+
+
+@cached_query("books")
+def get_books_by_ids(book_ids: list) -> pd.DataFrame:
+    """ข้อมูลหนังสือตามรายการรหัส (ใช้แสดงตะกร้ายืม)"""
+    book_ids = [int(b) for b in book_ids]
+    if not book_ids:
+        return pd.DataFrame(columns=["id", "title", "author", "status"])
+    with connection() as conn:
+        return pd.read_sql_query(f"""
+            SELECT id, title, author, status
+            FROM books
+            WHERE id IN ({_placeholders(len(book_ids))})
+            ORDER BY id
+        """, conn, params=book_ids)
 
 
 # ============================================================
 # BORROW
 # ============================================================
 def ensure_borrow_schema():
-    conn = get_connection()
-    c = conn.cursor()
+    """
+    คงไว้เพื่อให้โค้ดเดิมเรียกได้ — ตาราง borrow_tx / borrow_items
+    ถูกสร้างโดย migrations ตั้งแต่เปิด pool ครั้งแรกแล้ว
+    """
+    init_db()
 
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS borrow_tx (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            member_id INTEGER NOT NULL,
-            staff_user_id INTEGER NOT NULL,
-            borrow_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            default_due_date TEXT NOT NULL,
-            status TEXT DEFAULT 'open'
-        )
-    """)
 
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS borrow_items (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tx_id INTEGER NOT NULL,
-            book_id INTEGER NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            status TEXT DEFAULT 'borrowed',
-            return_staff_user_id INTEGER
-        )
-    """)
+class BooksUnavailableError(Exception):
+    """หนังสือบางเล่มไม่อยู่ในสถานะ available แล้ว (เช่น ถูกอีกจุดบริการยืมไปก่อน)"""
+
+    def __init__(self, book_ids: list):
+        self.book_ids = sorted(book_ids)
+        super().__init__(f"หนังสือรหัส {self.book_ids} ไม่พร้อมให้ยืมแล้ว")
+
 
-    conn.commit()
-    conn.close()
+def _placeholders(n: int) -> str:
+    return ",".join("?" * n)
 
 
 def create_borrow_transaction(
@@ -219,209 +1354,521 @@ def create_borrow_transaction(
 ):
     """
     สร้างรายการยืมหนังสือ
-    - 1 transaction ต่อการยืม
+    - สำเร็จหรือยกเลิกทั้งรายการ (อาจถูก commit พร้อมงานเขียนอื่นใน batch เดียวกัน)
     - 1 รายการต่อ 1 หนังสือ
+    - ถ้ามีเล่มใดไม่ available แล้ว จะยกเลิกทั้งรายการและ raise BooksUnavailableError
     """
-    ensure_borrow_schema()
-    conn = get_connection()
+    # ตัดรหัสซ้ำ โดยคงลำดับเดิม
+    book_ids = list(dict.fromkeys(int(b) for b in book_ids))
+
+    # งานเขียนทำใน transaction ที่ล็อกการเขียนแล้ว (BEGIN IMMEDIATE)
+    # ป้องกันสองจุดบริการยืมเล่มเดียวกันพร้อมกัน
+    return execute_write(_create_borrow_transaction, member_id, book_ids, staff_user_id, default_due_date)
+
+
+def _create_borrow_transaction(conn, member_id: int, book_ids: list, staff_user_id: int, default_due_date: str):
     c = conn.cursor()
+    _advance_overdue_counts(conn)
+
+    # สร้าง transaction หลัก
+    c.execute("""
+        INSERT INTO borrow_tx (member_id, staff_user_id, default_due_date)
+        VALUES (?, ?, ?)
+    """, (member_id, staff_user_id, default_due_date))
 
+    tx_id = c.lastrowid
+
+    # เปลี่ยนสถานะเฉพาะเล่มที่ยัง available ในคำสั่งเดียว
+    c.execute(f"""
+        UPDATE books
+        SET status='borrowed'
+        WHERE status='available'
+          AND id IN ({_placeholders(len(book_ids))})
+        RETURNING id
+    """, book_ids)
+    taken = {row[0] for row in c.fetchall()}
+
+    # จำนวนแถวที่เปลี่ยนไม่ครบ = มีเล่มที่ถูกยืมไปแล้ว/ไม่มีอยู่จริง
+    # (ผู้เรียก rollback ทั้งรายการ)
+    if len(taken) != len(book_ids):
+        raise BooksUnavailableError(set(book_ids) - taken)
+
+    # เพิ่มหนังสือที่ยืม
+    # สถานะใน books ไม่ตรงกับรายการยืม (เล่มยังมีรายการค้างยืม) → ชน unique index
     try:
-        # สร้าง transaction หลัก
-        c.execute("""
-            INSERT INTO borrow_tx (member_id, staff_user_id, default_due_date)
+        c.executemany("""
+            INSERT INTO borrow_items (tx_id, book_id, due_date)
             VALUES (?, ?, ?)
-        """, (member_id, staff_user_id, default_due_date))
+        """, [(tx_id, book_id, default_due_date) for book_id in book_ids])
+    except sqlite3.IntegrityError:
+        c.execute(f"""
+            SELECT book_id FROM borrow_items
+            WHERE status='borrowed'
+              AND book_id IN ({_placeholders(len(book_ids))})
+        """, book_ids)
+        on_loan = {row[0] for row in c.fetchall()}
+        if not on_loan:
+            raise
+        raise BooksUnavailableError(on_loan) from None
+
+    bump_tables(conn, "books", "borrow_tx", "borrow_items")
+    return tx_id
+
+def return_borrow_items(item_ids: list, return_staff_user_id: int) -> tuple:
+    """
+    คืนหนังสือหลายรายการใน transaction เดียว
+    - เปลี่ยนสถานะรายการเป็น returned พร้อมวันที่คืนและผู้ทำรายการคืน
+    - เปลี่ยนสถานะหนังสือกลับเป็น available
+    - ปิด borrow_tx ที่คืนครบทุกเล่มแล้ว
+    return: (returned_ids, failed_ids) — failed คือรายการที่ไม่พบหรือถูกคืนไปแล้ว
+    """
+    item_ids = list(dict.fromkeys(int(i) for i in item_ids))
+    if not item_ids:
+        return [], []
 
-        tx_id = c.lastrowid
+    rows = execute_write(_return_borrow_items, "id", item_ids, return_staff_user_id)
 
-        # เพิ่มหนังสือที่ยืม
-        for book_id in book_ids:
-            c.execute("""
-                INSERT INTO borrow_items (tx_id, book_id, due_date)
-                VALUES (?, ?, ?)
-            """, (tx_id, book_id, default_due_date))
+    returned = {r[0] for r in rows}
+    returned_ids = [i for i in item_ids if i in returned]
+    failed_ids = [i for i in item_ids if i not in returned]
+    return returned_ids, failed_ids
 
-            c.execute("""
-                UPDATE books
-                SET status='borrowed'
-                WHERE id=?
-            """, (book_id,))
 
-        conn.commit()
-        return tx_id
+def return_by_book_ids(book_ids: list, return_staff_user_id: int) -> tuple:
+    """
+    คืนหนังสือจากรหัสหนังสือที่สแกน (ไม่ต้องเลือกสมาชิกก่อน) ใน transaction เดียว
+    หนังสือ 1 เล่มมีรายการที่ยังไม่คืนได้รายการเดียว (unique index idx_borrow_items_open_book)
+    จึงหารายการยืมได้ด้วยการค้นดัชนีครั้งเดียวต่อเล่ม
+    return: (returned_book_ids, failed_book_ids) — failed คือเล่มที่ไม่มีรายการค้างยืม
+    """
+    book_ids = list(dict.fromkeys(int(b) for b in book_ids))
+    if not book_ids:
+        return [], []
 
-    except Exception as e:
-        conn.rollback()
-        raise e
+    rows = execute_write(_return_borrow_items, "book_id", book_ids, return_staff_user_id)
 
-    finally:
-        conn.close()
+    returned = {r[1] for r in rows}
+    returned_ids = [b for b in book_ids if b in returned]
+    failed_ids = [b for b in book_ids if b not in returned]
+    return returned_ids, failed_ids
 
+
+def _return_borrow_items(conn, key_col: str, ids: list, return_staff_user_id: int) -> list:
+    """
+    คืนรายการที่ยังไม่คืน ตามรหัสรายการ (key_col='id') หรือรหัสหนังสือ (key_col='book_id')
+    return: แถว (item_id, book_id, tx_id) ที่คืนสำเร็จ
+    """
+    c = conn.cursor()
+    _advance_overdue_counts(conn)
+
+    c.execute(f"""
+        UPDATE borrow_items
+        SET status='returned',
+            return_date=CURRENT_TIMESTAMP,
+            return_staff_user_id=?
+        WHERE status='borrowed'
+          AND {key_col} IN ({_placeholders(len(ids))})
+        RETURNING id, book_id, tx_id
+    """, [return_staff_user_id] + ids)
+    rows = c.fetchall()
+
+    if rows:
+        book_ids = list({r[1] for r in rows})
+        tx_ids = list({r[2] for r in rows})
+
+        c.execute(f"""
+            UPDATE books
+            SET status='available'
+            WHERE id IN ({_placeholders(len(book_ids))})
+        """, book_ids)
+
+        # ปิดรายการยืมหลักที่ไม่มีเล่มค้างแล้ว
+        c.execute(f"""
+            UPDATE borrow_tx
+            SET status='closed'
+            WHERE id IN ({_placeholders(len(tx_ids))})
+              AND NOT EXISTS (
+                  SELECT 1 FROM borrow_items bi
+                  WHERE bi.tx_id = borrow_tx.id
+                    AND bi.status = 'borrowed'
+              )
+        """, tx_ids)
+
+    bump_tables(conn, "books", "borrow_tx", "borrow_items")
+    return rows
+
+
+def return_borrow_item(item_id: int, return_staff_user_id: int) -> bool:
+    """คืนหนังสือ 1 รายการ — True ถ้าคืนสำเร็จ"""
+    returned_ids, _ = return_borrow_items([item_id], return_staff_user_id)
+    return bool(returned_ids)
+
+@cached_query("borrow_items", "borrow_tx", "members", "books")
 def get_active_borrow_items_by_member(member_id: int) -> pd.DataFrame:
     """
     ดึงรายการหนังสือที่ยังไม่คืน ของสมาชิก 1 คน
     ใช้ในหน้า 'คืนหนังสือ'
     """
-    ensure_borrow_schema()
-    conn = get_connection()
-
-    df = pd.read_sql_query("""
-        SELECT
-            bi.id AS item_id,
-            tx.id AS tx_id,
-            m.member_code AS รหัสสมาชิก,
-            m.name AS ชื่อสมาชิก,
-            bk.id AS book_id,
-            bk.title AS ชื่อหนังสือ,
-            tx.borrow_date AS วันที่ยืม,
-            bi.due_date AS กำหนดส่ง
-        FROM borrow_items bi
-        JOIN borrow_tx tx ON tx.id = bi.tx_id
-        JOIN members m ON m.id = tx.member_id
-        JOIN books bk ON bk.id = bi.book_id
-        WHERE bi.status = 'borrowed'
-          AND m.id = ?
-        ORDER BY bi.id DESC
-    """, conn, params=(member_id,))
+    with connection() as conn:
+        df = pd.read_sql_query("""
+            SELECT
+                bi.id AS item_id,
+                tx.id AS tx_id,
+                m.member_code AS รหัสสมาชิก,
+                m.name AS ชื่อสมาชิก,
+                bk.id AS book_id,
+                bk.title AS ชื่อหนังสือ,
+                tx.borrow_date AS วันที่ยืม,
+                bi.due_date AS กำหนดส่ง
+            FROM borrow_items bi
+            JOIN borrow_tx tx ON tx.id = bi.tx_id
+            JOIN members m ON m.id = tx.member_id
+            JOIN books bk ON bk.id = bi.book_id
+            WHERE bi.status = 'borrowed'
+              AND tx.member_id = ?
+            ORDER BY bi.id DESC
+        """, conn, params=(member_id,))
 
-    conn.close()
     return df
 
+@cached_query("borrow_items", "borrow_tx", "members", "books")
 def get_active_borrow_items() -> pd.DataFrame:
     """
     ดึงรายการหนังสือที่กำลังถูกยืมอยู่ทั้งหมด
     ใช้ในหน้า 'รายการยืมปัจจุบัน'
     """
-    ensure_borrow_schema()
-    conn = get_connection()
+    with connection() as conn:
+        df = pd.read_sql_query("""
+            SELECT
+                bi.id AS item_id,
+                tx.id AS tx_id,
+                m.member_code AS รหัสสมาชิก,
+                m.name AS ชื่อสมาชิก,
+                bk.id AS book_id,
+                bk.title AS ชื่อหนังสือ,
+                tx.borrow_date AS วันที่ยืม,
+                bi.due_date AS กำหนดส่ง
+            FROM borrow_items bi
+            JOIN borrow_tx tx ON tx.id = bi.tx_id
+            JOIN members m ON m.id = tx.member_id
+            JOIN books bk ON bk.id = bi.book_id
+            WHERE bi.status = 'borrowed'
+            ORDER BY bi.id DESC
+        """, conn)
 
-    df = pd.read_sql_query("""
-        SELECT
-            bi.id AS item_id,
-            tx.id AS tx_id,
-            m.member_code AS รหัสสมาชิก,
-            m.name AS ชื่อสมาชิก,
-            bk.id AS book_id,
-            bk.title AS ชื่อหนังสือ,
-            tx.borrow_date AS วันที่ยืม,
-            bi.due_date AS กำหนดส่ง
-        FROM borrow_items bi
-        JOIN borrow_tx tx ON tx.id = bi.tx_id
-        JOIN members m ON m.id = tx.member_id
-        JOIN books bk ON bk.id = bi.book_id
-        WHERE bi.status = 'borrowed'
-        ORDER BY bi.id DESC
-    """, conn)
-
-    conn.close()
     return df
 
-def get_borrow_history(limit: int = 200) -> pd.DataFrame:
+BORROW_HISTORY_SELECT = """
+    SELECT
+        bi.id AS item_id,
+        tx.id AS tx_id,
+
+        m.member_code AS รหัสสมาชิก,
+        m.name AS ชื่อสมาชิก,
+
+        bk.id AS รหัสหนังสือ,
+        bk.title AS ชื่อหนังสือ,
+
+        tx.borrow_date AS วันที่ยืม,
+        bi.due_date AS กำหนดส่ง,
+        bi.return_date AS วันที่คืน,
+
+        bi.status AS สถานะ,
+
+        u1.username AS ผู้ทำรายการยืม,
+        u2.username AS ผู้ทำรายการคืน
+    FROM borrow_items bi
+    JOIN borrow_tx tx ON tx.id = bi.tx_id
+    JOIN members m ON m.id = tx.member_id
+    JOIN books bk ON bk.id = bi.book_id
+    LEFT JOIN users u1 ON u1.id = tx.staff_user_id
+    LEFT JOIN users u2 ON u2.id = bi.return_staff_user_id
+"""
+
+
+@cached_query("borrow_items", "borrow_tx", "members", "books", "users")
+def get_borrow_history_page(cursor=None, direction: str = "next", limit: int = PAGE_SIZE) -> Page:
     """
-    ดึงประวัติการยืม-คืนทั้งหมด (ทั้งที่คืนแล้วและยังไม่คืน)
+    ประวัติการยืม-คืนทีละหน้า (ทั้งที่คืนแล้วและยังไม่คืน)
     ใช้ในหน้า ประวัติการยืม-คืน
     """
-    ensure_borrow_schema()
-    conn = get_connection()
+    with connection() as conn:
+        return _fetch_page(
+            conn,
+            BORROW_HISTORY_SELECT,
+            key_col="bi.id",
+            key_field="item_id",
+            cursor=cursor,
+            direction=direction,
+            limit=limit
+        )
 
-    df = pd.read_sql_query(f"""
-        SELECT
-            bi.id AS item_id,
-            tx.id AS tx_id,
 
-            m.member_code AS รหัสสมาชิก,
-            m.name AS ชื่อสมาชิก,
+def get_borrow_history(limit: int = 200) -> pd.DataFrame:
+    """
+    ดึงประวัติการยืม-คืนล่าสุด limit รายการ
+    """
+    return get_borrow_history_page(limit=limit).df
 
-            bk.id AS รหัสหนังสือ,
-            bk.title AS ชื่อหนังสือ,
+# ============================================================
+# OVERDUE
+# ============================================================
+# รายการเกินกำหนดส่ง = ยังไม่คืน และ due_date < as_of (วันที่ YYYY-MM-DD ที่ใช้ตัดสิน)
+# - รายการ: ค้นจาก idx_borrow_items_open_due (เฉพาะรายการที่ยังยืมอยู่) ไม่อ่านประวัติที่คืนแล้ว
+# - จำนวนต่อสมาชิก: ตาราง member_overdue_counts ที่นับไว้ ณ overdue_state.as_of (วันนี้)
+#   trigger ปรับจำนวนทุกครั้งที่ยืม/คืน และการยืม/คืนครั้งแรกของวันใหม่จะเลื่อน as_of ไปข้างหน้า
+#   โดยนับเพิ่มเฉพาะรายการที่ครบกำหนดระหว่างสองวัน (range scan บนดัชนีเดียวกัน)
+#   ขอดูวันอื่น (หรือวันนี้ก่อนมีการยืม/คืน) นับตรงจากดัชนีด้วย GROUP BY — การอ่านไม่เขียนข้อมูล
+# INDEXED BY: idx_borrow_items_open (status) ก็ใช้กับเงื่อนไข status = 'borrowed' ได้
+# แต่ต้องอ่านรายการค้างยืมทั้งหมดแล้วเรียงใหม่ จึงระบุดัชนีกำหนดส่งไว้ตรง ๆ
+OVERDUE_SELECT = """
+    SELECT
+        bi.id AS item_id,
+        tx.id AS tx_id,
+        m.member_code AS รหัสสมาชิก,
+        m.name AS ชื่อสมาชิก,
+        bk.id AS book_id,
+        bk.title AS ชื่อหนังสือ,
+        tx.borrow_date AS วันที่ยืม,
+        bi.due_date AS กำหนดส่ง,
+        CAST(julianday(?) - julianday(bi.due_date) AS INTEGER) AS จำนวนวันเกินกำหนด
+    FROM borrow_items bi INDEXED BY idx_borrow_items_open_due
+    JOIN borrow_tx tx ON tx.id = bi.tx_id
+    JOIN members m ON m.id = tx.member_id
+    JOIN books bk ON bk.id = bi.book_id
+    WHERE bi.status = 'borrowed'
+      AND bi.due_date < ?
+"""
+
+# แถวแรกมาจาก overdue_state เสมอ (LEFT JOIN) จึงรู้ได้ใน query เดียวว่าจำนวนที่อ่านได้นับไว้ ณ วันใด
+MEMBER_OVERDUE_SELECT = """
+    SELECT
+        s.as_of,
+        c.member_id,
+        m.member_code AS รหัสสมาชิก,
+        m.name AS ชื่อสมาชิก,
+        c.count AS จำนวนเกินกำหนด
+    FROM overdue_state s
+    LEFT JOIN member_overdue_counts c ON c.count > 0
+    LEFT JOIN members m ON m.id = c.member_id
+    ORDER BY c.count DESC, c.member_id
+"""
+
+# จำนวนต่อสมาชิก ณ วันที่ใดก็ได้ นับตรงจากดัชนีกำหนดส่ง (ไม่ใช้ตารางสรุป)
+MEMBER_OVERDUE_GROUP_SELECT = """
+    SELECT
+        tx.member_id,
+        m.member_code AS รหัสสมาชิก,
+        m.name AS ชื่อสมาชิก,
+        COUNT(*) AS จำนวนเกินกำหนด
+    FROM borrow_items bi INDEXED BY idx_borrow_items_open_due
+    JOIN borrow_tx tx ON tx.id = bi.tx_id
+    JOIN members m ON m.id = tx.member_id
+    WHERE bi.status = 'borrowed'
+      AND bi.due_date < ?
+    GROUP BY tx.member_id
+    ORDER BY จำนวนเกินกำหนด DESC, tx.member_id
+"""
+
+
+def _as_of_text(as_of) -> str:
+    """date หรือ 'YYYY-MM-DD' → 'YYYY-MM-DD' (ValueError ถ้ารูปแบบไม่ถูกต้อง)"""
+    return date.fromisoformat(str(as_of)[:10]).isoformat()
+
+
+def _overdue_key(row) -> str:
+    # cursor ของรายการเกินกำหนด: "กำหนดส่ง|item_id"
+    return f"{row['กำหนดส่ง']}|{int(row['item_id'])}"
+
+
+@cached_query("borrow_items", "borrow_tx", "members", "books")
+def get_overdue_items(as_of, cursor=None, direction: str = "next", limit: int = PAGE_SIZE) -> Page:
+    """
+    รายการที่เกินกำหนดส่ง ณ วันที่ as_of ทีละหน้า เรียงจากเกินกำหนดนานที่สุด (กำหนดส่ง, item_id)
+    ใช้ keyset บนดัชนีกำหนดส่ง ต้นทุนขึ้นกับขนาดหน้า ไม่ขึ้นกับจำนวนประวัติการยืม
+    """
+    as_of = _as_of_text(as_of)
+    sql = OVERDUE_SELECT
+    params = [as_of, as_of]
+
+    if cursor is not None:
+        due, item_id = str(cursor).split("|")
+        sql += f" AND (bi.due_date, bi.id) {'>' if direction == 'next' else '<'} (?, ?)"
+        params += [due, int(item_id)]
+
+    order = "ASC" if direction == "next" else "DESC"
+    with connection() as conn:
+        df = pd.read_sql_query(
+            f"{sql} ORDER BY bi.due_date {order}, bi.id {order} LIMIT ?",
+            conn,
+            params=params + [int(limit) + 1]
+        )
 
-            tx.borrow_date AS วันที่ยืม,
-            bi.due_date AS กำหนดส่ง,
-            bi.return_date AS วันที่คืน,
+    has_more = len(df) > limit
+    df = df.iloc[:limit]
+    if direction == "prev":
+        df = df.iloc[::-1]
+    df = df.reset_index(drop=True)
 
-            bi.status AS สถานะ,
+    if df.empty:
+        return Page(df, None, None)
 
-            u1.username AS ผู้ทำรายการยืม,
-            u2.username AS ผู้ทำรายการคืน
-        FROM borrow_items bi
+    first_key = _overdue_key(df.iloc[0])
+    last_key = _overdue_key(df.iloc[-1])
+
+    if direction == "next":
+        return Page(df, last_key if has_more else None, first_key if cursor is not None else None)
+    return Page(df, last_key if cursor is not None else None, first_key if has_more else None)
+
+
+def _member_overdue_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.dropna(subset=["member_id"]).drop(columns=["as_of"])
+    df["member_id"] = df["member_id"].astype(int)
+    df["จำนวนเกินกำหนด"] = df["จำนวนเกินกำหนด"].astype(int)
+    return df.reset_index(drop=True)
+
+
+def _advance_overdue_counts(conn):
+    """
+    เลื่อนวันที่ของ member_overdue_counts ไปเป็นวันนี้ (เฉพาะไปข้างหน้า)
+    เรียกตอนต้นของงานยืม/คืน ภายใน transaction การเขียน ก่อน trigger ทำงาน
+    """
+    today = date.today().isoformat()
+    (current,) = conn.execute("SELECT as_of FROM overdue_state").fetchone()
+    if today <= current:
+        return
+
+    # รายการที่ครบกำหนดใน [current, today) เพิ่งเกินกำหนด
+    conn.execute("""
+        INSERT INTO member_overdue_counts (member_id, count)
+        SELECT tx.member_id, COUNT(*)
+        FROM borrow_items bi INDEXED BY idx_borrow_items_open_due
         JOIN borrow_tx tx ON tx.id = bi.tx_id
-        JOIN members m ON m.id = tx.member_id
-        JOIN books bk ON bk.id = bi.book_id
-        LEFT JOIN users u1 ON u1.id = tx.staff_user_id
-        LEFT JOIN users u2 ON u2.id = bi.return_staff_user_id
-        ORDER BY bi.id DESC
-        LIMIT {int(limit)}
-    """, conn)
+        WHERE bi.status = 'borrowed'
+          AND bi.due_date >= ? AND bi.due_date < ?
+        GROUP BY tx.member_id
+        ON CONFLICT(member_id) DO UPDATE SET count = count + excluded.count
+    """, (current, today))
+    conn.execute("UPDATE overdue_state SET as_of = ?", (today,))
 
-    conn.close()
+
+@cached_query("borrow_items", "borrow_tx", "members")
+def get_member_overdue_counts(as_of) -> pd.DataFrame:
+    """
+    จำนวนรายการเกินกำหนดส่งของสมาชิกแต่ละคน ณ วันที่ as_of เรียงจากมากไปน้อย
+    (เฉพาะสมาชิกที่มีรายการเกินกำหนด)
+    - as_of ตรงกับวันที่ที่ตารางสรุปนับไว้: อ่านจาก member_overdue_counts
+    - วันอื่น: นับจากดัชนีกำหนดส่งด้วย GROUP BY (ไม่เลื่อนวันที่ของตารางสรุป)
+    """
+    as_of = _as_of_text(as_of)
+    with connection() as conn:
+        df = pd.read_sql_query(MEMBER_OVERDUE_SELECT, conn)
+        if df["as_of"].iloc[0] == as_of:
+            return _member_overdue_frame(df)
+
+        df = pd.read_sql_query(MEMBER_OVERDUE_GROUP_SELECT, conn, params=[as_of])
+    df["member_id"] = df["member_id"].astype(int)
+    df["จำนวนเกินกำหนด"] = df["จำนวนเกินกำหนด"].astype(int)
     return df
 
+
 ############ ดึงข้อมูลสรุปสถานะหนังสือทั้งหมด ##############
+@cached_query("books")
 def get_book_status_summary() -> pd.DataFrame:
-    """ดึงข้อมูลจำนวนหนังสือ แยกตามสถานะ"""
+    """ดึงข้อมูลจำนวนหนังสือ แยกตามสถานะ (จากตารางสรุป book_status_counts)"""
 
-    conn = get_connection()
+    with connection() as conn:
+        query = """
+            SELECT
+                status AS สถานะหนังสือ,
+                count AS จำนวน
+            FROM book_status_counts
+            WHERE count > 0
+            ORDER BY status
+        """
 
-    query = """
-        SELECT
-            status AS สถานะหนังสือ,
-            COUNT(*) AS จำนวน
-        FROM books
-        GROUP BY status
-    """
-
-    df = pd.read_sql_query(query, conn)
-
-    conn.close()
+        df = pd.read_sql_query(query, conn)
 
     return df
 
 ############## ดึงข้อมูลสรุปจำนวนการยืมรายเดือน ##############
+@cached_query("borrow_tx")
 def get_borrow_summary_by_month(
     start_date: str,
     end_date: str
 ) -> pd.DataFrame:
     """
     สรุปจำนวนการยืมรายเดือน ตามช่วงวันที่ที่กำหนด
+    - ช่วงที่เป็นเดือนเต็ม อ่านจาก borrow_monthly_counts
+    - ช่วงอื่นรวมจาก borrow_daily_counts (ไม่เกิน 1 แถวต่อวัน)
     """
+    start = date.fromisoformat(start_date)
+    end_next = date.fromisoformat(_date_range(start_date, end_date)[1])
+
+    with connection() as conn:
+        if start.day == 1 and end_next.day == 1:
+            query = """
+                SELECT
+                    month AS เดือน,
+                    count AS จำนวนการยืม
+                FROM borrow_monthly_counts
+                WHERE month >= ? AND month < ? AND count > 0
+                ORDER BY month
+            """
+            params = [start_date[:7], end_next.isoformat()[:7]]
+        else:
+            query = """
+                SELECT
+                    substr(day, 1, 7) AS เดือน,
+                    SUM(count) AS จำนวนการยืม
+                FROM borrow_daily_counts
+                WHERE day >= ? AND day < ? AND count > 0
+                GROUP BY substr(day, 1, 7)
+                ORDER BY เดือน
+            """
+            params = list(_date_range(start_date, end_date))
+
+        df = pd.read_sql_query(
+            query,
+            conn,
+            params=params
+        )
 
-    conn = get_connection()
+    return df
 
-    query = """
-        SELECT
-            strftime('%Y-%m', borrow_date) AS เดือน,
-            COUNT(*) AS จำนวนการยืม
-        FROM borrow_tx
-        WHERE DATE(borrow_date) BETWEEN ? AND ?
-        GROUP BY strftime('%Y-%m', borrow_date)
-        ORDER BY เดือน
+
+def verify_summary_tables() -> dict:
+    """
+    เทียบตารางสรุปกับการนับจากตารางต้นทางจริง
+    คืนค่า {ชื่อตาราง: จำนวนแถวที่ไม่ตรงกัน} (ว่าง = ถูกต้องทั้งหมด)
     """
+    mismatches = {}
+    with connection() as conn:
+        for table, (key, source) in {**migrations.SUMMARY_SOURCES, **migrations.OVERDUE_SOURCES}.items():
+            expected = dict(conn.execute(source).fetchall())
+            actual = dict(conn.execute(f"SELECT {key}, count FROM {table} WHERE count != 0").fetchall())
+            diff = [k for k in expected.keys() | actual.keys() if expected.get(k, 0) != actual.get(k, 0)]
+            if diff:
+                mismatches[table] = len(diff)
+    return mismatches
 
-    df = pd.read_sql_query(
-        query,
-        conn,
-        params=[start_date, end_date]
-    )
 
-    conn.close()
+def _rebuild_summary_tables(conn):
+    migrations.rebuild_summaries(conn.cursor())
+    migrations.rebuild_summaries(conn.cursor(), migrations.OVERDUE_SOURCES)
+    bump_tables(conn, "books", "borrow_tx", "borrow_items")
 
-    return df
+
+def rebuild_summary_tables():
+    """คำนวณตารางสรุปใหม่ทั้งหมด (ใช้เมื่อ verify_summary_tables พบว่าไม่ตรง)"""
+    execute_write(_rebuild_summary_tables)
 
 ######### ดึงข้อมูลรายงานการยืม-คืนทั้งหมด (กรองตามช่วงเวลา) #########
-def get_borrow_report(
-    start_date: str,
-    end_date: str,
-    status: str
-) -> pd.DataFrame:
-    """
-    รายงานการยืม-คืนทั้งหมด
-    - กรองตามช่วงเวลา
-    - กรองตามสถานะ borrowed / returned / all
-    """
+REPORT_CHUNK_SIZE = 5000
 
-    conn = get_connection()
 
+def borrow_report_query(start_date: str, end_date: str, status: str) -> tuple:
+    """SQL + parameters ของรายงานการยืม-คืน (ใช้ร่วมกันระหว่างแสดงผลและส่งออก)"""
     base_query = """
         SELECT
             m.member_code AS รหัสสมาชิก,
@@ -439,10 +1886,10 @@ def get_borrow_report(
         JOIN books bk ON bk.id = bi.book_id
         JOIN users u1 ON u1.id = tx.staff_user_id
         LEFT JOIN users u2 ON u2.id = bi.return_staff_user_id
-        WHERE DATE(tx.borrow_date) BETWEEN ? AND ?
+        WHERE tx.borrow_date >= ? AND tx.borrow_date < ?
     """
 
-    params = [start_date, end_date]
+    params = list(_date_range(start_date, end_date))
 
     # กรองตามสถานะ (ถ้าไม่ใช่ all)
     if status != "all":
@@ -452,37 +1899,84 @@ def get_borrow_report(
     # เรียงจากล่าสุดไปเก่าสุด
     base_query += " ORDER BY tx.borrow_date DESC"
 
-    df = pd.read_sql_query(
-        base_query,
-        conn,
-        params=params
-    )
+    return base_query, params
 
-    conn.close()
+
+@cached_query("borrow_items", "borrow_tx", "members", "books", "users")
+def get_borrow_report(
+    start_date: str,
+    end_date: str,
+    status: str,
+    limit: int = None
+) -> pd.DataFrame:
+    """
+    รายงานการยืม-คืนทั้งหมด
+    - กรองตามช่วงเวลา
+    - กรองตามสถานะ borrowed / returned / all
+    - limit: อ่านเฉพาะ limit แถวแรก (ตัวอย่างรายงาน) — ช่วงยาวหลายปีไม่ต้องโหลดทั้งหมด
+    """
+    query, params = borrow_report_query(start_date, end_date, status)
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(int(limit))
+
+    with connection() as conn:
+        df = pd.read_sql_query(
+            query,
+            conn,
+            params=params
+        )
 
     return df
-# =========================
-# Admin / User
-# =========================
-def is_username_exists(username: str) -> bool:
-    conn = get_connection()
-    c = conn.cursor()
 
-    c.execute("SELECT 1 FROM users WHERE username = ?", (username,))
-    result = c.fetchone()
 
-    conn.close()
-    return result is not None
+def iter_borrow_report(
+    start_date: str,
+    end_date: str,
+    status: str,
+    chunksize: int = REPORT_CHUNK_SIZE
+):
+    """
+    รายงานการยืม-คืน แบบทยอยอ่านทีละ chunk (DataFrame ละไม่เกิน chunksize แถว)
+    ใช้สำหรับส่งออกไฟล์ขนาดใหญ่โดยไม่โหลดทั้งหมดเข้าหน่วยความจำ
+    connection ถูกยืมไว้จนกว่าจะอ่านครบหรือปิด generator
+    """
+    query, params = borrow_report_query(start_date, end_date, status)
+
+    with connection() as conn:
+        yield from pd.read_sql_query(
+            query,
+            conn,
+            params=params,
+            chunksize=chunksize
+        )
 
 
-def add_user(username: str, password_hash: str, role: str, is_active: int):
-    conn = get_connection()
-    c = conn.cursor()
+def iter_borrow_report_rows(
+    start_date: str,
+    end_date: str,
+    status: str,
+    chunksize: int = REPORT_CHUNK_SIZE
+):
+    """
+    เหมือน iter_borrow_report แต่ yield list ของ tuple ตรงจาก cursor (fetchmany)
+    ไม่ผ่าน DataFrame จึงเร็วและใช้หน่วยความจำน้อยกว่า สำหรับเขียนไฟล์ทีละแถว
+    """
+    query, params = borrow_report_query(start_date, end_date, status)
 
-    c.execute("""
-        INSERT INTO users (username, password_hash, role, is_active)
-        VALUES (?, ?, ?, ?)
-    """, (username, password_hash, role, is_active))
+    with connection() as conn:
+        cur = conn.execute(query, params)
+        while True:
+            rows = cur.fetchmany(chunksize)
+            if not rows:
+                return
+            yield rows
+
+
+@cached_query("borrow_items", "borrow_tx", "members", "books", "users")
+def count_borrow_report(start_date: str, end_date: str, status: str) -> int:
+    """จำนวนแถวของรายงาน (ใช้แสดงจำนวนทั้งหมด และคำนวณความคืบหน้าตอนส่งออก)"""
+    query, params = borrow_report_query(start_date, end_date, status)
 
-    conn.commit()
-    conn.close()
+    with connection() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
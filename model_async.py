@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import model
+
+# ============================================================
+# Async model API
+# ============================================================
+# ฟังก์ชันเดียวกับ model.py แต่เป็น coroutine สำหรับ front end แบบ async (เช่น api.py)
+# งาน SQLite ยังเป็น blocking จึงส่งไปทำใน thread pool ที่จำกัดจำนวน แยกเป็น 3 ช่องทาง
+# - read   : ค้นหา/อ่านข้อมูลสั้น ๆ หลาย thread พร้อมกัน (WAL อ่านพร้อมกันได้)
+# - report : รายงาน/ส่งออกที่ใช้เวลานาน แยกออกมาไม่ให้แย่ง thread ของการค้นหา
+# - write  : ส่งงานเขียนเข้าคิวของ writer thread ใน model (WriteCoordinator) ซึ่งเขียนทีละ batch
+#            ด้วย thread เดียวอยู่แล้ว ช่องทางนี้มีหลาย thread เพื่อให้งานที่รอพร้อมกันถูกรวม commit
+#            และไม่ถูกรายงานที่ช้าขวาง
+# แต่ละช่องทางรับงานค้างได้ไม่เกิน max_pending งาน เกินจากนั้นผู้เรียกจะรอ (back-pressure)
+READ_WORKERS = 4
+REPORT_WORKERS = 2
+WRITE_WORKERS = 4
+MAX_PENDING_READS = 256
+MAX_PENDING_REPORTS = 16
+MAX_PENDING_WRITES = 256
+
+
+class _Lane:
+    """thread pool + จำนวนงานค้างสูงสุด สำหรับงานประเภทเดียวกัน"""
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = None
+        self.in_flight = 0      # งานที่รอ/กำลังทำ (ทุก event loop)
+        # asyncio.Semaphore ผูกกับ event loop จึงแยกตาม loop
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix=f"model-{self.name}")
+        return self._executor
+
+    def _semaphore(self, loop) -> asyncio.Semaphore:
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = self._semaphores[loop] = asyncio.Semaphore(self.max_pending)
+        return sem
+
+    async def run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        async with self._semaphore(loop):
+            self.in_flight += 1
+            try:
+                return await loop.run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+            finally:
+                self.in_flight -= 1
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+_read_lane = _Lane("read", READ_WORKERS, MAX_PENDING_READS)
+_report_lane = _Lane("report", REPORT_WORKERS, MAX_PENDING_REPORTS)
+_write_lane = _Lane("write", WRITE_WORKERS, MAX_PENDING_WRITES)
+
+
+async def run_read(fn, *args, **kwargs):
+    """เรียกฟังก์ชันอ่านข้อมูลใดก็ได้ (เช่น controller.login) ในช่องทาง read"""
+    return await _read_lane.run(fn, *args, **kwargs)
+
+
+async def run_report(fn, *args, **kwargs):
+    return await _report_lane.run(fn, *args, **kwargs)
+
+
+async def run_write(fn, *args, **kwargs):
+    """เรียกฟังก์ชันที่เขียนข้อมูล (เช่น controller.borrow_books) ในช่องทาง write"""
+    return await _write_lane.run(fn, *args, **kwargs)
+
+
+def _lane_wrapper(runner, fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await runner(fn, *args, **kwargs)
+    return wrapper
+
+
+def _read(fn):
+    return _lane_wrapper(run_read, fn)
+
+
+def _report(fn):
+    return _lane_wrapper(run_report, fn)
+
+
+def _write(fn):
+    return _lane_wrapper(run_write, fn)
+
+
+def lane_stats() -> dict:
+    """จำนวน worker และงานที่รอ/กำลังทำ ของแต่ละช่องทาง"""
+    return {
+        lane.name: {"workers": lane.workers, "max_pending": lane.max_pending, "in_flight": lane.in_flight}
+        for lane in (_read_lane, _report_lane, _write_lane)
+    }
+
+
+def shutdown(wait: bool = True):
+    for lane in (_read_lane, _report_lane, _write_lane):
+        lane.shutdown(wait)
+
+
+# ============================================================
+# USER / SESSION
+# ============================================================
+get_user_auth_row = _read(model.get_user_auth_row)
+get_all_users = _read(model.get_all_users)
+is_username_exists = _read(model.is_username_exists)
+add_user = _write(model.add_user)
+create_api_session = _write(model.create_api_session)
+get_api_session_user = _read(model.get_api_session_user)
+delete_api_session = _write(model.delete_api_session)
+
+# ============================================================
+# BOOK / MEMBER
+# ============================================================
+get_all_books = _read(model.get_all_books)
+get_books_page = _read(model.get_books_page)
+get_available_books = _read(model.get_available_books)
+get_books_by_ids = _read(model.get_books_by_ids)
+search_books = _read(model.search_books)
+set_book_status = _write(model.set_book_status)
+insert_book = _write(model.insert_book)
+
+get_all_members = _read(model.get_all_members)
+get_members_page = _read(model.get_members_page)
+get_active_members = _read(model.get_active_members)
+is_member_active = _read(model.is_member_active)
+search_members = _read(model.search_members)
+insert_member = _write(model.insert_member)
+
+# ============================================================
+# BORROW
+# ============================================================
+create_borrow_transaction = _write(model.create_borrow_transaction)
+return_borrow_items = _write(model.return_borrow_items)
+return_borrow_item = _write(model.return_borrow_item)
+return_by_book_ids = _write(model.return_by_book_ids)
+get_active_borrow_items_by_member = _read(model.get_active_borrow_items_by_member)
+get_active_borrow_items = _read(model.get_active_borrow_items)
+get_borrow_history_page = _read(model.get_borrow_history_page)
+get_borrow_history = _read(model.get_borrow_history)
+get_overdue_items = _read(model.get_overdue_items)
+get_member_overdue_counts = _read(model.get_member_overdue_counts)
+
+# ============================================================
+# REPORT
+# ============================================================
+get_book_status_summary = _read(model.get_book_status_summary)
+get_borrow_summary_by_month = _read(model.get_borrow_summary_by_month)
+get_borrow_report = _report(model.get_borrow_report)
+count_borrow_report = _report(model.count_borrow_report)
+verify_summary_tables = _report(model.verify_summary_tables)
+rebuild_summary_tables = _write(model.rebuild_summary_tables)
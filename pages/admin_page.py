@@ -1,6 +1,8 @@
+import os
 import streamlit as st
 import model
 import controller
+import profiling
 
 
 def render_admin():
@@ -64,3 +66,96 @@ def render_admin():
                 st.success(m) if ok else st.error(m)
             if ok:
                 st.rerun()
+
+    st.divider()
+    render_sql_stats()
+
+    st.divider()
+    render_page_profiles()
+
+
+def render_sql_stats():
+    """สถิติคำสั่ง SQL และ slow-query log (เฉพาะ admin)"""
+    user = st.session_state.get("user") or {}
+    if user.get("role") != "admin":
+        return
+
+    st.subheader("📈 สถิติคำสั่ง SQL")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        enabled = st.checkbox("เก็บสถิติ", value=model.SQL_STATS_ENABLED, key="sql_stats_enabled")
+    with col2:
+        slow_ms = st.number_input(
+            "เกณฑ์คำสั่งช้า (ms)", min_value=1.0, value=float(model.SLOW_QUERY_MS), step=50.0,
+            key="sql_slow_ms"
+        )
+    with col3:
+        explain = st.checkbox(
+            "เก็บ EXPLAIN QUERY PLAN ของคำสั่งช้า", value=model.EXPLAIN_SLOW_QUERIES, key="sql_explain"
+        )
+    model.configure_sql_stats(enabled=enabled, slow_query_ms=slow_ms, explain_slow=explain)
+
+    if st.button("ล้างสถิติ"):
+        model.reset_sql_stats()
+        st.rerun()
+
+    stats_df = model.sql_stats()
+    if stats_df.empty:
+        st.info("ยังไม่มีข้อมูล")
+    else:
+        st.dataframe(stats_df, use_container_width=True)
+
+    st.markdown("#### 🐢 คำสั่งที่ช้ากว่าเกณฑ์")
+    slow_df = model.slow_queries()
+    if slow_df.empty:
+        st.info("ไม่มีคำสั่งที่ช้ากว่าเกณฑ์")
+    else:
+        st.dataframe(slow_df, use_container_width=True)
+
+
+def render_page_profiles():
+    """เวลาแสดงผลของแต่ละหน้า และไฟล์ cProfile (เฉพาะ admin)"""
+    user = st.session_state.get("user") or {}
+    if user.get("role") != "admin":
+        return
+
+    st.subheader("⏱️ เวลาแสดงผลแต่ละหน้า")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        trace_memory = st.checkbox(
+            "วัดหน่วยความจำสูงสุด (ทำให้ช้าลง)", value=profiling.TRACE_MEMORY, key="profile_memory"
+        )
+    with col2:
+        cprofile = st.checkbox(
+            "บันทึก cProfile ทุกครั้งที่แสดงผล", value=profiling.CPROFILE_ENABLED, key="profile_cprofile"
+        )
+    profiling.configure(trace_memory=trace_memory, cprofile=cprofile)
+
+    if st.button("ล้างข้อมูลเวลาแสดงผล"):
+        profiling.reset()
+        st.rerun()
+
+    summary_df = profiling.render_summary()
+    if summary_df.empty:
+        st.info("ยังไม่มีข้อมูล")
+        return
+
+    st.dataframe(summary_df, use_container_width=True)
+
+    with st.expander("การแสดงผลล่าสุด"):
+        st.dataframe(profiling.recent_renders(), use_container_width=True)
+
+    profiles = profiling.list_profiles()
+    if profiles:
+        selected = st.selectbox(
+            "ไฟล์ cProfile", profiles, format_func=os.path.basename
+        )
+        with open(selected, "rb") as f:
+            st.download_button(
+                "⬇️ ดาวน์โหลดไฟล์ .prof",
+                data=f.read(),
+                file_name=os.path.basename(selected),
+                mime="application/octet-stream",
+            )
@@ -1,6 +1,8 @@
 import streamlit as st
 import model
 import controller
+import importer
+from pages import pager, live
 
 
 def render_book():
@@ -11,7 +13,25 @@ def render_book():
 
     if st.button("เพิ่มหนังสือ"):
         controller.create_book(st.session_state.bt, st.session_state.ba)
+        pager.reset("books")
         st.rerun()
 
-    df = model.get_all_books()
-    st.dataframe(df, use_container_width=True)
+    with st.expander("📥 นำเข้าหนังสือจากไฟล์ (CSV / Excel)"):
+        upload = st.file_uploader("เลือกไฟล์", type=["csv", "xlsx"], key="books_import_file")
+        if upload is not None and st.button("นำเข้า", key="books_import"):
+            result = importer.import_books(upload, upload.name)
+            st.success(f"นำเข้าสำเร็จ {result.inserted} รายการ")
+            if result.rejected:
+                st.warning(f"ข้ามแถวที่ไม่ถูกต้อง {len(result.rejected)} แถว")
+                st.download_button(
+                    "⬇️ รายงานแถวที่นำเข้าไม่สำเร็จ (CSV)",
+                    importer.rejected_to_csv(result.rejected),
+                    "books_import_errors.csv",
+                    "text/csv; charset=utf-8"
+                )
+            pager.reset("books")
+
+    cursor, direction = pager.get_cursor("books")
+    page = live.load("books", ("books",), (cursor, direction), model.get_books_page)
+    st.dataframe(page.df, use_container_width=True)
+    pager.render_pager("books", page)
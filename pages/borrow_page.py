@@ -4,19 +4,11 @@ from datetime import date, timedelta
 
 import model
 import controller
-
-def _contains_ignore_case(series, keyword: str):
-    kw = (keyword or "").strip().lower()
-    if not kw:
-        return series.notna()
-    return series.fillna("").astype(str).str.lower().str.contains(kw)
+from pages import pager, live
 
 def render_borrow():
     st.subheader("🔄 การทำรายการยืม-คืนหนังสือ")
 
-    # สร้าง schema ยืม-คืน หากยังไม่มี
-    model.ensure_borrow_schema()
-
     # ผู้ทำรายการ (admin/staff)
     user = st.session_state.get("user") or {}
     staff_user_id = user.get("id")
@@ -26,8 +18,7 @@ def render_borrow():
     # =========================
     st.markdown("### 1) ทำรายการยืม (ยืมได้มากกว่าหนึ่งเล่มต่อครั้ง)")
 
-    members_df = model.get_active_members()
-    if members_df.empty:
+    if model.search_members("", limit=1).empty:
         st.warning("ไม่พบสมาชิกที่ใช้งานอยู่ กรุณาเพิ่มสมาชิกก่อนทำรายการยืม")
         return
 
@@ -39,9 +30,8 @@ def render_borrow():
         key="borrow_member_kw",
     )
 
-    mdf = members_df.copy()
-    mask_m = _contains_ignore_case(mdf["member_code"], member_kw) | _contains_ignore_case(mdf["name"], member_kw)
-    mdf = mdf[mask_m].copy()
+    # ค้นจากดัชนี full-text (ได้ผลไม่เกิน model.SEARCH_LIMIT รายการ)
+    mdf = model.search_members(member_kw)
 
     if mdf.empty:
         st.info("ไม่พบสมาชิกตามคำค้น กรุณาลองใหม่")
@@ -62,34 +52,26 @@ def render_borrow():
     if "borrow_cart" not in st.session_state:
         st.session_state["borrow_cart"] = []  # เก็บ book_id ที่เลือกแล้ว (list[int])
 
-    books_df = model.get_available_books()
+    book_kw = st.text_input(
+        "ค้นหาหนังสือ",
+        placeholder="พิมพ์รหัสหนังสือ หรือ ชื่อหนังสือ (อย่างน้อย 3 ตัวอักษร) เช่น 6, 16, หรือ python",
+        key="borrow_book_kw",
+    )
 
-    if books_df.empty:
+    # -----------------------------
+    # ✅ ค้นหาแบบ "บางส่วนของรหัส" หรือ "บางส่วนของชื่อ" ผ่านดัชนี full-text
+    # - ตัวเลขสั้น ๆ เช่น '6' หาเล่มรหัส 6 ตรงตัว
+    # - ชื่อต้องพิมพ์อย่างน้อย 3 ตัวอักษร และไม่สนใจตัวพิมพ์เล็ก-ใหญ่
+    # - หากผู้ใช้ไม่พิมพ์อะไร ให้แสดงเล่มล่าสุด
+    # -----------------------------
+    bdf = model.search_books(book_kw, only_available=True)
+
+    if bdf.empty and not (book_kw or "").strip():
         st.info("ขณะนี้ไม่มีหนังสือสถานะ available สำหรับให้ยืม")
     else:
-        book_kw = st.text_input(
-            "ค้นหาหนังสือ",
-            placeholder="พิมพ์รหัสหนังสือ หรือ ชื่อหนังสือ เช่น 6, 16, หรือ โด, python",
-            key="borrow_book_kw",
-        )
-
-        bdf = books_df.copy()
-
-        # -----------------------------
-        # ✅ ค้นหาแบบ "บางส่วนของรหัส" หรือ "บางส่วนของชื่อ"
-        # - id: แปลงเป็น string แล้วค้นแบบ contains (รองรับบางส่วน เช่น '6' เจอ 6,16,60)
-        # - title: ค้นแบบ contains โดยไม่สนใจตัวพิมพ์เล็ก-ใหญ่ (case-insensitive)
-        # - หากผู้ใช้ไม่พิมพ์อะไร ให้แสดงทั้งหมด
-        # -----------------------------
-        kw = (book_kw or "").strip()
-        if kw:
-            mask_id = bdf["id"].astype(str).str.contains(kw, na=False)  # substring ของรหัส
-            mask_title = bdf["title"].astype(str).str.contains(kw, case=False, na=False)  # substring ของชื่อ
-            mask_b = mask_id | mask_title
-            bdf = bdf[mask_b].copy()
-        # else: ไม่ต้องกรอง แสดงทั้งหมด
-
-        if bdf.empty:
+        if bdf.empty and len(book_kw.strip()) < model.SEARCH_MIN_CHARS and not book_kw.strip().isdigit():
+            st.info(f"พิมพ์ชื่อหนังสืออย่างน้อย {model.SEARCH_MIN_CHARS} ตัวอักษร หรือพิมพ์รหัสหนังสือ")
+        elif bdf.empty:
             st.info("ไม่พบหนังสือตามคำค้น กรุณาลองใหม่")
         else:
             book_options = {
@@ -117,8 +99,7 @@ def render_borrow():
     # แสดงตะกร้ายืม
     if st.session_state["borrow_cart"]:
         cart_ids = st.session_state["borrow_cart"]
-        cart_df = books_df[books_df["id"].isin(cart_ids)].copy()
-        cart_df = cart_df.sort_values("id")
+        cart_df = model.get_books_by_ids(cart_ids)
 
         st.markdown("**รายการหนังสือที่เลือก (ตะกร้ายืม)**")
         st.dataframe(cart_df[["id", "title", "author"]], use_container_width=True)
@@ -168,6 +149,29 @@ def render_borrow():
     # =========================
     st.markdown("### 2) ทำรายการคืน (ค้นหาสมาชิก → ดูรายการค้างส่ง → ติ๊กคืนได้หลายเล่ม)")
 
+    # --- 2.0 คืนด่วน: สแกนรหัสหนังสือ ไม่ต้องค้นหาสมาชิก (เช่น หนังสือในกล่องรับคืน) ---
+    st.markdown("**2.0 คืนด่วนด้วยการสแกนรหัสหนังสือ (ไม่ต้องเลือกสมาชิก)**")
+    with st.form("scan_return_form", clear_on_submit=True):
+        scanned_text = st.text_area(
+            "รหัสหนังสือที่สแกน (1 รหัสต่อบรรทัด)",
+            placeholder="สแกนบาร์โค้ดต่อกันได้เลย เช่น\n101\n102\n205",
+            height=150,
+        )
+        scan_submitted = st.form_submit_button("📥 คืนหนังสือทั้งหมดที่สแกน", use_container_width=True)
+
+    if scan_submitted:
+        scanned_ids, invalid = controller.parse_scanned_book_ids(scanned_text)
+        if invalid:
+            st.warning(f"⚠ ข้ามรหัสที่ไม่ใช่ตัวเลข: {invalid}")
+        ok, msgs = controller.return_books_by_scan(scanned_ids, staff_user_id)
+        if not ok:
+            for m in msgs:
+                st.error("⚠ " + m)
+        else:
+            st.success("✅ " + msgs[0])
+            for m in msgs[1:]:
+                st.warning("⚠ " + m)
+
     st.markdown("**2.1 เลือกสมาชิกเพื่อดูรายการค้างส่ง**")
     return_member_kw = st.text_input(
         "ค้นหาสมาชิก (สำหรับคืน)",
@@ -175,9 +179,7 @@ def render_borrow():
         key="return_member_kw",
     )
 
-    rdf = members_df.copy()
-    mask_rm = _contains_ignore_case(rdf["member_code"], return_member_kw) | _contains_ignore_case(rdf["name"], return_member_kw)
-    rdf = rdf[mask_rm].copy()
+    rdf = model.search_members(return_member_kw)
 
     if rdf.empty:
         st.info("ไม่พบสมาชิกตามคำค้น กรุณาลองใหม่")
@@ -235,7 +237,8 @@ def render_borrow():
 
     # ดึงรายการที่ยังไม่คืนทั้งหมด (status = 'borrowed')
     # ฟังก์ชันนี้จะ JOIN ให้เรียบร้อย และมีทั้งชื่อสมาชิก/รหัสสมาชิก/ชื่อหนังสือ/กำหนดส่ง
-    all_active_df = model.get_active_borrow_items()
+    loan_tables = ("borrow_items", "borrow_tx", "members", "books", "users")
+    all_active_df = live.load("active_items", loan_tables, (), model.get_active_borrow_items)
 
     if all_active_df.empty:
         st.info("ไม่พบรายการหนังสือค้างส่งในขณะนี้")
@@ -266,9 +269,13 @@ def render_borrow():
     # =========================
     # ส่วนที่ 4: ประวัติการยืม-คืน
     # =========================
-    st.markdown("### 4) ประวัติการยืม-คืน (ค้นหาได้)")
+    st.markdown("### 4) ประวัติการยืม-คืน (ค้นหาได้ในหน้าที่แสดง)")
 
-    history_df = model.get_borrow_history(limit=200)
+    history_cursor, history_direction = pager.get_cursor("history")
+    history_page = live.load(
+        "history", loan_tables, (history_cursor, history_direction), model.get_borrow_history_page
+    )
+    history_df = history_page.df
 
     if history_df.empty:
         st.info("ยังไม่มีประวัติการยืม-คืน")
@@ -336,3 +343,5 @@ def render_borrow():
             st.info("ไม่พบข้อมูลตามคำค้น")
         else:
             st.dataframe(df, use_container_width=True)
+
+        pager.render_pager("history", history_page)
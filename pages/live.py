@@ -0,0 +1,20 @@
+# pages/live.py
+import streamlit as st
+import model
+
+
+def load(key: str, tables: tuple, args: tuple, loader):
+    """
+    เรียก loader(*args) เฉพาะเมื่อจำเป็น
+    - ครั้งแรกใน session, args เปลี่ยน (เช่น เปลี่ยนหน้า) หรือ
+    - ตารางใน tables ถูกแก้ไข (จากทุกจุดบริการ) ตั้งแต่ครั้งก่อน
+    นอกนั้นคืนผลลัพธ์เดิมที่เก็บไว้ใน session_state
+    """
+    versions = model.table_versions(tables)
+    state = st.session_state.get(f"{key}_live")
+    if state is not None and state[0] == versions and state[1] == args:
+        return state[2]
+
+    value = loader(*args)
+    st.session_state[f"{key}_live"] = (versions, args, value)
+    return value
@@ -1,6 +1,8 @@
 import streamlit as st
 import model
 import controller
+import importer
+from pages import pager
 
 
 def render_member():
@@ -16,7 +18,25 @@ def render_member():
             st.session_state.me,
             st.session_state.mp
         )
+        pager.reset("members")
         st.rerun()
 
-    df = model.get_all_members()
-    st.dataframe(df, use_container_width=True)
+    with st.expander("📥 นำเข้าสมาชิกจากไฟล์ (CSV / Excel)"):
+        upload = st.file_uploader("เลือกไฟล์", type=["csv", "xlsx"], key="members_import_file")
+        if upload is not None and st.button("นำเข้า", key="members_import"):
+            result = importer.import_members(upload, upload.name)
+            st.success(f"นำเข้าสำเร็จ {result.inserted} รายการ")
+            if result.rejected:
+                st.warning(f"ข้ามแถวที่ไม่ถูกต้อง {len(result.rejected)} แถว")
+                st.download_button(
+                    "⬇️ รายงานแถวที่นำเข้าไม่สำเร็จ (CSV)",
+                    importer.rejected_to_csv(result.rejected),
+                    "members_import_errors.csv",
+                    "text/csv; charset=utf-8"
+                )
+            pager.reset("members")
+
+    cursor, direction = pager.get_cursor("members")
+    page = model.get_members_page(cursor, direction)
+    st.dataframe(page.df, use_container_width=True)
+    pager.render_pager("members", page)
@@ -0,0 +1,31 @@
+# pages/pager.py
+import streamlit as st
+
+
+def get_cursor(key: str) -> tuple:
+    """(cursor, direction) ของตารางที่แบ่งหน้า — ค่าเริ่มต้นคือหน้าแรก"""
+    return st.session_state.get(f"{key}_cursor", (None, "next"))
+
+
+def reset(key: str):
+    st.session_state[f"{key}_cursor"] = (None, "next")
+
+
+def render_pager(key: str, page):
+    """ปุ่มเลื่อนหน้า สำหรับผลลัพธ์ model.Page"""
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        if st.button("⏮ หน้าแรก", key=f"{key}_first", disabled=page.prev_cursor is None, use_container_width=True):
+            reset(key)
+            st.rerun()
+
+    with col2:
+        if st.button("◀ ก่อนหน้า", key=f"{key}_prev", disabled=page.prev_cursor is None, use_container_width=True):
+            st.session_state[f"{key}_cursor"] = (page.prev_cursor, "prev")
+            st.rerun()
+
+    with col3:
+        if st.button("ถัดไป ▶", key=f"{key}_next", disabled=page.next_cursor is None, use_container_width=True):
+            st.session_state[f"{key}_cursor"] = (page.next_cursor, "next")
+            st.rerun()
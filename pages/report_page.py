@@ -1,16 +1,13 @@
 import streamlit as st
 import model
+import exports
+import jobs
 from datetime import date
-import io
-import pandas as pd
+from pages import pager
 import plotly.express as px
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
+
+# จำนวนแถวตัวอย่างของรายงานที่แสดงบนหน้าจอ (รายงานเต็มให้ดาวน์โหลดเป็นไฟล์)
+REPORT_PREVIEW_ROWS = 500
 
 def render_report():
     st.subheader("📊 รายงานสรุประบบยืม-คืนหนังสือ")
@@ -76,10 +73,48 @@ def render_report():
         )
         st.dataframe(monthly_df, use_container_width=True)
 
+    st.divider()
+
     # ==================================================
-    # 3) รายการผู้ยืม–คืนทั้งหมด
+    # 3) รายการเกินกำหนดส่ง
     # ==================================================
-    st.markdown("### 3) รายการผู้ยืม–คืนทั้งหมด")
+    st.markdown("### 3) รายการเกินกำหนดส่ง")
+
+    overdue_as_of = st.date_input("ณ วันที่", value=date.today(), key="overdue_as_of")
+    if st.session_state.get("overdue_as_of_prev") != overdue_as_of:
+        # เปลี่ยนวันที่แล้วเริ่มที่หน้าแรกใหม่
+        st.session_state["overdue_as_of_prev"] = overdue_as_of
+        pager.reset("overdue")
+
+    # จำนวนต่อสมาชิกอ่านจากตารางที่นับไว้แล้ว ไม่ต้องนับจากรายการยืมทั้งหมด
+    member_overdue_df = model.get_member_overdue_counts(overdue_as_of)
+
+    col1, col2 = st.columns(2)
+    col1.metric("รายการเกินกำหนด", f"{int(member_overdue_df['จำนวนเกินกำหนด'].sum()):,}")
+    col2.metric("สมาชิกที่มีรายการเกินกำหนด", f"{len(member_overdue_df):,}")
+
+    if member_overdue_df.empty:
+        st.success("ไม่มีรายการเกินกำหนดส่ง")
+    else:
+        st.markdown("**สมาชิกที่มีรายการเกินกำหนดมากที่สุด**")
+        st.dataframe(
+            member_overdue_df.drop(columns=["member_id"]).head(20),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        st.markdown("**รายการเกินกำหนด (เรียงจากเกินกำหนดนานที่สุด)**")
+        overdue_cursor, overdue_direction = pager.get_cursor("overdue")
+        overdue_page = model.get_overdue_items(overdue_as_of, overdue_cursor, overdue_direction)
+        st.dataframe(overdue_page.df, use_container_width=True, hide_index=True)
+        pager.render_pager("overdue", overdue_page)
+
+    st.divider()
+
+    # ==================================================
+    # 4) รายการผู้ยืม–คืนทั้งหมด
+    # ==================================================
+    st.markdown("### 4) รายการผู้ยืม–คืนทั้งหมด")
 
     col1, col2, col3 = st.columns(3)
 
@@ -116,90 +151,97 @@ def render_report():
 
     selected_status = status_map[status_label]
 
-    report_df = model.get_borrow_report(
+    # แสดงเฉพาะแถวแรก ๆ ช่วงวันที่ยาวหลายปีจึงไม่ต้องโหลดรายงานทั้งหมดเข้าหน่วยความจำ
+    report_total = model.count_borrow_report(
         report_start.isoformat(),
         report_end.isoformat(),
         selected_status
     )
 
-    if report_df.empty:
+    if report_total == 0:
         st.info("ไม่พบข้อมูลตามเงื่อนไขที่เลือก")
         return
 
+    report_df = model.get_borrow_report(
+        report_start.isoformat(),
+        report_end.isoformat(),
+        selected_status,
+        limit=REPORT_PREVIEW_ROWS
+    )
+
     st.dataframe(report_df, use_container_width=True)
+    if report_total > len(report_df):
+        st.caption(f"แสดง {len(report_df):,} รายการล่าสุด จากทั้งหมด {report_total:,} รายการ — ดาวน์โหลดไฟล์ด้านล่างเพื่อดูทั้งหมด")
 
     # ==================================================
-    # 4) ส่งออกรายงาน
+    # 5) ส่งออกรายงาน
     # ==================================================
-    st.markdown("### 4) ส่งออกรายงาน")
-
-    # ---------- CSV ----------
-    csv_data = report_df.to_csv(index=False, encoding="utf-8-sig")
-
-    st.download_button(
-        "⬇️ CSV",
-        csv_data,
-        "borrow_report.csv",
-        "text/csv; charset=utf-8"
-    )
-
-    # ---------- Excel ----------
-    excel_buffer = io.BytesIO()
-    with pd.ExcelWriter(excel_buffer) as writer:
-        report_df.to_excel(
-            writer,
-            index=False,
-            sheet_name="BorrowReport"
-        )
-
-    st.download_button(
-        label="⬇️ ดาวน์โหลดรายงานผู้ยืม–คืน (Excel)",
-        data=excel_buffer.getvalue(),
-        file_name="borrow_return_report.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
-
-    # ---------- PDF (แนวคิด) ----------
-    st.info("📄 PDF: สามารถเพิ่มด้วย reportlab หรือ weasyprint ในขั้นถัดไป")
-    
-
-    # ลงทะเบียนฟอนต์ไทย
-    pdfmetrics.registerFont(
-        TTFont("THSarabun", "fonts/THSarabunNew.ttf")
-    )
-
-    pdf_buffer = io.BytesIO()
-
-    doc = SimpleDocTemplate(
-        pdf_buffer,
-        pagesize=A4,
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=30,
-        bottomMargin=30
-    )
+    st.markdown("### 5) ส่งออกรายงาน")
+
+    # สร้างไฟล์เฉพาะรูปแบบที่ผู้ใช้กดขอ (ไม่สร้างทั้ง 3 แบบทุกครั้งที่หน้า rerun)
+    # ทุกรูปแบบส่งเป็นงานเบื้องหลัง (jobs.py) ที่เขียนไฟล์ลงดิสก์ทีละ chunk
+    # หน้าจอไม่ค้างระหว่างสร้างไฟล์ขนาดใหญ่ และ server ไม่ต้องถือทั้งไฟล์ไว้ในหน่วยความจำ
+    params = (report_start.isoformat(), report_end.isoformat(), selected_status)
+    data_version = jobs.report_data_version()
+    report_jobs = st.session_state.setdefault("report_jobs", {})
+    user = st.session_state.get("user") or {}
+
+    labels = {
+        "csv": "CSV",
+        "xlsx": "Excel",
+        "pdf": "PDF",
+    }
 
-    styles = getSampleStyleSheet()
-    styles["Normal"].fontName = "THSarabun"
-    styles["Normal"].fontSize = 12
-
-    # แปลง DataFrame → table data
-    table_data = [report_df.columns.tolist()] + report_df.values.tolist()
-
-    table = Table(table_data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ("FONT", (0, 0), (-1, -1), "THSarabun"),
-        ("FONTSIZE", (0, 0), (-1, -1), 12),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightblue),
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
-        ("ALIGN", (0, 0), (-1, -1), "CENTER"),
-    ]))
-
-    doc.build([table])
-
-    st.download_button(
-        "⬇️ ดาวน์โหลดรายงานผู้ยืม–คืน (PDF)",
-        data=pdf_buffer.getvalue(),
-        file_name="borrow_return_report.pdf",
-        mime="application/pdf"
-    )
+    cols = st.columns(len(labels))
+    for col, (fmt, label) in zip(cols, labels.items()):
+        with col:
+            file_name, mime = exports.FORMATS[fmt]
+
+            job_id = report_jobs.get((fmt, params))
+            job = jobs.get_job(job_id) if job_id else None
+
+            # ข้อมูลเปลี่ยนหลังสั่งงาน (มีการยืม/คืนใหม่)
+            # - ไฟล์ที่สร้างเสร็จแล้วล้าสมัย ให้สร้างใหม่
+            # - งานที่ยังรอ/กำลังทำอยู่ แสดงความคืบหน้าต่อ (งานยังนับในโควตาของผู้ใช้ จึงไม่ทิ้งไปเฉย ๆ)
+            data_changed = job is not None and job["data_version"] != data_version
+            if data_changed and job["state"] == "done":
+                report_jobs.pop((fmt, params), None)
+                st.caption(f"ข้อมูลมีการเปลี่ยนแปลงหลังสร้างไฟล์ {label} กรุณาสร้างใหม่")
+                job = None
+
+            if job is None or job["state"] == "failed":
+                if job is not None:
+                    st.error(f"สร้างไฟล์ {label} ไม่สำเร็จ: {job['error']}")
+                if st.button(f"📄 เตรียมไฟล์ {label}", key=f"prepare_{fmt}", use_container_width=True):
+                    try:
+                        report_jobs[(fmt, params)] = jobs.submit_export(fmt, *params, user_id=user.get("id"))
+                    except jobs.JobLimitError as e:
+                        st.warning(str(e))
+                    else:
+                        st.rerun()
+                continue
+
+            if job["state"] != "done":
+                st.progress(job["progress"] or 0.0, text=f"กำลังสร้างไฟล์ {label}...")
+                if data_changed:
+                    st.caption("ข้อมูลมีการเปลี่ยนแปลงหลังเริ่มสร้างไฟล์นี้")
+                if st.button("🔄 ตรวจสอบสถานะ", key=f"refresh_{fmt}", use_container_width=True):
+                    st.rerun()
+                continue
+
+            job_file = jobs.open_job_file(job_id)
+            if job_file is None:
+                # ไฟล์ถูกลบไปแล้ว (เก่าเกินกำหนด) ให้ขอใหม่
+                report_jobs.pop((fmt, params), None)
+                st.rerun()
+
+            # ส่งไฟล์ที่เปิดไว้ให้ download_button อ่านเอง (ไม่อ่านเป็น bytes ก่อน)
+            with job_file:
+                st.download_button(
+                    f"⬇️ ดาวน์โหลดรายงานผู้ยืม–คืน ({label})",
+                    data=job_file,
+                    file_name=file_name,
+                    mime=mime,
+                    key=f"download_{fmt}",
+                    use_container_width=True
+                )
@@ -0,0 +1,162 @@
+import cProfile
+import os
+import re
+import threading
+import time
+import tracemalloc
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+import model
+
+# ============================================================
+# Page render profiling
+# ============================================================
+# app.py ครอบการเรียก render_* ของแต่ละหน้าด้วย profile_render()
+# เก็บเวลา, จำนวนคำสั่ง SQL, จำนวนแถวที่อ่าน และหน่วยความจำสูงสุด ต่อการแสดงผล 1 ครั้ง
+# ไว้ใน buffer ล่าสุด RENDER_BUFFER_SIZE ครั้ง ให้ admin ดูได้ในหน้า จัดการผู้ใช้
+# - จำนวนคำสั่ง/แถว นับจาก model.sql_scope() (ต้องเปิด SQL_STATS_ENABLED)
+# - หน่วยความจำใช้ tracemalloc ซึ่งทำให้ช้าลงมาก จึงเปิดเมื่อต้องการเท่านั้น
+#   และเป็นค่ารวมทั้ง process (ถ้ามีหลาย session แสดงผลพร้อมกัน ค่าจะรวมกัน)
+# - cProfile (เปิดเมื่อต้องการ) บันทึกไฟล์ .prof ต่อการแสดงผล 1 ครั้งใน PROFILE_DIR
+RENDER_BUFFER_SIZE = 500
+PROFILE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")
+PROFILE_MAX_FILES = 50
+
+TRACE_MEMORY = os.environ.get("LIBRARY_PROFILE_MEMORY", "0") == "1"
+CPROFILE_ENABLED = os.environ.get("LIBRARY_CPROFILE", "0") == "1"
+
+RenderStat = namedtuple(
+    "RenderStat",
+    ["time", "page", "user", "wall_ms", "db_calls", "rows", "peak_kb", "profile_path"],
+)
+
+_renders = deque(maxlen=RENDER_BUFFER_SIZE)
+_memory_lock = threading.Lock()
+_memory_users = 0
+
+
+def configure(trace_memory: bool = None, cprofile: bool = None):
+    """เปิด/ปิดการวัดหน่วยความจำ และการบันทึก cProfile ขณะทำงาน"""
+    global TRACE_MEMORY, CPROFILE_ENABLED
+    if trace_memory is not None:
+        TRACE_MEMORY = bool(trace_memory)
+    if cprofile is not None:
+        CPROFILE_ENABLED = bool(cprofile)
+
+
+def _start_memory():
+    global _memory_users
+    with _memory_lock:
+        if _memory_users == 0:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+        _memory_users += 1
+        return tracemalloc.get_traced_memory()[0]
+
+
+def _stop_memory(baseline: int) -> float:
+    global _memory_users
+    with _memory_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        _memory_users -= 1
+        if _memory_users == 0 and not TRACE_MEMORY:
+            tracemalloc.stop()
+    return round(max(peak - baseline, 0) / 1024, 1)
+
+
+def _profile_path(page: str) -> str:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    safe = re.sub(r"[^A-Za-z0-9_-]", "_", page)
+    return os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe}-{threading.get_ident()}.prof")
+
+
+def _prune_profiles():
+    files = sorted(list_profiles(), key=os.path.getmtime)
+    for path in files[:-PROFILE_MAX_FILES]:
+        os.remove(path)
+
+
+@contextmanager
+def profile_render(page: str, user: str = None):
+    """วัดการแสดงผลหน้า page 1 ครั้ง (รวมกรณีหน้าเรียก st.rerun()/st.stop())"""
+    trace_memory = TRACE_MEMORY
+    baseline = _start_memory() if trace_memory else 0
+
+    profiler = None
+    if CPROFILE_ENABLED:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # มี profiler ตัวอื่นทำงานอยู่ (เช่น อีก session หนึ่ง) ข้ามครั้งนี้
+            profiler = None
+
+    started = time.perf_counter()
+    try:
+        with model.sql_scope() as records:
+            yield
+    finally:
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        path = None
+        if profiler is not None:
+            profiler.disable()
+            path = _profile_path(page)
+            profiler.dump_stats(path)
+            _prune_profiles()
+
+        peak_kb = _stop_memory(baseline) if trace_memory else None
+
+        _renders.append(RenderStat(
+            time.strftime("%Y-%m-%d %H:%M:%S"),
+            page,
+            user,
+            round(wall_ms, 3),
+            len(records),
+            sum(r.rows for r in records),
+            peak_kb,
+            path,
+        ))
+
+
+def recent_renders(limit: int = 100) -> pd.DataFrame:
+    """การแสดงผลล่าสุดก่อน"""
+    rows = list(_renders)[-limit:][::-1]
+    return pd.DataFrame(rows, columns=RenderStat._fields)
+
+
+def render_summary() -> pd.DataFrame:
+    """สรุปต่อหน้า: จำนวนครั้ง, เวลา p50/p95/max, คำสั่ง SQL และแถวเฉลี่ย, หน่วยความจำสูงสุด"""
+    columns = ["page", "renders", "p50_ms", "p95_ms", "max_ms", "avg_db_calls", "avg_rows", "max_peak_kb"]
+    df = pd.DataFrame(list(_renders), columns=RenderStat._fields)
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    grouped = df.groupby("page")
+    summary = pd.DataFrame({
+        "renders": grouped.size(),
+        "p50_ms": grouped["wall_ms"].quantile(0.50),
+        "p95_ms": grouped["wall_ms"].quantile(0.95),
+        "max_ms": grouped["wall_ms"].max(),
+        "avg_db_calls": grouped["db_calls"].mean(),
+        "avg_rows": grouped["rows"].mean(),
+        "max_peak_kb": grouped["peak_kb"].max(),
+    }).reset_index()
+    return summary.sort_values("p95_ms", ascending=False).round(1)[columns].reset_index(drop=True)
+
+
+def list_profiles() -> list:
+    """ไฟล์ .prof ที่บันทึกไว้ ใหม่สุดก่อน"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    files = [os.path.join(PROFILE_DIR, f) for f in os.listdir(PROFILE_DIR) if f.endswith(".prof")]
+    return sorted(files, key=os.path.getmtime, reverse=True)
+
+
+def reset():
+    _renders.clear()
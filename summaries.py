@@ -0,0 +1,33 @@
+# summaries.py — ตรวจสอบ / คำนวณตารางสรุป (book_status_counts, borrow_*_counts) ใหม่
+#   python summaries.py            ตรวจสอบว่าตรงกับข้อมูลจริงหรือไม่
+#   python summaries.py --rebuild  คำนวณใหม่ทั้งหมด
+import argparse
+import sys
+
+import model
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ตรวจสอบ/คำนวณตารางสรุปใหม่")
+    parser.add_argument("--db", default=model.DB_PATH, help="ไฟล์ฐานข้อมูล")
+    parser.add_argument("--rebuild", action="store_true", help="คำนวณตารางสรุปใหม่ทั้งหมด")
+    args = parser.parse_args()
+
+    model.DB_PATH = args.db
+
+    if args.rebuild:
+        model.rebuild_summary_tables()
+        print("คำนวณตารางสรุปใหม่เรียบร้อย")
+
+    mismatches = model.verify_summary_tables()
+    if not mismatches:
+        print("ตารางสรุปถูกต้อง")
+        return 0
+
+    for table, count in mismatches.items():
+        print(f"{table}: ไม่ตรง {count} แถว (รัน --rebuild เพื่อแก้ไข)")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
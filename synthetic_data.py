@@ -0,0 +1,274 @@
+# synthetic_data.py — สร้างฐานข้อมูลจำลองสำหรับวัดประสิทธิภาพ (benchmark.py)
+#   python synthetic_data.py --scale 100k --db bench_data/bench_100k.db
+# ใช้ seed คงที่ ข้อมูลที่ได้จึงเหมือนเดิมทุกครั้งที่สร้างด้วย scale/seed/as-of เดียวกัน
+import argparse
+import os
+import random
+import sqlite3
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import migrations
+import model
+
+# ชื่อ scale → จำนวนรายการยืม (borrow_items)
+SCALES = {
+    "10k": 10_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+DEFAULT_SEED = 42
+DEFAULT_AS_OF = "2026-01-01"
+HISTORY_DAYS = 3 * 365          # ช่วงเวลาของประวัติการยืม
+OPEN_WINDOW_DAYS = 60           # รายการที่ยืมภายในช่วงนี้ (นับจาก as-of) อาจยังไม่คืน
+OPEN_PROBABILITY = 0.4
+STAFF_PASSWORD = "bench1234"    # รหัสผ่านของผู้ใช้ staff/admin ที่สร้างขึ้น
+INSERT_BATCH = 10_000
+
+Sizes = namedtuple("Sizes", ["books", "members", "users", "loans", "legacy_borrows"])
+
+TITLE_WORDS_TH = [
+    "ความลับ", "ของ", "ทะเล", "ดวงดาว", "แผ่นดิน", "เมือง", "หัวใจ", "สายลม", "ภูเขา", "ป่า",
+    "ประวัติศาสตร์", "ไทย", "การเขียนโปรแกรม", "คณิตศาสตร์", "ฟิสิกส์", "เบื้องต้น", "ฉบับสมบูรณ์",
+    "นิทาน", "ตำนาน", "บันทึก", "การเดินทาง", "แห่ง", "รัก", "ฤดูฝน", "อาหาร", "ชีวิต", "เศรษฐศาสตร์",
+]
+TITLE_WORDS_EN = [
+    "The", "Secret", "of", "Sea", "Stars", "City", "Heart", "Wind", "Mountain", "Forest",
+    "History", "Introduction", "to", "Programming", "Mathematics", "Physics", "Complete", "Guide",
+    "Tales", "Legend", "Journey", "Love", "Rain", "Food", "Life", "Economics", "Data", "Python",
+]
+FIRST_NAMES_TH = ["สมชาย", "สมหญิง", "วิชัย", "มาลี", "ประเสริฐ", "สุดา", "อนันต์", "กมล", "ณัฐ", "ปิยะ", "ธนา", "อร"]
+LAST_NAMES_TH = ["ใจดี", "รักเรียน", "สุขสม", "ทองคำ", "ศรีสุข", "บุญมา", "แสงทอง", "วงศ์ใหญ่", "มั่นคง", "พรหมมา"]
+FIRST_NAMES_EN = ["John", "Mary", "David", "Sarah", "Michael", "Emma", "James", "Linda", "Tom", "Anna"]
+LAST_NAMES_EN = ["Smith", "Brown", "Taylor", "Wilson", "Clark", "Lee", "Walker", "Hall", "Young", "King"]
+
+
+def parse_scale(scale) -> int:
+    """'10k' / '100k' / '1m' หรือจำนวนเต็ม → จำนวนรายการยืม"""
+    key = str(scale).strip().lower()
+    if key in SCALES:
+        return SCALES[key]
+    return int(key.replace("_", ""))
+
+
+def sizes_for(loans: int) -> Sizes:
+    """ขนาดของแต่ละตารางตามจำนวนรายการยืม"""
+    return Sizes(
+        books=max(1_000, loans // 10),
+        members=max(500, loans // 20),
+        users=10,
+        loans=loans,
+        legacy_borrows=loans // 10,
+    )
+
+
+def _title(rng: random.Random) -> str:
+    words = TITLE_WORDS_TH if rng.random() < 0.6 else TITLE_WORDS_EN
+    sep = "" if words is TITLE_WORDS_TH else " "
+    return sep.join(rng.choice(words) for _ in range(rng.randint(2, 5)))
+
+
+def _person(rng: random.Random) -> str:
+    if rng.random() < 0.7:
+        return f"{rng.choice(FIRST_NAMES_TH)} {rng.choice(LAST_NAMES_TH)}"
+    return f"{rng.choice(FIRST_NAMES_EN)} {rng.choice(LAST_NAMES_EN)}"
+
+
+def _batches(rows, size: int = INSERT_BATCH):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(conn, sql: str, rows):
+    for batch in _batches(rows):
+        conn.executemany(sql, batch)
+
+
+def generate(db_path: str, loans: int, seed: int = DEFAULT_SEED, as_of: str = DEFAULT_AS_OF,
+             overwrite: bool = False) -> dict:
+    """
+    สร้างฐานข้อมูลจำลองที่ db_path (schema จาก migrations)
+    คืนค่า dict จำนวนแถวของแต่ละตาราง
+    - หนังสือที่ยังไม่คืนมีสถานะ borrowed และไม่มีเล่มใดถูกยืมซ้อนกัน
+    - ตารางสรุปและ FTS ถูกอัปเดตโดย trigger ระหว่าง insert
+    """
+    if os.path.exists(db_path):
+        if not overwrite:
+            raise FileExistsError(db_path)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+
+    rng = random.Random(seed)
+    sizes = sizes_for(loans)
+    as_of_dt = datetime.fromisoformat(as_of)
+    history_start = as_of_dt - timedelta(days=HISTORY_DAYS)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        migrations.migrate(conn)
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("BEGIN")
+
+        # ---------- users ----------
+        password_hash = migrations._hash_password(STAFF_PASSWORD)
+        conn.execute("DELETE FROM users")
+        _insert(conn, """
+            INSERT INTO users (id, username, password_hash, role, is_active) VALUES (?, ?, ?, ?, 1)
+        """, [
+            (i, "admin" if i == 1 else f"staff{i:02d}", password_hash, "admin" if i == 1 else "staff")
+            for i in range(1, sizes.users + 1)
+        ])
+
+        # ---------- books ----------
+        # สถานะเริ่มต้น available ทั้งหมด แล้วปรับเล่มที่ยังไม่คืนภายหลัง
+        _insert(conn, "INSERT INTO books (id, title, author, status) VALUES (?, ?, ?, 'available')", (
+            (i, _title(rng), _person(rng)) for i in range(1, sizes.books + 1)
+        ))
+
+        # ---------- members ----------
+        _insert(conn, """
+            INSERT INTO members (id, member_code, name, gender, email, phone, is_active, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            (
+                i,
+                model.member_code_for(i),
+                _person(rng),
+                rng.choice(["ชาย", "หญิง", None]),
+                f"member{i}@example.com",
+                f"08{rng.randint(0, 99_999_999):08d}",
+                0 if rng.random() < 0.05 else 1,
+                (history_start + timedelta(days=rng.randint(0, HISTORY_DAYS))).strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            for i in range(1, sizes.members + 1)
+        ))
+
+        # ---------- borrow_tx / borrow_items ----------
+        # เฉลี่ย ~2 เล่มต่อการยืม เรียงตามเวลาเพื่อให้ id สอดคล้องกับวันที่
+        tx_rows = []
+        item_rows = []
+        borrowed_books = set()
+        item_id = 0
+        tx_id = 0
+        while item_id < loans:
+            tx_id += 1
+            offset = rng.random() * HISTORY_DAYS
+            tx_rows.append([tx_id, offset])
+            for _ in range(min(rng.choice((1, 1, 2, 2, 3, 4)), loans - item_id)):
+                item_id += 1
+                item_rows.append([item_id, tx_id])
+
+        tx_rows.sort(key=lambda r: r[1])
+        tx_dates = {}
+        for new_id, row in enumerate(tx_rows, start=1):
+            tx_dates[row[0]] = (new_id, history_start + timedelta(days=row[1]))
+
+        tx_open = {}
+        items = []
+        item_rows.sort(key=lambda r: tx_dates[r[1]][0])
+        for item_id, (_, old_tx) in enumerate(item_rows, start=1):
+            tx_id, borrowed_at = tx_dates[old_tx]
+            due = (borrowed_at + timedelta(days=rng.choice((7, 14)))).date()
+            is_open = (
+                (as_of_dt - borrowed_at).days < OPEN_WINDOW_DAYS
+                and rng.random() < OPEN_PROBABILITY
+            )
+            book_id = rng.randint(1, sizes.books)
+            if is_open:
+                # หนังสือที่ยังไม่คืนต้องไม่ซ้ำกัน
+                for _ in range(10):
+                    if book_id not in borrowed_books:
+                        break
+                    book_id = rng.randint(1, sizes.books)
+                else:
+                    is_open = False
+            if is_open:
+                borrowed_books.add(book_id)
+                tx_open[tx_id] = True
+                items.append((item_id, tx_id, book_id, due.isoformat(), None, "borrowed", None))
+            else:
+                returned_at = min(borrowed_at + timedelta(days=rng.randint(1, 20)), as_of_dt)
+                items.append((
+                    item_id, tx_id, book_id, due.isoformat(),
+                    returned_at.strftime("%Y-%m-%d %H:%M:%S"), "returned", rng.randint(1, sizes.users),
+                ))
+
+        tx_by_id = dict(tx_dates.values())
+        _insert(conn, """
+            INSERT INTO borrow_tx (id, member_id, staff_user_id, borrow_date, default_due_date, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            (
+                tx_id,
+                rng.randint(1, sizes.members),
+                rng.randint(1, sizes.users),
+                borrowed_at.strftime("%Y-%m-%d %H:%M:%S"),
+                (borrowed_at + timedelta(days=7)).date().isoformat(),
+                "open" if tx_open.get(tx_id) else "closed",
+            )
+            for tx_id, borrowed_at in sorted(tx_by_id.items())
+        ))
+        _insert(conn, """
+            INSERT INTO borrow_items (id, tx_id, book_id, due_date, return_date, status, return_staff_user_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, items)
+
+        _insert(conn, "UPDATE books SET status='borrowed' WHERE id=?", ((b,) for b in sorted(borrowed_books)))
+
+        # ---------- legacy borrows (ข้อมูลเก่าก่อนมี borrow_tx) ----------
+        legacy_start = history_start - timedelta(days=365)
+        legacy = []
+        for i in range(1, sizes.legacy_borrows + 1):
+            borrowed_at = legacy_start + timedelta(days=rng.random() * 365)
+            returned_at = borrowed_at + timedelta(days=rng.randint(1, 20))
+            legacy.append((
+                i, rng.randint(1, sizes.books), rng.randint(1, sizes.members),
+                borrowed_at.strftime("%Y-%m-%d %H:%M:%S"),
+                (borrowed_at + timedelta(days=7)).date().isoformat(),
+                returned_at.strftime("%Y-%m-%d %H:%M:%S"),
+            ))
+        _insert(conn, """
+            INSERT INTO borrows (id, book_id, member_id, borrow_date, due_date, return_date, status, returned)
+            VALUES (?, ?, ?, ?, ?, ?, 'returned', 1)
+        """, legacy)
+
+        conn.execute("COMMIT")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+        tables = ("books", "members", "users", "borrow_tx", "borrow_items", "borrows")
+        return {t: conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in tables}
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="สร้างฐานข้อมูลจำลองสำหรับวัดประสิทธิภาพ")
+    parser.add_argument("--scale", default="10k", help="จำนวนรายการยืม: 10k / 100k / 1m หรือตัวเลข")
+    parser.add_argument("--db", help="ไฟล์ฐานข้อมูลที่จะสร้าง (ค่าเริ่มต้น bench_data/bench_<scale>.db)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--as-of", default=DEFAULT_AS_OF, help="วันที่อ้างอิง (วันสุดท้ายของประวัติ)")
+    parser.add_argument("--overwrite", action="store_true", help="เขียนทับไฟล์เดิม")
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join("bench_data", f"bench_{args.scale.lower()}.db")
+    counts = generate(db_path, parse_scale(args.scale), args.seed, args.as_of, args.overwrite)
+    for table, count in counts.items():
+        print(f"{table}: {count:,}")
+    print(f"สร้าง {db_path} เรียบร้อย")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
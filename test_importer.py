@@ -0,0 +1,87 @@
+# test_importer.py — ตรวจการนำเข้าหนังสือ/สมาชิก และรายงานแถวที่นำเข้าไม่สำเร็จ
+#   python -m unittest test_importer
+import sqlite3
+import unittest
+
+import importer
+import model
+from test_model import ModelTestCase
+
+
+def _csv(*lines: str) -> bytes:
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class ImportBooksTest(ModelTestCase):
+
+    def test_rows_without_title_are_rejected(self):
+        data = _csv("ชื่อหนังสือ,ผู้แต่ง", "เล่มใหม่,ก", ",ข", "เล่มที่สอง,")
+
+        result = importer.import_books(data, "books.csv", chunk_size=2)
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual([(r.row_no, r.error) for r in result.rejected], [(3, "ไม่มีชื่อหนังสือ")])
+        self.assertEqual(self.query("SELECT COUNT(*) FROM books"), [(self.BOOKS + 2,)])
+
+
+class ImportMembersTest(ModelTestCase):
+
+    def import_members(self, *lines: str, chunk_size: int = 10):
+        return importer.import_members(_csv("name,email", *lines), "members.csv", chunk_size=chunk_size)
+
+    def test_invalid_and_duplicate_emails(self):
+        result = self.import_members(
+            "ก,new@example.com",
+            "ข,not-an-email",
+            "ค,NEW@example.com",        # ซ้ำในไฟล์ (ไม่สนตัวพิมพ์)
+            "ง,Member1@Example.com",    # ซ้ำกับในระบบ (ไม่สนตัวพิมพ์)
+            ",x@example.com",
+        )
+
+        self.assertEqual(result.inserted, 1)
+        self.assertEqual(
+            sorted((r.row_no, r.error) for r in result.rejected),
+            [
+                (3, "รูปแบบอีเมลไม่ถูกต้อง"),
+                (4, "อีเมลซ้ำในไฟล์"),
+                (5, "อีเมลนี้มีในระบบแล้ว"),
+                (6, "ไม่มีชื่อสมาชิก"),
+            ]
+        )
+
+    def test_skips_member_codes_used_by_legacy_rows(self):
+        next_id = self.MEMBERS + 1
+        model.execute_write(lambda conn: conn.execute(
+            "INSERT INTO members (id, member_code, name) VALUES (?, ?, 'เดิม')",
+            (next_id + 5, model.member_code_for(next_id))
+        ))
+
+        result = self.import_members("ก,", "ข,")
+
+        self.assertEqual((result.inserted, result.rejected), (2, []))
+        codes = [r[0] for r in self.query("SELECT member_code FROM members WHERE name IN ('ก', 'ข') ORDER BY id")]
+        self.assertNotIn(model.member_code_for(next_id), codes)
+
+    def test_database_error_rejects_only_failing_rows(self):
+        # ข้อจำกัดที่ตรวจก่อนบันทึกไม่ได้ — ทั้ง chunk ถูก rollback แล้วบันทึกใหม่ทีละแถว
+        with sqlite3.connect(model.DB_PATH) as conn:
+            conn.execute("""
+                CREATE TRIGGER reject_member BEFORE INSERT ON members WHEN new.name = 'ห้าม'
+                BEGIN SELECT RAISE(ABORT, 'ห้ามนำเข้า'); END
+            """)
+
+        result = self.import_members("ก,", "ห้าม,", "ข,", chunk_size=3)
+
+        self.assertEqual(result.inserted, 2)
+        self.assertEqual([r.row_no for r in result.rejected], [3])
+        self.assertIn("ห้ามนำเข้า", result.rejected[0].error)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM members WHERE name IN ('ก', 'ข')"), [(2,)])
+
+    def test_rejected_report(self):
+        result = self.import_members("ข,not-an-email")
+        report = importer.rejected_to_csv(result.rejected).decode("utf-8-sig")
+        self.assertIn("รูปแบบอีเมลไม่ถูกต้อง", report)
+
+
+if __name__ == "__main__":
+    unittest.main()
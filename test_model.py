@@ -0,0 +1,352 @@
+# test_model.py — ตรวจพฤติกรรมของงานยืม-คืน cache และตารางสรุปใน model
+#   python -m unittest test_model
+# แต่ละ test ใช้ฐานข้อมูลชั่วคราวที่สร้างด้วย migration ใหม่ทุกครั้ง
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import model
+
+STAFF_ID = 1    # admin ที่ migration สร้างให้
+
+
+class ModelTestCase(unittest.TestCase):
+    """ฐานข้อมูลชั่วคราวที่มีหนังสือ BOOKS เล่ม และสมาชิก MEMBERS คน"""
+
+    BOOKS = 6
+    MEMBERS = 2
+
+    def setUp(self):
+        self._old_db_path = model.DB_PATH
+        self._tmpdir = tempfile.mkdtemp()
+        model.DB_PATH = os.path.join(self._tmpdir, "model.db")
+        model.query_cache.clear()
+        model.init_db()
+
+        for i in range(1, self.BOOKS + 1):
+            model.insert_book(f"หนังสือ {i}", "ผู้แต่ง")
+        for i in range(1, self.MEMBERS + 1):
+            model.insert_member(f"สมาชิก {i}", f"member{i}@example.com", "")
+
+        self.today = date.today()
+
+    def tearDown(self):
+        model.close_pools()
+        model.DB_PATH = self._old_db_path
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    # ---------- helpers ----------
+    def due(self, days: int) -> str:
+        """กำหนดส่ง days วันนับจากวันนี้ (ติดลบ = ผ่านมาแล้ว)"""
+        return (self.today + timedelta(days=days)).isoformat()
+
+    def borrow(self, member_id: int, book_ids: list, due_days: int = 7) -> int:
+        return model.create_borrow_transaction(member_id, book_ids, STAFF_ID, self.due(due_days))
+
+    def query(self, sql: str, params=()) -> list:
+        with model.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def book_status(self, book_id: int) -> str:
+        return self.query("SELECT status FROM books WHERE id = ?", (book_id,))[0][0]
+
+    def open_item_id(self, book_id: int) -> int:
+        return self.query(
+            "SELECT id FROM borrow_items WHERE book_id = ? AND status = 'borrowed'", (book_id,)
+        )[0][0]
+
+
+# ============================================================
+# ยืม (checkout)
+# ============================================================
+class CheckoutTest(ModelTestCase):
+
+    def test_borrow_marks_books_and_items(self):
+        tx_id = self.borrow(1, [1, 2, 2])
+
+        self.assertEqual(self.book_status(1), "borrowed")
+        self.assertEqual(self.book_status(2), "borrowed")
+        items = self.query("SELECT book_id, status FROM borrow_items WHERE tx_id = ? ORDER BY book_id", (tx_id,))
+        self.assertEqual(items, [(1, "borrowed"), (2, "borrowed")])
+
+    def test_book_taken_by_another_desk(self):
+        self.borrow(1, [1])
+
+        with self.assertRaises(model.BooksUnavailableError) as ctx:
+            self.borrow(2, [3, 1])
+        self.assertEqual(ctx.exception.book_ids, [1])
+
+        # ยกเลิกทั้งรายการ: เล่มที่ว่างไม่ถูกยืม และไม่มีรายการหลักค้าง
+        self.assertEqual(self.book_status(3), "available")
+        self.assertEqual(self.query("SELECT COUNT(*) FROM borrow_tx WHERE member_id = 2"), [(0,)])
+
+    def test_missing_book(self):
+        with self.assertRaises(model.BooksUnavailableError) as ctx:
+            self.borrow(1, [2, 999])
+        self.assertEqual(ctx.exception.book_ids, [999])
+        self.assertEqual(self.book_status(2), "available")
+
+
+# ============================================================
+# คืน (bulk return)
+# ============================================================
+class ReturnTest(ModelTestCase):
+
+    def test_return_items_in_one_call(self):
+        tx_id = self.borrow(1, [1, 2, 3])
+        items = [self.open_item_id(b) for b in (1, 2)]
+
+        returned, failed = model.return_borrow_items(items + [items[0], 999], STAFF_ID)
+
+        self.assertEqual(returned, items)
+        self.assertEqual(failed, [999])
+        self.assertEqual([self.book_status(b) for b in (1, 2, 3)], ["available", "available", "borrowed"])
+        rows = self.query("SELECT return_date IS NOT NULL, return_staff_user_id FROM borrow_items WHERE id = ?", (items[0],))
+        self.assertEqual(rows, [(1, STAFF_ID)])
+        # ยังมีเล่มค้าง รายการหลักยังเปิดอยู่
+        self.assertEqual(self.query("SELECT status FROM borrow_tx WHERE id = ?", (tx_id,)), [("open",)])
+
+    def test_last_return_closes_transaction(self):
+        tx_id = self.borrow(1, [1, 2])
+        model.return_borrow_items([self.open_item_id(1)], STAFF_ID)
+        model.return_borrow_items([self.open_item_id(2)], STAFF_ID)
+
+        self.assertEqual(self.query("SELECT status FROM borrow_tx WHERE id = ?", (tx_id,)), [("closed",)])
+
+    def test_returned_item_is_not_returned_twice(self):
+        self.borrow(1, [1])
+        item_id = self.open_item_id(1)
+
+        self.assertTrue(model.return_borrow_item(item_id, STAFF_ID))
+        self.assertFalse(model.return_borrow_item(item_id, STAFF_ID))
+
+
+# ============================================================
+# คืนด้วยการสแกนรหัสหนังสือ / 1 เล่มมีรายการค้างยืมได้รายการเดียว
+# ============================================================
+class ScanReturnTest(ModelTestCase):
+
+    def test_return_by_scanned_books_of_several_members(self):
+        self.borrow(1, [1, 2])
+        self.borrow(2, [3])
+
+        returned, failed = model.return_by_book_ids([3, 1, 4, 1], STAFF_ID)
+
+        self.assertEqual(returned, [3, 1])
+        self.assertEqual(failed, [4])
+        self.assertEqual([self.book_status(b) for b in (1, 2, 3)], ["available", "borrowed", "available"])
+        self.assertEqual(self.query("SELECT status FROM borrow_tx WHERE member_id = 2"), [("closed",)])
+
+    def test_second_open_loan_is_rejected(self):
+        self.borrow(1, [1])
+        # สถานะใน books ผิดไปจากรายการยืม (เช่น แก้มือ) — ดัชนี unique ยังกันการยืมซ้ำ
+        model.set_book_status(1, "available")
+
+        with self.assertRaises(model.BooksUnavailableError) as ctx:
+            self.borrow(2, [1])
+        self.assertEqual(ctx.exception.book_ids, [1])
+
+        tx_id = self.query("SELECT tx_id FROM borrow_items WHERE book_id = 1")[0][0]
+        with self.assertRaises(sqlite3.IntegrityError):
+            model.execute_write(lambda conn: conn.execute(
+                "INSERT INTO borrow_items (tx_id, book_id, due_date) VALUES (?, 1, ?)", (tx_id, self.due(7))
+            ))
+
+
+# ============================================================
+# cache ตาม version ของตาราง
+# ============================================================
+class QueryCacheTest(ModelTestCase):
+
+    def cache_counts(self) -> tuple:
+        stats = model.cache_stats()
+        return stats["hits"], stats["misses"]
+
+    def test_repeated_read_is_served_from_cache(self):
+        first = model.get_available_books()
+        hits, misses = self.cache_counts()
+
+        second = model.get_available_books()
+
+        self.assertEqual(self.cache_counts(), (hits + 1, misses))
+        self.assertTrue(first.equals(second))
+
+    def test_write_to_read_table_invalidates(self):
+        self.assertEqual(len(model.get_available_books()), self.BOOKS)
+
+        self.borrow(1, [1])
+
+        self.assertEqual(len(model.get_available_books()), self.BOOKS - 1)
+
+    def test_write_to_other_table_keeps_entry(self):
+        model.get_available_books()
+        model.insert_member("สมาชิกใหม่", "new@example.com", "")
+        hits, misses = self.cache_counts()
+
+        model.get_available_books()
+
+        self.assertEqual(self.cache_counts(), (hits + 1, misses))
+
+    def test_caller_gets_a_copy(self):
+        df = model.get_available_books()
+        df.drop(df.index, inplace=True)
+
+        self.assertEqual(len(model.get_available_books()), self.BOOKS)
+
+
+# ============================================================
+# การเปลี่ยนแปลงจาก connection/process อื่น (PRAGMA data_version)
+# ============================================================
+class CrossSessionChangeTest(ModelTestCase):
+
+    def write_from_other_session(self, sql: str, params=(), table: str = "books"):
+        """เขียนตรงด้วย connection แยก (เหมือน process อื่น) พร้อมเพิ่ม version ของตาราง"""
+        with sqlite3.connect(model.DB_PATH) as conn:
+            conn.execute(sql, params)
+            conn.execute("UPDATE change_counters SET version = version + 1 WHERE name = ?", (table,))
+
+    def test_write_from_other_session_invalidates_cache(self):
+        self.assertEqual(len(model.get_available_books()), self.BOOKS)
+
+        self.write_from_other_session("UPDATE books SET status = 'lost' WHERE id = 1")
+
+        self.assertEqual(len(model.get_available_books()), self.BOOKS - 1)
+
+    def test_counters_reloaded_only_when_file_changes(self):
+        watcher = model.get_watcher()
+        versions = model.table_versions(("books",))
+        reloads = watcher.reloads
+
+        self.assertFalse(model.has_changed(versions, ("books",)))
+        self.assertEqual(watcher.reloads, reloads)
+
+        self.write_from_other_session("UPDATE books SET title = 'ใหม่' WHERE id = 1")
+
+        self.assertTrue(model.has_changed(versions, ("books",)))
+        self.assertEqual(watcher.reloads, reloads + 1)
+
+
+# ============================================================
+# ตารางสรุป (ดูแลด้วย trigger)
+# ============================================================
+class SummaryTablesTest(ModelTestCase):
+
+    def test_summaries_match_after_writes(self):
+        self.borrow(1, [1, 2, 3])
+        self.borrow(2, [4])
+        model.return_borrow_items([self.open_item_id(2)], STAFF_ID)
+        model.return_by_book_ids([4], STAFF_ID)
+        model.insert_book("หนังสือใหม่", "")
+        model.set_book_status(5, "lost")
+
+        self.assertEqual(model.verify_summary_tables(), {})
+        status = dict(model.get_book_status_summary().values.tolist())
+        self.assertEqual(status, {"available": 4, "borrowed": 2, "lost": 1})
+        monthly = model.get_borrow_summary_by_month(self.due(-1), self.due(1))
+        self.assertEqual(monthly["จำนวนการยืม"].sum(), 2)
+
+    def test_rebuild_repairs_drift(self):
+        self.borrow(1, [1])
+        model.execute_write(lambda conn: conn.execute("UPDATE book_status_counts SET count = count + 5"))
+
+        self.assertIn("book_status_counts", model.verify_summary_tables())
+
+        model.rebuild_summary_tables()
+        self.assertEqual(model.verify_summary_tables(), {})
+
+
+# ============================================================
+# รายการเกินกำหนดส่ง
+# ============================================================
+class OverdueCountsTest(ModelTestCase):
+
+    def counts(self, as_of) -> dict:
+        df = model.get_member_overdue_counts(as_of)
+        return dict(zip(df["member_id"], df["จำนวนเกินกำหนด"]))
+
+    def direct_counts(self, as_of) -> dict:
+        return dict(self.query("""
+            SELECT tx.member_id, COUNT(*)
+            FROM borrow_items bi JOIN borrow_tx tx ON tx.id = bi.tx_id
+            WHERE bi.status = 'borrowed' AND bi.due_date < ?
+            GROUP BY tx.member_id
+        """, (str(as_of),)))
+
+    def stored_as_of(self) -> str:
+        return self.query("SELECT as_of FROM overdue_state")[0][0]
+
+    def set_stored_as_of(self, as_of: str):
+        """จำลองว่าตารางสรุปนับไว้ ณ วันอื่น (เช่น ยังไม่มีการยืม/คืนตั้งแต่วันนั้น)"""
+        def write(conn):
+            conn.execute("UPDATE overdue_state SET as_of = ?", (as_of,))
+            model._rebuild_summary_tables(conn)
+        model.execute_write(write)
+
+    def assert_counts_match(self, *days: int):
+        for d in days:
+            with self.subTest(as_of=self.due(d)):
+                self.assertEqual(self.counts(self.due(d)), self.direct_counts(self.due(d)))
+
+    def test_summary_and_group_by_agree_across_borrow_and_return(self):
+        self.borrow(1, [1, 2], due_days=-3)
+        self.borrow(2, [3], due_days=-1)
+        self.borrow(1, [4], due_days=2)
+        self.assertEqual(self.counts(self.today), {1: 2, 2: 1})
+        # 0 = วันที่ของตารางสรุป, วันอื่นนับด้วย GROUP BY
+        self.assert_counts_match(0, -2, 3, -10)
+
+        model.return_by_book_ids([1, 3], STAFF_ID)
+
+        self.assertEqual(self.counts(self.today), {1: 1})
+        self.assert_counts_match(0, -2, 3)
+        self.assertEqual(model.verify_summary_tables(), {})
+        self.assertEqual(self.stored_as_of(), self.due(0))
+
+    def test_day_rollover_advances_on_write_only(self):
+        self.borrow(1, [1], due_days=-6)
+        self.borrow(1, [2], due_days=-3)
+        self.borrow(2, [3], due_days=-1)
+        self.borrow(2, [4], due_days=5)
+        self.set_stored_as_of(self.due(-5))
+        self.assertEqual(self.counts(self.due(-5)), {1: 1})
+
+        # อ่านวันนี้ได้จำนวนถูกต้อง โดยไม่เลื่อนวันที่ของตารางสรุป
+        self.assertEqual(self.counts(self.today), {1: 2, 2: 1})
+        self.assertEqual(self.stored_as_of(), self.due(-5))
+
+        # การคืนครั้งแรกของวันเลื่อนวันที่ไปเป็นวันนี้ ก่อน trigger ปรับจำนวน
+        model.return_by_book_ids([2], STAFF_ID)
+
+        self.assertEqual(self.stored_as_of(), self.due(0))
+        self.assertEqual(self.counts(self.today), {1: 1, 2: 1})
+        self.assert_counts_match(0, -5, 6)
+        self.assertEqual(model.verify_summary_tables(), {})
+
+    def test_stored_date_never_moves_back(self):
+        self.borrow(1, [1], due_days=1)
+        self.set_stored_as_of(self.due(2))
+
+        self.borrow(2, [2], due_days=-1)
+
+        self.assertEqual(self.stored_as_of(), self.due(2))
+        self.assert_counts_match(2, 0)
+        self.assertEqual(model.verify_summary_tables(), {})
+
+    def test_overdue_items_pages(self):
+        self.borrow(1, [1, 2, 3], due_days=-2)
+        self.borrow(2, [4, 5], due_days=-1)
+        self.borrow(2, [6], due_days=3)
+
+        first = model.get_overdue_items(self.today, limit=3)
+        second = model.get_overdue_items(self.today, first.next_cursor, limit=3)
+
+        books = list(first.df["book_id"]) + list(second.df["book_id"])
+        self.assertEqual(sorted(books), [1, 2, 3, 4, 5])
+        self.assertIsNone(second.next_cursor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+# test_query_plans.py — ตรวจว่า query หลักของหน้า ยืม-คืน และรายงาน ใช้ index
+#   python -m unittest test_query_plans
+# สร้างฐานข้อมูลชั่วคราวด้วย migration แล้วเรียกฟังก์ชันจริงใน model ภายใน sql_scope()
+# จากนั้นตรวจ EXPLAIN QUERY PLAN ของทุก SELECT ที่ฟังก์ชันนั้นเรียก
+import os
+import re
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+
+import model
+
+# ตารางที่โตตามประวัติการยืม ห้ามอ่านทั้งตาราง
+HISTORY_TABLES = ("borrow_items", "borrow_tx")
+INDEX_MARKERS = ("USING INDEX", "USING COVERING INDEX", "USING INTEGER PRIMARY KEY", "USING PRIMARY KEY")
+
+
+def _aliases(sql: str) -> set:
+    """ชื่อตารางประวัติ และชื่อย่อที่ query ตั้งให้ (เช่น borrow_items bi)"""
+    names = set(HISTORY_TABLES)
+    for table in HISTORY_TABLES:
+        for alias in re.findall(rf"\b{table}\s+(?:AS\s+)?(\w+)", sql, re.IGNORECASE):
+            if alias.upper() not in ("ON", "WHERE", "JOIN", "LEFT", "INNER", "SET", "GROUP", "ORDER"):
+                names.add(alias)
+    return names
+
+
+class QueryPlanTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._old_db_path = model.DB_PATH
+        cls._old_stats = model.SQL_STATS_ENABLED
+        cls._tmpdir = tempfile.mkdtemp()
+        model.DB_PATH = os.path.join(cls._tmpdir, "plans.db")
+        model.configure_sql_stats(enabled=True)
+        model.init_db()
+
+        cls.today = date.today()
+        cls.start = (cls.today - timedelta(days=30)).isoformat()
+        cls.end = cls.today.isoformat()
+
+    @classmethod
+    def tearDownClass(cls):
+        model.close_pools()
+        model.DB_PATH = cls._old_db_path
+        model.configure_sql_stats(enabled=cls._old_stats)
+        shutil.rmtree(cls._tmpdir, ignore_errors=True)
+
+    # ---------- helpers ----------
+    def plans_of(self, fn, *args) -> list:
+        """(sql, [บรรทัดของแผน]) ของทุก SELECT ที่ fn เรียก"""
+        with model.sql_scope() as records:
+            fn(*args)
+        plans = []
+        with model.connection() as conn:
+            for record in records:
+                if not record.sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                    continue
+                rows = conn.execute(
+                    "EXPLAIN QUERY PLAN " + record.sql, [None] * record.sql.count("?")
+                ).fetchall()
+                plans.append((record.sql, [row[3] for row in rows]))
+        self.assertTrue(plans, f"{fn.__name__} ไม่ได้เรียก SELECT")
+        return plans
+
+    def assert_indexed(self, fn, *args):
+        for sql, plan in self.plans_of(fn, *args):
+            with self.subTest(fn=fn.__name__, sql=sql[:60]):
+                self.assertTrue(
+                    any(marker in line for line in plan for marker in INDEX_MARKERS),
+                    f"ไม่ได้ใช้ index: {plan}"
+                )
+                self.assertFalse(any("AUTOMATIC" in line for line in plan), f"สร้าง index ชั่วคราว: {plan}")
+                tables = _aliases(sql)
+                for line in plan:
+                    match = re.match(r"SCAN (\w+)", line)
+                    if match and match.group(1) in tables:
+                        self.assertIn("USING", line, f"อ่านทั้งตาราง {match.group(1)}: {plan}")
+
+    # ---------- ยืม-คืน ----------
+    def test_active_borrow_items(self):
+        self.assert_indexed(model.get_active_borrow_items)
+
+    def test_active_borrow_items_by_member(self):
+        self.assert_indexed(model.get_active_borrow_items_by_member, 1)
+
+    def test_borrow_history_page(self):
+        # หน้าแรกเดินตาม rowid จากท้ายตารางแล้วหยุดที่ LIMIT (ไม่ต้องเรียงใหม่)
+        for sql, plan in self.plans_of(model.get_borrow_history_page):
+            self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", plan)
+        self.assert_indexed(model.get_borrow_history_page, 1000)
+
+    def test_overdue_items(self):
+        # เดินตามดัชนีกำหนดส่ง ทั้งหน้าแรกและหน้าถัดไป
+        self.assert_indexed(model.get_overdue_items, self.end)
+        self.assert_indexed(model.get_overdue_items, self.end, f"{self.start}|1000")
+
+    def test_member_overdue_counts(self):
+        # วันที่ที่ตารางสรุปนับไว้: อ่านตารางสรุป / วันอื่น: GROUP BY บนดัชนีกำหนดส่ง
+        with model.connection() as conn:
+            (stored,) = conn.execute("SELECT as_of FROM overdue_state").fetchone()
+        self.assert_indexed(model.get_member_overdue_counts, stored)
+        other = (date.fromisoformat(stored) + timedelta(days=7)).isoformat()
+        self.assert_indexed(model.get_member_overdue_counts, other)
+        with model.connection() as conn:
+            (after,) = conn.execute("SELECT as_of FROM overdue_state").fetchone()
+        self.assertEqual(after, stored, "การอ่านเลื่อนวันที่ของตารางสรุป")
+
+    # ---------- ค้นหา ----------
+    def test_search_short_queries(self):
+        # คำค้นสั้นกว่า trigram: รหัสตรงตัว หรือ prefix ของรหัสสมาชิก
+        self.assert_indexed(model.search_books, "6")
+        self.assert_indexed(model.search_members, "12")
+        self.assert_indexed(model.search_members, "M0")
+
+    # ---------- รายงาน ----------
+    def test_borrow_report(self):
+        for status in ("all", "borrowed", "returned"):
+            self.assert_indexed(model.get_borrow_report, self.start, self.end, status)
+
+    def test_count_borrow_report(self):
+        self.assert_indexed(model.count_borrow_report, self.start, self.end, "all")
+
+    def test_iter_borrow_report_rows(self):
+        self.assert_indexed(
+            lambda *args: list(model.iter_borrow_report_rows(*args)), self.start, self.end, "all"
+        )
+
+    def test_borrow_summary_by_month(self):
+        self.assert_indexed(model.get_borrow_summary_by_month, self.start, self.end)
+
+
+if __name__ == "__main__":
+    unittest.main()